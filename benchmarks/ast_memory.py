@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+#
+# benchmarks/ast_memory.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Measure how much memory a parsed statement tree takes
+#
+# The tree made by the parser is measured, and then the same tree rebuilt the
+# way the parser used to build it (a Statement for every node, with an
+# expression wrapper and a list around every token) is measured for comparison,
+# as is the same script parsed into an arena. The peak memory of a whole
+# conversion (parsing and then compiling) is also measured with and without an
+# arena, since compiling can make objects of its own.
+#
+# Usage: ast_memory.py [--reverse] [script]
+#
+# If no script is given, a serpent script is generated.
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import Token, tokenize_stream
+from parser import parse_serpent_script, parse_hsc_script, parse_serpent_arena, parse_hsc_arena, Statement, StatementType
+from compiler import emit_hsc_script, emit_serpent_script
+
+# Generate a serpent script with the given number of scripts
+def generate_script(count):
+    lines = []
+    for i in range(count):
+        lines.append("global short counter_{:d} = {:d}".format(i, i))
+        lines.append("static short script_{:d}".format(i))
+        lines.append("    counter_{:d} = counter_{:d} + 1 * 2".format(i, i))
+        lines.append("    if counter_{:d} > 10 and player_count() != 0".format(i))
+        lines.append("        print(\"counter {:d} is over 10\")".format(i))
+        lines.append("    elseif !unit_is_alive(player{:d})".format(i % 4))
+        lines.append("        sleep(30)")
+        lines.append("    else")
+        lines.append("        begin_random(sleep(1), sleep(2), sleep(3))")
+        lines.append("    end")
+        lines.append("end")
+    return "\n".join(lines) + "\n"
+
+# Rebuild a tree using only Statement, the way the parser used to build it
+def legacy_tree(statement):
+    root = to_statement(statement)
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        children = []
+        for child in node.children:
+            if isinstance(child, Token):
+                children.append(child)
+            else:
+                child = to_statement(child)
+                children.append(child)
+                stack.append(child)
+        node.children = children
+    return root
+
+def to_statement(node):
+    statement = Statement()
+    statement.statement_type = node.statement_type
+    statement.children = node.children
+    statement.token_count = node.token_count
+    for field in ("global_type", "global_name", "function_name", "script_name", "script_type", "script_return_type"):
+        if getattr(node, field) is not None:
+            setattr(statement, field, getattr(node, field))
+    return statement
+
+# Count the nodes in a tree
+def count_nodes(statement):
+    count = 0
+    stack = [statement]
+    while len(stack) > 0:
+        node = stack.pop()
+        count = count + 1
+        for child in node.children:
+            if not isinstance(child, Token):
+                stack.append(child)
+    return count
+
+# Return the result of the function and how many bytes it allocated that are
+# still allocated afterward
+def measure(function, *args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+# Return how many bytes allocated while the function ran were allocated at
+# once at most
+def measure_peak(function, *args):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+# Output that throws away everything written to it
+class NullOutput:
+    def write(self, text):
+        pass
+
+# Parse a script and compile it, throwing away the output
+def convert(parse, emit, tokens):
+    emit(parse(tokens), NullOutput(), True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory used by a parsed statement tree")
+    parser.add_argument("--reverse", const=True, default=False, dest="reverse", action="store_const", help="The script is a Halo script")
+    parser.add_argument("--count", type=int, default=2000, help="Number of scripts to generate if no script is given")
+    parser.add_argument("input", nargs="?", help="Path to input script")
+    args = parser.parse_args()
+
+    if args.input is None:
+        source = generate_script(args.count)
+    else:
+        with open(args.input, "r") as f:
+            source = f.read()
+
+    # Tokenize first so only the tree is measured
+    tokens = tokenize_stream(source)
+    tokens = [tokens[i] for i in range(len(tokens))]
+
+    parse = parse_hsc_script if args.reverse else parse_serpent_script
+    tree, tree_bytes = measure(parse, tokens)
+    legacy, legacy_bytes = measure(legacy_tree, tree)
+    parse_arena = parse_hsc_arena if args.reverse else parse_serpent_arena
+    arena, arena_bytes = measure(parse_arena, tokens)
+
+    emit = emit_serpent_script if args.reverse else emit_hsc_script
+    tree_peak = measure_peak(convert, parse, emit, tokens)
+    arena_peak = measure_peak(convert, lambda tokens: parse_arena(tokens).root(), emit, tokens)
+
+    nodes = count_nodes(legacy)
+    print("Tokens:          {:d}".format(len(tokens)))
+    print("Nodes (legacy):  {:d}".format(nodes))
+    print("Nodes (typed):   {:d}".format(count_nodes(tree)))
+    print("Legacy tree:     {:d} bytes".format(legacy_bytes))
+    print("Typed tree:      {:d} bytes".format(tree_bytes))
+    print("Saved:           {:.1f}%".format(100.0 * (legacy_bytes - tree_bytes) / legacy_bytes))
+    print("Arena:           {:d} bytes ({:.1f}% saved, {:.1f}x the script)".format(arena_bytes, 100.0 * (legacy_bytes - arena_bytes) / legacy_bytes, arena_bytes / len(source)))
+    print("Converting:      {:d} bytes at most".format(tree_peak))
+    print("With an arena:   {:d} bytes at most ({:.1f}% saved)".format(arena_peak, 100.0 * (tree_peak - arena_peak) / tree_peak))
+
+if __name__ == "__main__":
+    main()
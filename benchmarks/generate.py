@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+#
+# benchmarks/generate.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Generate serpent and HSC scripts for benchmarking
+#
+# Each shape is a function that takes a size and returns a serpent script.
+# HSC scripts are made by converting the serpent script, either pretty or
+# stripped (which puts the whole script on one line).
+#
+# Usage: generate.py [--hsc] [--strip] [--count N] shape output
+#
+# Shapes:
+#   realistic    scripts like the ones in a map, with globals, ifs and calls
+#   globals      count globals and nothing else
+#   chain        one script with an if followed by count elseifs
+#   deep         one script with ifs nested count deep
+#   calls        one global with function calls nested count deep
+#   expression   one global with an expression count operators long
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import tokenize_stream
+from parser import parse_serpent_script
+from compiler import compile_hsc_script
+
+from ast_memory import generate_script
+
+TYPES = ("short", "long", "real", "boolean")
+OPERATORS = ("+", "-", "*", "/", "<", ">", "<=", ">=", "==", "!=", "and", "or")
+
+def generate_globals(count):
+    lines = []
+    for i in range(count):
+        lines.append("global {:s} value_{:d} = {:d}".format(TYPES[i % len(TYPES)], i, i))
+    return "\n".join(lines) + "\n"
+
+def generate_chain(count):
+    lines = ["global short state = 0", "continuous check_state", "    if state == 0", "        sleep(1)"]
+    for i in range(1, count + 1):
+        lines.append("    elseif state == {:d}".format(i))
+        lines.append("        print(\"state {:d}\")".format(i))
+    lines.append("    else")
+    lines.append("        state = 0")
+    lines.append("    end")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+def generate_deep(count):
+    lines = ["global short depth = 0", "continuous nest"]
+    for i in range(count):
+        lines.append("    " * (i + 1) + "if depth > {:d}".format(i))
+    lines.append("    " * (count + 1) + "depth = 0")
+    for i in reversed(range(count)):
+        lines.append("    " * (i + 1) + "end")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+def generate_calls(count):
+    return "global short nested = {:s}1{:s}\n".format("abs_integer(" * count, ")" * count)
+
+def generate_expression(count):
+    terms = ["value_0"]
+    for i in range(1, count + 1):
+        terms.append(OPERATORS[i % len(OPERATORS)])
+        terms.append("value_{:d}".format(i % 100) if i % 3 else str(i))
+    return "global boolean long_expression = {:s}\n".format(" ".join(terms))
+
+# Shape names, with the function that generates them and a size that takes
+# roughly as long as the others to convert
+SHAPES = {
+    "realistic": (generate_script, 1000),
+    "globals": (generate_globals, 20000),
+    "chain": (generate_chain, 5000),
+    "deep": (generate_deep, 500),
+    "calls": (generate_calls, 20000),
+    "expression": (generate_expression, 20000)
+}
+
+# Generate a script with the given shape
+#
+# If count is None, the shape's default size is used. If hsc is True, the
+# script is converted to HSC, stripped if strip is True.
+def generate(shape, count = None, hsc = False, strip = False):
+    function, default_count = SHAPES[shape]
+    source = function(default_count if count is None else count)
+    if hsc:
+        source = compile_hsc_script(parse_serpent_script(tokenize_stream(source)), strip) + "\n"
+    return source
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a script for benchmarking")
+    parser.add_argument("--hsc", const=True, default=False, dest="hsc", action="store_const", help="Generate a Halo script instead of a serpent script")
+    parser.add_argument("--strip", const=True, default=False, dest="strip", action="store_const", help="Strip the Halo script, putting it all on one line")
+    parser.add_argument("--count", type=int, default=None, help="Size of the script (default depends on the shape)")
+    parser.add_argument("shape", choices=SHAPES.keys(), help="Kind of script to generate")
+    parser.add_argument("output", help="Path to output script")
+    args = parser.parse_args()
+
+    with open(args.output, "w") as f:
+        f.write(generate(args.shape, args.count, args.hsc, args.strip))
+
+if __name__ == "__main__":
+    main()
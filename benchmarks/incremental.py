@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#
+# benchmarks/incremental.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Measure how long it takes to convert a script again after a small edit
+#
+# The script is converted once with an IncrementalConverter, and then a number
+# in the middle of it is changed and it is converted again. Both times are
+# compared with converting the whole script the usual way.
+#
+# Usage: incremental.py [--reverse] [script]
+#
+# If no script is given, a serpent script is generated.
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import tokenize_stream
+from parser import parse_serpent_script, parse_hsc_script
+from compiler import compile_hsc_script, compile_serpent_script
+from cache import IncrementalConverter
+
+from ast_memory import generate_script
+
+# Change one digit in the middle of the script
+def edit_script(source):
+    middle = len(source) // 2
+    for index in range(middle, len(source)):
+        if source[index].isdigit():
+            digit = "1" if source[index] != "1" else "2"
+            return source[:index] + digit + source[index + 1:]
+    raise ValueError("no number to change in the second half of the script")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure converting a script again after a small edit")
+    parser.add_argument("--reverse", const=True, default=False, dest="reverse", action="store_const", help="The script is a Halo script")
+    parser.add_argument("--count", type=int, default=2000, help="Number of scripts to generate if no script is given")
+    parser.add_argument("input", nargs="?", help="Path to input script")
+    args = parser.parse_args()
+
+    if args.input is None:
+        source = generate_script(args.count)
+    else:
+        with open(args.input, "r") as f:
+            source = f.read()
+    edited = edit_script(source)
+
+    parse = parse_hsc_script if args.reverse else parse_serpent_script
+    compile = compile_serpent_script if args.reverse else compile_hsc_script
+
+    start = time.perf_counter()
+    expected = compile(parse(tokenize_stream(edited)), args.reverse)
+    full = time.perf_counter() - start
+
+    converter = IncrementalConverter(args.reverse, args.reverse)
+    start = time.perf_counter()
+    converter.convert(source)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = converter.convert(edited)
+    again = time.perf_counter() - start
+
+    if output != expected:
+        print("The output is not the same as converting the whole script")
+        sys.exit(1)
+
+    print("Script:           {:d} bytes, {:d} lines".format(len(source), source.count("\n")))
+    print("Whole script:     {:.1f} ms".format(full * 1000))
+    print("First convert:    {:.1f} ms".format(first * 1000))
+    print("After the edit:   {:.1f} ms ({:d} pieces converted, {:d} reused)".format(again * 1000, converter.converted, converter.reused))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+# benchmarks/scaling.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Check that each stage of converting a script scales linearly
+#
+# For each shape from generate.py, scripts are generated at sizes that grow
+# geometrically (by default from 1,000 to 1,000,000 tokens) and converted in
+# both directions. The tokenizer, parser and compiler are timed and their peak
+# memory is measured at each size, and a line is fit to the logarithms to find
+# how fast each of them grows: an exponent of 1 is linear and 2 is quadratic.
+# If any exponent is over its bound, the exit code is 1.
+#
+# Only sizes from --fit-tokens up are used to fit the line. Smaller scripts
+# are shown, but they mostly measure fixed costs, and short lines are scanned
+# without NumPy, which would make the numpy tokenizer look worse than it is.
+#
+# Usage: scaling.py [--shapes SHAPE ...] [--min-tokens N] [--max-tokens N] [--factor F] [--fit-tokens N]
+#                   [--time-bound F] [--memory-bound F] [--pretty] [--output results.json]
+#
+# Scripts are stripped by default, since pretty output of nested ifs is
+# indented more the deeper they are nested and so is not linear to begin with.
+# The deep shape is left out by default for the same reason (deeply nested
+# calls are still checked with the calls shape).
+
+import os
+import sys
+import json
+import math
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate import SHAPES
+from stages import DIRECTIONS, STAGES, run_case
+
+DEFAULT_SHAPES = ("realistic", "globals", "chain", "calls", "expression")
+
+# Size of the script used to find how many tokens a shape has per count
+SAMPLE_COUNT = 100
+
+# Find the count that makes a script of a shape have about this many tokens
+def count_for_tokens(shape, direction, mode, tokens):
+    sample = run_case(shape, SAMPLE_COUNT, direction, mode, 1, None)
+    return max(1, round(tokens * SAMPLE_COUNT / sample["tokens"]))
+
+# Fit a line to the logarithms of the points, returning its slope
+def growth_exponent(sizes, values):
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-9)) for value in values]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    denominator = sum((x - mean_x) ** 2 for x in xs)
+    return numerator / denominator
+
+# Token counts to measure at, growing by factor
+def token_sizes(minimum, maximum, factor):
+    sizes = []
+    size = minimum
+    while size <= maximum:
+        sizes.append(size)
+        size = size * factor
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that converting scripts takes linear time and memory")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES.keys(), default=list(DEFAULT_SHAPES), help="Shapes of scripts to generate (default is every shape but deep)")
+    parser.add_argument("--min-tokens", type=int, default=1000, dest="min_tokens", help="Size of the smallest script in tokens (default is 1000)")
+    parser.add_argument("--max-tokens", type=int, default=1000000, dest="max_tokens", help="Size of the largest script in tokens (default is 1000000)")
+    parser.add_argument("--factor", type=float, default=4.0, help="How much bigger each script is than the last (default is 4)")
+    parser.add_argument("--fit-tokens", type=int, default=10000, dest="fit_tokens", help="Size of the smallest script used to fit the exponents (default is 10000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times to run each stage, keeping the fastest (default is 3)")
+    parser.add_argument("--time-bound", type=float, default=1.25, dest="time_bound", help="Highest exponent allowed for time (default is 1.25)")
+    parser.add_argument("--memory-bound", type=float, default=1.15, dest="memory_bound", help="Highest exponent allowed for peak memory (default is 1.15)")
+    parser.add_argument("--pretty", const=True, default=False, dest="pretty", action="store_const", help="Convert to and from pretty scripts instead of stripped ones")
+    parser.add_argument("--output", default=None, help="Path to write the measurements and exponents to as JSON")
+    args = parser.parse_args()
+
+    mode = "pretty" if args.pretty else "strip"
+    sizes = token_sizes(args.min_tokens, args.max_tokens, args.factor)
+    if len([size for size in sizes if size >= args.fit_tokens]) < 3:
+        parser.error("at least three sizes from --fit-tokens up are needed; lower --fit-tokens or --factor, or raise --max-tokens")
+
+    # Convert a small script first so that modules imported the first time
+    # they are used aren't timed
+    for direction in DIRECTIONS:
+        run_case("realistic", SAMPLE_COUNT, direction, mode, 1, None)
+
+    results = []
+    failures = 0
+    for shape in args.shapes:
+        for direction in DIRECTIONS:
+            measurements = []
+            for tokens in sizes:
+                count = count_for_tokens(shape, direction, mode, tokens)
+                case = run_case(shape, count, direction, mode, args.repeat, None)
+                measurements.append(case)
+                print("{:10s} {:7s} {:9d} tokens  ".format(shape, direction, case["tokens"]) + "  ".join(
+                    "{:s} {:9.1f} ms {:9.1f} KiB".format(stage, case["stages"][stage]["seconds"] * 1000, case["stages"][stage]["peak_bytes"] / 1024) for stage in STAGES
+                ))
+
+            fitted = [case for tokens, case in zip(sizes, measurements) if tokens >= args.fit_tokens]
+            token_counts = [case["tokens"] for case in fitted]
+            exponents = {}
+            for stage in STAGES:
+                time_exponent = growth_exponent(token_counts, [case["stages"][stage]["seconds"] for case in fitted])
+                memory_exponent = growth_exponent(token_counts, [case["stages"][stage]["peak_bytes"] for case in fitted])
+                problems = []
+                if time_exponent > args.time_bound:
+                    problems.append("time grows faster than n^{:.2f}".format(args.time_bound))
+                if memory_exponent > args.memory_bound:
+                    problems.append("memory grows faster than n^{:.2f}".format(args.memory_bound))
+                if len(problems) > 0:
+                    failures = failures + 1
+                exponents[stage] = { "time": time_exponent, "memory": memory_exponent, "problems": problems }
+                print("{:10s} {:7s} {:8s} time n^{:.2f}, memory n^{:.2f}{:s}".format(
+                    shape, direction, stage, time_exponent, memory_exponent,
+                    "  FAIL: " + ", ".join(problems) if len(problems) > 0 else ""
+                ))
+
+            results.append({ "shape": shape, "direction": direction, "mode": mode, "measurements": measurements, "exponents": exponents })
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({ "fit_tokens": args.fit_tokens, "time_bound": args.time_bound, "memory_bound": args.memory_bound, "results": results }, f, indent = 4)
+            f.write("\n")
+
+    if failures > 0:
+        print("{:d} stage(s) grew faster than allowed".format(failures))
+        sys.exit(1)
+    print("Every stage grew within the bounds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+#
+# benchmarks/stages.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Time each stage of converting generated scripts and compare runs
+#
+# For every shape from generate.py, scripts are converted in both directions
+# (serpent to HSC and HSC to serpent) and in both pretty and strip modes. The
+# tokenizer, parser and compiler are timed separately, taking the best of a
+# number of runs, and then run once more with tracemalloc to find the peak
+# memory each of them used. The results are written as JSON.
+#
+# Usage: stages.py run [--shapes SHAPE ...] [--repeat N] [--scale F] [--tokenizer NAME] output.json
+#        stages.py compare [--threshold F] [--memory-threshold F] before.json after.json
+#
+# compare shows how each stage changed between two runs, and exits with 1 if
+# any of them got slower or used more memory than the thresholds allow.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizer import TOKENIZERS, tokenize_stream
+from parser import parse_serpent_script, parse_hsc_script
+from compiler import compile_hsc_script, compile_serpent_script
+
+from generate import SHAPES, generate
+
+DIRECTIONS = ("serpent", "hsc")
+MODES = ("pretty", "strip")
+STAGES = ("tokenize", "parse", "compile")
+
+# Changes smaller than these are too noisy to call a regression
+MINIMUM_SECONDS = 0.002
+MINIMUM_BYTES = 65536
+
+# Size of the script converted before anything is timed, so that modules
+# imported the first time they are used (such as NumPy) aren't timed
+WARM_UP_COUNT = 50
+
+# Return the result of the function and the fastest time it took in seconds
+def best_time(repeat, function, *args):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return result, best
+
+# Return the most memory the function had allocated at once, in bytes
+def peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+# Run each stage on a script
+#
+# direction is the language of the script, and mode is whether the output is
+# pretty or stripped. When converting from HSC, the script is stripped the
+# same way the output is.
+def run_case(shape, count, direction, mode, repeat, tokenizer):
+    reverse = direction == "hsc"
+    strip = mode == "strip"
+    source = generate(shape, count, reverse, strip)
+
+    if tokenizer is None:
+        tokenizer = "numpy" if reverse and "numpy" in TOKENIZERS else "table"
+    scan, bulk_scan = TOKENIZERS[tokenizer]
+    parse = parse_hsc_script if reverse else parse_serpent_script
+    compile = compile_serpent_script if reverse else compile_hsc_script
+
+    tokens, tokenize_seconds = best_time(repeat, tokenize_stream, source, scan, bulk_scan)
+    tree, parse_seconds = best_time(repeat, parse, tokens)
+    output, compile_seconds = best_time(repeat, compile, tree, strip)
+
+    return {
+        "shape": shape,
+        "count": count,
+        "direction": direction,
+        "mode": mode,
+        "tokenizer": tokenizer,
+        "bytes": len(source),
+        "tokens": len(tokens),
+        "output_bytes": len(output),
+        "stages": {
+            "tokenize": { "seconds": tokenize_seconds, "peak_bytes": peak_memory(tokenize_stream, source, scan, bulk_scan) },
+            "parse": { "seconds": parse_seconds, "peak_bytes": peak_memory(parse, tokens) },
+            "compile": { "seconds": compile_seconds, "peak_bytes": peak_memory(compile, tree, strip) }
+        }
+    }
+
+def run(args):
+    for direction in DIRECTIONS:
+        for mode in MODES:
+            run_case("realistic", WARM_UP_COUNT, direction, mode, 1, args.tokenizer)
+
+    results = []
+    for shape in args.shapes:
+        count = max(1, int(SHAPES[shape][1] * args.scale))
+        for direction in DIRECTIONS:
+            for mode in MODES:
+                case = run_case(shape, count, direction, mode, args.repeat, args.tokenizer)
+                results.append(case)
+                stages = case["stages"]
+                print("{:10s} {:7s} {:6s} {:8d} tokens  ".format(shape, direction, mode, case["tokens"]) + "  ".join(
+                    "{:s} {:8.1f} ms {:8.1f} KiB".format(stage, stages[stage]["seconds"] * 1000, stages[stage]["peak_bytes"] / 1024) for stage in STAGES
+                ))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "scale": args.scale,
+            "results": results
+        }, f, indent = 4)
+        f.write("\n")
+
+def load_run(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+# Find the cases of a run by shape, direction and mode
+def run_cases(run):
+    return { (case["shape"], case["direction"], case["mode"]): case for case in run["results"] }
+
+def compare(args):
+    before_run = load_run(args.before)
+    after_run = load_run(args.after)
+    for setting in ("python", "repeat"):
+        if before_run[setting] != after_run[setting]:
+            print("Warning: the runs have a different {:s} ({:s} and {:s})".format(setting, str(before_run[setting]), str(after_run[setting])))
+
+    before = run_cases(before_run)
+    after = run_cases(after_run)
+    regressions = 0
+
+    for key in before:
+        if key not in after:
+            continue
+        old = before[key]
+        new = after[key]
+        if old["bytes"] != new["bytes"]:
+            print("{:10s} {:7s} {:6s} scripts are not the same size ({:d} and {:d} bytes), skipping".format(*key, old["bytes"], new["bytes"]))
+            continue
+
+        for stage in STAGES:
+            old_stage = old["stages"][stage]
+            new_stage = new["stages"][stage]
+            time_ratio = new_stage["seconds"] / old_stage["seconds"] if old_stage["seconds"] > 0 else 1.0
+            memory_ratio = new_stage["peak_bytes"] / old_stage["peak_bytes"] if old_stage["peak_bytes"] > 0 else 1.0
+
+            problems = []
+            if time_ratio > 1 + args.threshold and new_stage["seconds"] - old_stage["seconds"] > MINIMUM_SECONDS:
+                problems.append("slower")
+            if memory_ratio > 1 + args.memory_threshold and new_stage["peak_bytes"] - old_stage["peak_bytes"] > MINIMUM_BYTES:
+                problems.append("more memory")
+            if len(problems) > 0:
+                regressions = regressions + 1
+
+            print("{:10s} {:7s} {:6s} {:8s} {:8.1f} -> {:8.1f} ms ({:+6.1f}%)  {:10d} -> {:10d} bytes ({:+6.1f}%){:s}".format(
+                *key, stage,
+                old_stage["seconds"] * 1000, new_stage["seconds"] * 1000, (time_ratio - 1) * 100,
+                old_stage["peak_bytes"], new_stage["peak_bytes"], (memory_ratio - 1) * 100,
+                "  REGRESSION: " + ", ".join(problems) if len(problems) > 0 else ""
+            ))
+
+    if regressions > 0:
+        print("{:d} regression(s) found".format(regressions))
+        sys.exit(1)
+    print("No regressions found")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of converting generated scripts")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="Time each stage and write the results as JSON")
+    run_parser.add_argument("--shapes", nargs="+", choices=SHAPES.keys(), default=list(SHAPES.keys()), help="Shapes of scripts to generate (default is all of them)")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Number of times to run each stage, keeping the fastest (default is 5)")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="Multiply the size of each generated script by this (default is 1)")
+    run_parser.add_argument("--tokenizer", default=None, choices=TOKENIZERS.keys(), help="Tokenizer to use (default is the same as serpent.py)")
+    run_parser.add_argument("output", help="Path to write the results to")
+
+    compare_parser = commands.add_parser("compare", help="Compare two runs and fail if a stage regressed")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="How much slower a stage can get before it is a regression (default is 0.1, or 10%%)")
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.05, dest="memory_threshold", help="How much more memory a stage can use before it is a regression (default is 0.05, or 5%%)")
+    compare_parser.add_argument("before", help="Results of the earlier run")
+    compare_parser.add_argument("after", help="Results of the later run")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+# benchmarks/startup.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Measure how long serpent takes to start
+#
+# serpent.py is run a number of times in a new process for each case, and the
+# median time is shown next to the time it takes to start Python and do
+# nothing. Tiny scripts are converted so that the time is almost all startup.
+# With --imports, the modules serpent imports are shown by how long each
+# package took to import (from python -X importtime).
+#
+# Usage: startup.py [--runs N] [--imports]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERPENT = os.path.join(ROOT, "serpent.py")
+
+TINY_SERPENT = "global short counter = 0\n\nscript continuous count\n    set(counter, counter + 1)\n"
+TINY_HSC = "(global short counter 0)\n(script continuous count (set counter (+ counter 1)))\n"
+
+# Run a command a number of times, returning the median time in seconds
+def time_command(command, runs):
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+# Add up the time spent importing each top-level package
+def import_times(command):
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command[1:], stdout = subprocess.DEVNULL, stderr = subprocess.PIPE, universal_newlines = True, check = True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(fields[0])
+    return sorted(packages.items(), key = lambda item: item[1], reverse = True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long serpent takes to start")
+    parser.add_argument("--runs", type=int, default=15, help="Number of times to run each case (default is 15)")
+    parser.add_argument("--imports", const=True, default=False, dest="imports", action="store_const", help="Show how long each package took to import")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        serpent_script = os.path.join(directory, "tiny.serpent")
+        hsc_script = os.path.join(directory, "tiny.hsc")
+        output = os.path.join(directory, "output")
+        with open(serpent_script, "w") as f:
+            f.write(TINY_SERPENT)
+        with open(hsc_script, "w") as f:
+            f.write(TINY_HSC)
+
+        cases = [
+            ("python", [sys.executable, "-c", "pass"]),
+            ("--help", [sys.executable, SERPENT, "--help"]),
+            ("serpent to hsc", [sys.executable, SERPENT, serpent_script, output]),
+            ("hsc to serpent", [sys.executable, SERPENT, "--reverse", hsc_script, output])
+        ]
+
+        for name, command in cases:
+            print("{:16s} {:7.1f} ms".format(name + ":", time_command(command, args.runs) * 1000))
+
+        if args.imports:
+            for name, command in cases[2:]:
+                print()
+                print("Imports for {:s}:".format(name))
+                for package, microseconds in import_times(command):
+                    if microseconds >= 500:
+                        print("    {:24s} {:7.1f} ms".format(package, microseconds / 1000))
+
+if __name__ == "__main__":
+    main()
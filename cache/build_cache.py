@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+#
+# cache/build_cache.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+
+# Default limit on the total size of the cached outputs, in bytes
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+# Extension of cached outputs
+ENTRY_EXTENSION = ".out"
+
+# Get the default directory for the cache
+def default_cache_directory():
+    base = os.environ.get("XDG_CACHE_HOME")
+    if base is None or len(base) == 0:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "serpent")
+
+# Cache of converted scripts
+#
+# Each output is stored in its own file, named by a hash of the input script,
+# the options it was converted with, and the serpent version. Getting an output
+# updates its modification time, and once the cache is bigger than max_size,
+# the outputs that were used the longest time ago are removed first.
+#
+# Outputs are written to a temporary file and then moved into place, so more
+# than one process can use the same cache at once.
+class BuildCache:
+    directory = None
+    version = None
+    max_size = DEFAULT_MAX_SIZE
+
+    def __init__(self, directory, version, max_size = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.version = version
+        self.max_size = max_size
+
+    # Get the key for an input script (as bytes) and the options it is
+    # converted with (as a string)
+    def key(self, data, options):
+        # hashlib loads OpenSSL, so only import it if the cache is used
+        import hashlib
+        hash = hashlib.sha256()
+        hash.update("serpent {:s}\n{:s}\n".format(self.version, options).encode("utf-8"))
+        hash.update(data)
+        return hash.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    # Get the output for a key, or None if it isn't cached
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    # Store the output for a key, then remove old outputs if needed
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temp_path = "{:s}.{:d}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.evict()
+
+    # Get each cached output as (key, size, last used time), oldest first
+    def entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+
+        for name in names:
+            if not name.endswith(ENTRY_EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((name[:-len(ENTRY_EXTENSION)], stat.st_size, stat.st_mtime))
+
+        entries.sort(key = lambda entry: entry[2])
+        return entries
+
+    def size(self):
+        return sum(entry[1] for entry in self.entries())
+
+    # Remove the least recently used outputs until the cache fits in max_size
+    def evict(self):
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        for key, entry_size, used in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            size = size - entry_size
+
+    # Remove every cached output
+    def clear(self):
+        for key, size, used in self.entries():
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    # Get a summary of what is in the cache
+    def describe(self):
+        entries = self.entries()
+        lines = ["Cache: {:s}".format(self.directory)]
+        lines.append("Outputs: {:d} ({:d} of {:d} bytes)".format(len(entries), sum(entry[1] for entry in entries), self.max_size))
+        for key, size, used in reversed(entries):
+            lines.append("{:s} {:>10d} {:s}".format(key, size, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(used))))
+        return "\n".join(lines)
+
+# Size of the pieces files are compared in, so a file is never read into
+# memory all at once
+COMPARE_CHUNK_SIZE = 64 * 1024
+
+# Check if a file already has exactly this data
+def file_has(path, data):
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        view = memoryview(data)
+        with open(path, "rb") as f:
+            for start in range(0, len(data), COMPARE_CHUNK_SIZE):
+                if f.read(COMPARE_CHUNK_SIZE) != view[start:start + COMPARE_CHUNK_SIZE]:
+                    return False
+        return True
+    except FileNotFoundError:
+        return False
+
+# Check if two files have exactly the same data
+def files_equal(path, other_path):
+    try:
+        if os.stat(path).st_size != os.stat(other_path).st_size:
+            return False
+        with open(path, "rb") as f, open(other_path, "rb") as o:
+            while True:
+                chunk = f.read(COMPARE_CHUNK_SIZE)
+                if chunk != o.read(COMPARE_CHUNK_SIZE):
+                    return False
+                if len(chunk) == 0:
+                    return True
+    except FileNotFoundError:
+        return False
+
+# Write data to a file unless the file already has exactly that data, so its
+# modification time is left alone. Returns True if it was written.
+def write_if_changed(path, data):
+    if file_has(path, data):
+        return False
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return True
+
+# Move a file over another unless the other already has exactly the same data,
+# in which case the file is removed instead. Returns True if it was moved.
+def replace_if_changed(path, other_path):
+    if files_equal(path, other_path):
+        os.remove(path)
+        return False
+    os.replace(path, other_path)
+    return True
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#
+# cache/incremental.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import hashlib
+
+from tokenizer import tokenize_stream, scan as scan_line, SCRIPT_TYPES, TokenError
+from parser import ParserError
+from compiler import CompileError
+import parser
+import compiler
+
+# Start of a line that starts a serpent definition
+SERPENT_DEFINITION = re.compile(r"^[ \t]*(?:global|{:s})\b".format("|".join(SCRIPT_TYPES)), re.M)
+
+# Start of a HSC definition
+HSC_DEFINITION = re.compile(r"\([ \t]*(?:global|script)\b")
+
+# Most times a piece that doesn't convert on its own is joined with the next
+# one before the whole script is converted instead. Each join tokenizes and
+# parses everything joined so far again, so without a limit, an error near the
+# start of a script would take time quadratic in its length to find.
+MAX_JOINS = 4
+
+# Quotes and comments, for telling whether part of a line is in a string or a
+# comment
+QUOTE_OR_COMMENT = re.compile(r"[\"#;]")
+
+# Split a script into pieces that each start at a top-level definition
+#
+# The tokenizer goes line by line, so a serpent script can be split at the
+# start of any line, and a piece that starts with a definition keyword will
+# usually hold whole definitions. HSC scripts are often all on one line, so
+# they are also split in the middle of a line before a `(global` or `(script`
+# that comes right after a `)` and is not in a string or a comment.
+#
+# Returns a list of (text, header), where header is the length of the text up
+# to the end of its definition keyword, or 0 for a piece that doesn't start
+# with one. The pieces put together are the whole script.
+def split_definitions(source, reverse = False):
+    starts = []
+    headers = {}
+
+    if not reverse:
+        for m in SERPENT_DEFINITION.finditer(source):
+            starts.append(m.start())
+            headers[m.start()] = m.end() - m.start()
+    else:
+        line_start = None
+        position = 0
+        in_string = False
+        in_comment = False
+
+        for m in HSC_DEFINITION.finditer(source):
+            start = m.start()
+
+            # Look at the line up to here, continuing from the last one if it
+            # is on the same line
+            if line_start is None or source.rfind("\n", line_start, start) != -1:
+                line_start = source.rfind("\n", 0, start) + 1
+                position = line_start
+                in_string = False
+                in_comment = False
+            if not in_comment:
+                for q in QUOTE_OR_COMMENT.finditer(source, position, start):
+                    if q.group() == "\"":
+                        in_string = not in_string
+                    elif not in_string:
+                        in_comment = True
+                        break
+            position = start
+
+            if in_string or in_comment:
+                continue
+
+            # Split right after a `)`, or at the start of the line
+            before = start - 1
+            while before >= line_start and (source[before] == " " or source[before] == "\t"):
+                before = before - 1
+            if before < line_start:
+                start = line_start
+            elif source[before] != ")":
+                continue
+
+            starts.append(start)
+            headers[start] = m.end() - start
+
+    pieces = []
+    previous = 0
+    for start in starts:
+        if start > previous:
+            pieces.append((source[previous:start], headers.get(previous, 0)))
+            previous = start
+    pieces.append((source[previous:], headers.get(previous, 0)))
+    return pieces
+
+# Converts a script over and over, redoing only the definitions that changed
+#
+# The script is split with split_definitions(), and each piece is tokenized,
+# parsed and compiled on its own. The definitions and output of each piece are
+# kept by a hash of its text (and of the keyword that starts the piece after
+# it), so the next time the script is converted, any piece with the same text
+# is reused as is. A piece that doesn't parse on its
+# own (because it was split in the wrong place) is joined with the next one and
+# tried again, up to MAX_JOINS times.
+#
+# If the script has an error (or a piece still doesn't parse after that), the
+# whole script is converted the usual way so the error is the same as it would
+# otherwise be.
+class IncrementalConverter:
+    reverse = False
+    strip = False
+    scan = None
+    bulk_scan = None
+
+    # Each piece's (definitions, output) by the hash of its text
+    pieces = None
+
+    # Each piece's (definitions, output) in order, from the last time
+    used = None
+
+    # How many pieces were reused and converted the last time
+    reused = 0
+    converted = 0
+
+    def __init__(self, reverse = False, strip = False, scan = scan_line, bulk_scan = None):
+        self.reverse = reverse
+        self.strip = strip
+        self.scan = scan
+        self.bulk_scan = bulk_scan
+        self.pieces = {}
+        self.used = []
+
+    def parse(self, tokens, end = None):
+        return parser.parse_hsc_script(tokens, end) if self.reverse else parser.parse_serpent_script(tokens, end)
+
+    def compile(self, statement):
+        return compiler.compile_serpent_script(statement, self.strip) if self.reverse else compiler.compile_hsc_script(statement, self.strip)
+
+    # Convert a script, returning the output
+    def convert(self, source):
+        pieces = split_definitions(source, self.reverse)
+        kept = {}
+        used = []
+        self.reused = 0
+        self.converted = 0
+
+        index = 0
+        while index < len(pieces):
+            text = pieces[index][0]
+            index = index + 1
+            joins = 0
+
+            while True:
+                # Whether a piece parses can depend on the token after it, so
+                # the next piece's definition keyword is part of the key
+                next_header = ""
+                if index < len(pieces):
+                    next_text, header = pieces[index]
+                    next_header = next_text[:header].strip()
+                key = hashlib.blake2b((next_header + "\n" + text).encode("utf-8"), digest_size = 16).digest()
+                piece = self.pieces.get(key) or kept.get(key)
+                if piece is not None:
+                    self.reused = self.reused + 1
+                    break
+
+                piece = self.convert_piece(text, pieces[index] if index < len(pieces) else None)
+                if piece is not None:
+                    self.converted = self.converted + 1
+                    break
+
+                # Join it with the next piece, or give up if there are none left
+                # or it was joined too many times
+                if index == len(pieces) or joins == MAX_JOINS:
+                    return self.convert_all(source)
+                text = text + pieces[index][0]
+                index = index + 1
+                joins = joins + 1
+
+            kept[key] = piece
+            used.append(piece)
+
+        self.pieces = kept
+        self.used = used
+        return "".join(piece[1] for piece in used)
+
+    # Convert a piece, returning (definitions, output), or None if it doesn't
+    # convert on its own
+    #
+    # Like parse_groups(), the piece is parsed with the first token of the next
+    # piece after it, and it has to parse to exactly the end of the piece.
+    def convert_piece(self, text, next_piece):
+        try:
+            stream = tokenize_stream(text, self.scan, self.bulk_scan)
+            count = len(stream)
+
+            if next_piece is None:
+                script = self.parse(stream)
+            else:
+                next_text, header = next_piece
+                tokens = [stream[i] for i in range(count)]
+                next_tokens = tokenize_stream(next_text[:header] + "\n", self.scan)
+                if len(next_tokens) == 0:
+                    return None
+                tokens.append(next_tokens[0])
+                script = self.parse(tokens, count)
+                if script.token_count != count:
+                    return None
+
+            return (script.children, self.compile(script))
+        # A piece that was split in the wrong place won't tokenize, parse or
+        # compile on its own
+        except (TokenError, ParserError, CompileError):
+            return None
+
+    # Convert the whole script at once, so any error is raised the same way
+    def convert_all(self, source):
+        self.pieces = {}
+        self.used = []
+        script = self.parse(tokenize_stream(source, self.scan, self.bulk_scan))
+        output = self.compile(script)
+        self.used = [(script.children, output)]
+        return output
+
+    # Get the definitions from the last time a script was converted
+    def definitions(self):
+        definitions = []
+        for children, output in self.used:
+            definitions.extend(children)
+        return definitions
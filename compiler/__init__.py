@@ -22,6 +22,27 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .hsc_compiler import compile_script as compile_hsc_script
-from .serpent_compiler import compile_script as compile_serpent_script
+import importlib
+
 from .types import CompileError
+
+# The compilers are imported when they are first used, so only the one for the
+# direction being converted is loaded
+LAZY_EXPORTS = {
+    "compile_hsc_script": (".hsc_compiler", "compile_script"),
+    "emit_hsc_script": (".hsc_compiler", "emit_script"),
+    "compile_serpent_script": (".serpent_compiler", "compile_script"),
+    "emit_serpent_script": (".serpent_compiler", "emit_script"),
+    "Emitter": (".emitter", "Emitter")
+}
+
+def __getattr__(name):
+    if name not in LAZY_EXPORTS:
+        raise AttributeError("module {:s} has no attribute {:s}".format(__name__, name))
+    module, attribute = LAZY_EXPORTS[name]
+    value = getattr(importlib.import_module(module, __name__), attribute)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_EXPORTS))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# compiler/emitter.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token
+from .types import CompileError
+
+# Piece that writes a space unless the last thing written ends with `)`
+OPTIONAL_SPACE = None
+
+# Writes compiled pieces of a script in order
+#
+# Pieces are written to output (anything with a write() method, such as an open
+# file) as they are made, or kept in a list to be joined at the end if there
+# is no output. The last character written is kept so that the compilers can
+# decide on spacing without looking back at what was written.
+class Emitter:
+    output = None
+    pieces = None
+    last = ""
+
+    def __init__(self, output = None):
+        if output is None:
+            self.pieces = []
+            self.write_output = self.pieces.append
+        else:
+            self.output = output
+            self.write_output = output.write
+    def write(self, text):
+        if len(text) > 0:
+            self.write_output(text)
+            self.last = text[-1]
+    def getvalue(self):
+        return "".join(self.pieces)
+
+# Write a statement tree or token to an emitter
+#
+# statement_pieces(statement, strip, level) returns what a statement compiles
+# to as a list of pieces, which are each one of these:
+#
+# a string                  written as is
+# OPTIONAL_SPACE            a space unless the last character written is `)`
+# (child, strip, level)     a child statement or token, compiled in its place
+# a CompileError            raised when it is reached
+#
+# compile_token(token, strip) returns what a token compiles to. The tree is
+# walked with an explicit stack rather than by recursion, so it can be nested
+# as deeply as needed.
+def emit(statement, emitter, strip, level, statement_pieces, compile_token):
+    stack = [(statement, strip, level)]
+
+    while len(stack) > 0:
+        piece = stack.pop()
+
+        if isinstance(piece, str):
+            emitter.write(piece)
+
+        elif piece is OPTIONAL_SPACE:
+            if emitter.last != ")":
+                emitter.write(" ")
+
+        elif isinstance(piece, CompileError):
+            raise piece
+
+        else:
+            statement, strip, level = piece
+            if isinstance(statement, Token):
+                emitter.write(compile_token(statement, strip))
+            else:
+                pieces = statement_pieces(statement, strip, level)
+                pieces.reverse()
+                stack.extend(pieces)
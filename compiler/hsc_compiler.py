@@ -27,118 +27,157 @@ import sys
 from tokenizer import Token, TokenType
 from parser import Statement, StatementType
 from .types import CompileError, do_generate_spaces, dont_generate_spaces
+from .emitter import Emitter, OPTIONAL_SPACE, emit
+from profiler.hooks import hooked, PHASE_COMPILE
 
 # Translate a statement tree or token into its HSC equivalent
+@hooked(PHASE_COMPILE)
 def compile_script(statement, strip = False, level = 0):
-    if isinstance(statement, Token):
-        quotes_can_be_removed = False
-
-        if strip and statement.token_type == TokenType.STRING and len(statement.token[1:-1]) > 0:
-            quotes_can_be_removed = True
-            for c in statement.token[1:-1]:
-                if not c.isalnum() and c != "_":
-                    quotes_can_be_removed = False
-                    break
-
-        if quotes_can_be_removed:
-            return statement.token[1:-1]
-        else:
-            return statement.token
+    emitter = Emitter()
+    emit(statement, emitter, strip, level, statement_pieces, compile_token)
+    return emitter.getvalue()
+
+# Write the HSC equivalent of a statement tree or token to output as it is
+# compiled, for output such as an open file
+@hooked(PHASE_COMPILE)
+def emit_script(statement, output, strip = False, level = 0):
+    emit(statement, Emitter(output), strip, level, statement_pieces, compile_token)
+
+def compile_token(statement, strip):
+    quotes_can_be_removed = False
+
+    if strip and statement.token_type == TokenType.STRING and len(statement.token[1:-1]) > 0:
+        quotes_can_be_removed = True
+        for c in statement.token[1:-1]:
+            if not c.isalnum() and c != "_":
+                quotes_can_be_removed = False
+                break
+
+    if quotes_can_be_removed:
+        return statement.token[1:-1]
     else:
-        type = statement.statement_type
-
-        newline = "" if strip else "\n"
-        generate_spaces = dont_generate_spaces if strip else do_generate_spaces
-
-        # Main script block
-        if type == StatementType.MAIN_SCRIPT_BLOCK:
-            compiled = ""
-            for child in statement.children:
-                compiled = compiled + compile_script(child, strip, level) + newline
-            return compiled
-
-        # Global
-        elif type == StatementType.GLOBAL_DEFINITION:
-            compiled = "(global {:s} {:s}".format(statement.global_type, statement.global_name)
-            if len(statement.children) == 1:
-                compiled = compiled + " " + compile_script(statement.children[0], strip, level)
-            compiled = compiled + ")"
-            return compiled
-
-        # Expression
-        elif type == StatementType.EXPRESSION:
-            if len(statement.children) != 1:
-                raise CompileError("invalid expression")
-            return compile_script(statement.children[0], strip, level)
-
-        # Function call
-        elif type == StatementType.FUNCTION_CALL:
-            compiled = "({:s}".format(statement.function_name)
-            for child in statement.children:
-                # Add an extra space IF needed
-                if compiled[-1] != ")" or not strip:
-                    compiled = compiled + " "
-                compiled = compiled + compile_script(child, strip, level)
-            compiled = compiled + ")"
-            return compiled
-
-        # Function definition
-        elif type == StatementType.SCRIPT_DEFINITION:
-            compiled = "(script {:s} ".format(statement.script_type)
-            if statement.script_type == "static" or statement.script_type == "stub":
-                compiled = compiled + statement.script_return_type + " "
-            compiled = compiled + statement.script_name
-
-            # For empty scripts, add something that does nothing. Otherwise, add the stuff it does
-            if len(statement.children) == 0:
-                compiled = compiled + " (+ 0 0)"
-            else:
-                for child in statement.children:
-                    compiled = compiled + " " + compile_script(child, strip, level)
-
-            compiled = compiled + (newline if len(statement.children) > 0 else "") + ")"
-            return compiled
-
-        # Script blocks
-        elif type == StatementType.SCRIPT_BLOCK:
-            compiled = ""
-            if len(statement.children) == 0:
-                compiled = "(+ 0 0)"
-            else:
-                for child in statement.children:
-                    compiled = compiled + newline + generate_spaces(level + 1) + compile_script(child, strip, level + 1)
-            return compiled
-
-        # If statement
-        elif type == StatementType.IF_STATEMENT:
-            compiled = "(if"
-
-            if len(statement.children) != 2 and len(statement.children) != 3:
-                raise CompileError("invalid if statement")
-
-            # Condition
-            compiled = compiled + " " + compile_script(statement.children[0], strip, level)
-
-            # Add an extra space IF needed
-            if compiled[-1] != ")" or not strip:
-                compiled = compiled + " "
-
-            # if is true
-            if len(statement.children[1].children) <= 1 or (isinstance(statement.children[1], Statement) and statement.children[1].statement_type == StatementType.IF_STATEMENT):
-                compiled = compiled + compile_script(statement.children[1], strip, level)
+        return statement.token
+
+# Get what a statement compiles to as a list of pieces for emit()
+def statement_pieces(statement, strip, level):
+    type = statement.statement_type
+
+    # Read once, since statements such as ArenaNode make their children each
+    # time they are read
+    children = statement.children
+
+    newline = "" if strip else "\n"
+    generate_spaces = dont_generate_spaces if strip else do_generate_spaces
+
+    # Add an extra space IF needed
+    space = OPTIONAL_SPACE if strip else " "
+
+    # Main script block
+    if type == StatementType.MAIN_SCRIPT_BLOCK:
+        pieces = []
+        for child in children:
+            pieces.append((child, strip, level))
+            pieces.append(newline)
+        return pieces
+
+    # Global
+    elif type == StatementType.GLOBAL_DEFINITION:
+        pieces = ["(global {:s} {:s}".format(statement.global_type, statement.global_name)]
+        if len(children) == 1:
+            pieces.append(" ")
+            pieces.append((children[0], strip, level))
+        pieces.append(")")
+        return pieces
+
+    # Expression
+    elif type == StatementType.EXPRESSION:
+        if len(children) != 1:
+            raise CompileError("invalid expression")
+        return [(children[0], strip, level)]
+
+    # Function call
+    elif type == StatementType.FUNCTION_CALL:
+        pieces = ["({:s}".format(statement.function_name)]
+        for child in children:
+            pieces.append(space)
+            pieces.append((child, strip, level))
+        pieces.append(")")
+        return pieces
+
+    # Function definition
+    elif type == StatementType.SCRIPT_DEFINITION:
+        compiled = "(script {:s} ".format(statement.script_type)
+        if statement.script_type == "static" or statement.script_type == "stub":
+            compiled = compiled + statement.script_return_type + " "
+        compiled = compiled + statement.script_name
+        pieces = [compiled]
+
+        # For empty scripts, add something that does nothing. Otherwise, add the stuff it does
+        if len(children) == 0:
+            pieces.append(" (+ 0 0)")
+        else:
+            for child in children:
+                pieces.append(" ")
+                pieces.append((child, strip, level))
+
+        pieces.append((newline if len(children) > 0 else "") + ")")
+        return pieces
+
+    # Script blocks
+    elif type == StatementType.SCRIPT_BLOCK:
+        if len(children) == 0:
+            return ["(+ 0 0)"]
+        pieces = []
+        for child in children:
+            pieces.append(newline + generate_spaces(level + 1))
+            pieces.append((child, strip, level + 1))
+        return pieces
+
+    # If statement
+    elif type == StatementType.IF_STATEMENT:
+        if len(children) != 2 and len(children) != 3:
+            raise CompileError("invalid if statement")
+
+        # Condition
+        pieces = ["(if ", (children[0], strip, level), space]
+
+        # if is true, and else
+        for child in children[1:]:
+            append_branch(pieces, child, strip, level)
+
+        pieces.append(newline + generate_spaces(level) + ")")
+        return pieces
+
+    # Chain of if and elseif statements, as a condition and a branch for each
+    # clause. Anything after the last condition is run if none are true.
+    elif type == StatementType.COND_STATEMENT:
+        if len(children) < 2:
+            raise CompileError("invalid cond")
+
+        pieces = ["(cond " if strip else "(cond"]
+        for c in range(0, len(children), 2):
+            pieces.append(newline + generate_spaces(level + 1) + "(" if not strip else "(")
+            if c + 1 < len(children):
+                pieces.append((children[c], strip, level + 1))
+                pieces.append(space)
+                append_branch(pieces, children[c + 1], strip, level + 1)
             else:
-                compiled = compiled + "(begin " + compile_script(statement.children[1], strip, level) + ")"
-
-            # else
-            if(len(statement.children) == 3):
-                if len(statement.children[2].children) <= 1 or (isinstance(statement.children[2], Statement) and statement.children[2].statement_type == StatementType.IF_STATEMENT):
-                    compiled = compiled + compile_script(statement.children[2], strip, level)
-                else:
-                    compiled = compiled + "(begin " + compile_script(statement.children[2], strip, level) + ")"
+                pieces.append("true ")
+                append_branch(pieces, children[c], strip, level + 1)
+            pieces.append(")")
 
-            compiled = compiled + newline + generate_spaces(level) + ")"
+        pieces.append(newline + generate_spaces(level) + ")")
+        return pieces
 
-            return compiled
+    else:
+        raise CompileError("unimplemented")
 
-        else:
-            raise CompileError("unimplemented")
+# Add the pieces for a branch of an if statement or cond, which needs a begin
+# if it is more than one statement
+def append_branch(pieces, branch, strip, level):
+    if len(branch.children) <= 1 or (not isinstance(branch, Token) and branch.statement_type == StatementType.IF_STATEMENT):
+        pieces.append((branch, strip, level))
+    else:
+        pieces.append("(begin ")
+        pieces.append((branch, strip, level))
+        pieces.append(")")
@@ -24,86 +24,140 @@
 
 import sys
 
-from tokenizer import Token, TokenType, ARITHMETIC_SYMBOLS
+from tokenizer import Token, TokenType
+from tokenizer.symbols import SET, NOT, AND, OR, EQUALS, ARITHMETIC_CODES
 from parser import Statement, StatementType
 from .types import CompileError, do_generate_spaces, dont_generate_spaces
+from .emitter import Emitter, emit
+from profiler.hooks import hooked, PHASE_COMPILE
 
 # Translate a statement tree or token into its serpent equivalent
+@hooked(PHASE_COMPILE)
 def compile_script(statement, strip = False, level = 0):
+    emitter = Emitter()
+    emit(statement, emitter, strip, level, statement_pieces, compile_token)
+    return emitter.getvalue()
+
+# Write the serpent equivalent of a statement tree or token to output as it is
+# compiled, for output such as an open file
+@hooked(PHASE_COMPILE)
+def emit_script(statement, output, strip = False, level = 0):
+    emit(statement, Emitter(output), strip, level, statement_pieces, compile_token)
+
+def compile_token(statement, strip):
+    return statement.token
+
+# Get what a statement compiles to as a list of pieces for emit()
+def statement_pieces(statement, strip, level):
     newline = "\n" if not strip else " "
 
     generate_spaces = do_generate_spaces if not strip else dont_generate_spaces
 
-    if isinstance(statement, Token):
-        return statement.token
-    else:
-        compiled = ""
-        type = statement.statement_type
-
-        # Main script
-        if type == StatementType.MAIN_SCRIPT_BLOCK:
-            for c in statement.children:
-                compiled = compiled + compile_script(c, strip, level) + newline
-
-            return compiled
-
-        # Global definition
-        elif type == StatementType.GLOBAL_DEFINITION:
-            format_string = "global {:s} {:s} = {:s}" if not strip else "global {:s} {:s}={:s}"
-            return format_string.format(statement.global_type, statement.global_name, compile_script(statement.children[0], strip, level))
-
-        # Expression
-        elif type == StatementType.EXPRESSION:
-            return compile_script(statement.children[0], strip, level)
-
-        # Script definition
-        elif type == StatementType.SCRIPT_DEFINITION:
-            compiled = statement.script_type + " ";
-            if statement.script_type == "stub" or statement.script_type == "static":
-                compiled = compiled + statement.script_return_type + " "
-            compiled = compiled + statement.script_name + compile_script(statement.children[0], strip, level + 1) + newline + "end"
-            return compiled
-
-        # Script block
-        elif type == StatementType.SCRIPT_BLOCK:
-            for c in statement.children:
-                compiled = compiled + newline + generate_spaces(level) + compile_script(c, strip, level)
-            return compiled
-
-        # Function call
-        elif type == StatementType.FUNCTION_CALL:
-            if statement.function_name == "set":
-                format_string = "{:s} = {:s}" if not strip else "{:s}={:s}"
-                return format_string.format(compile_script(statement.children[0], level), compile_script(statement.children[1], strip, level))
-            elif statement.function_name == "not":
-                return "!{:s}".format(compile_script(statement.children[0], strip, level))
-            elif statement.function_name == "=" or statement.function_name in ARITHMETIC_SYMBOLS:
-                function_name = statement.function_name
-                if function_name == "=":
-                    function_name = "=="
-                format_string = "({:s} {:s} {:s})" if not strip or statement.function_name == "or" or statement.function_name == "and" else "({:s}{:s}{:s})"
-                return format_string.format(compile_script(statement.children[0], strip, level), function_name, compile_script(statement.children[1], strip, level))
-
-            compiled = statement.function_name + "("
-            for c in range(len(statement.children)):
-                compiled = compiled + compile_script(statement.children[c], strip, level)
-                if c + 1 < len(statement.children):
-                    compiled = compiled + ", "
-            return compiled + ")"
-
-        # If statement
-        elif type == StatementType.IF_STATEMENT:
-            compiled = "if " + compile_script(statement.children[0], strip, level)
-
-            if len(statement.children) <= 3 and len(statement.children) > 1:
-                compiled = compiled + compile_script(statement.children[1], strip, level + 1) + newline
-                if len(statement.children) == 3:
-                    compiled = compiled + generate_spaces(level) + "else" + compile_script(statement.children[2], strip, level + 1) + newline
+    type = statement.statement_type
+
+    # Read once, since statements such as ArenaNode make their children each
+    # time they are read
+    children = statement.children
+
+    # Main script
+    if type == StatementType.MAIN_SCRIPT_BLOCK:
+        pieces = []
+        for c in children:
+            pieces.append((c, strip, level))
+            pieces.append(newline)
+        return pieces
+
+    # Global definition
+    elif type == StatementType.GLOBAL_DEFINITION:
+        format_string = "global {:s} {:s} = " if not strip else "global {:s} {:s}="
+        return [format_string.format(statement.global_type, statement.global_name), (children[0], strip, level)]
+
+    # Expression
+    elif type == StatementType.EXPRESSION:
+        return [(children[0], strip, level)]
+
+    # Script definition
+    elif type == StatementType.SCRIPT_DEFINITION:
+        compiled = statement.script_type + " ";
+        if statement.script_type == "stub" or statement.script_type == "static":
+            compiled = compiled + statement.script_return_type + " "
+        compiled = compiled + statement.script_name
+        return [compiled, (children[0], strip, level + 1), newline + "end"]
+
+    # Script block
+    elif type == StatementType.SCRIPT_BLOCK:
+        pieces = []
+        for c in children:
+            pieces.append(newline + generate_spaces(level))
+            pieces.append((c, strip, level))
+        return pieces
+
+    # Function call
+    elif type == StatementType.FUNCTION_CALL:
+        function_code = statement.function_code
+        if function_code == SET:
+            return [(children[0], level, 0), " = " if not strip else "=", (children[1], strip, level)]
+        elif function_code == NOT:
+            return ["!", (children[0], strip, level)]
+        elif function_code == EQUALS or function_code in ARITHMETIC_CODES:
+            function_name = statement.function_name
+            if function_code == EQUALS:
+                function_name = "=="
+            if not strip or function_code == OR or function_code == AND:
+                function_name = " " + function_name + " "
+
+            # Operators that take more than two parameters are chained, which
+            # is parsed back into the same order
+            pieces = ["(", (children[0], strip, level)]
+            for c in children[1:]:
+                pieces.append(function_name)
+                pieces.append((c, strip, level))
+            pieces.append(")")
+            return pieces
+
+        pieces = [statement.function_name + "("]
+        for c in range(len(children)):
+            pieces.append((children[c], strip, level))
+            if c + 1 < len(children):
+                pieces.append(", ")
+        pieces.append(")")
+        return pieces
+
+    # If statement
+    elif type == StatementType.IF_STATEMENT:
+        pieces = ["if ", (children[0], strip, level)]
+
+        if len(children) <= 3 and len(children) > 1:
+            pieces.append((children[1], strip, level + 1))
+            pieces.append(newline)
+            if len(children) == 3:
+                pieces.append(generate_spaces(level) + "else")
+                pieces.append((children[2], strip, level + 1))
+                pieces.append(newline)
+        else:
+            pieces.append(CompileError("invalid if statement"))
+
+        pieces.append(generate_spaces(level) + "end")
+        return pieces
+
+    # Chain of if and elseif statements
+    elif type == StatementType.COND_STATEMENT:
+        if len(children) < 2:
+            return [CompileError("invalid cond")]
+
+        pieces = ["if ", (children[0], strip, level), (children[1], strip, level + 1), newline]
+        for c in range(2, len(children), 2):
+            if c + 1 < len(children):
+                pieces.append(generate_spaces(level) + "elseif ")
+                pieces.append((children[c], strip, level))
+                pieces.append((children[c + 1], strip, level + 1))
             else:
-                raise CompileError("invalid if statement")
-
-            return compiled + generate_spaces(level) + "end"
+                pieces.append(generate_spaces(level) + "else")
+                pieces.append((children[c], strip, level + 1))
+            pieces.append(newline)
 
+        pieces.append(generate_spaces(level) + "end")
+        return pieces
 
-        else:
-            raise CompileError("{:s} is unimplemented".format(type))
+    else:
+        raise CompileError("{:s} is unimplemented".format(type))
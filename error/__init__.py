@@ -46,3 +46,19 @@ def show_message_for_character(line, character, text, message):
     line_char = "{:d}:{:d}: ".format(line, character)
     print("{:s}{:s}".format(line_char, text[:-1]), file=sys.stderr)
     print(("{:>" + str(len(line_char) + character - 1) + "s}^ {:s}").format("", message), file=sys.stderr)
+
+# Get the text of a line (starting at 1) in a script, including its newline
+def get_line(source, line):
+    start = 0
+    for i in range(line - 1):
+        start = source.find("\n", start) + 1
+    end = source.find("\n", start) + 1
+    return source[start:end] if end != 0 else source[start:]
+
+# Read the text of a line (starting at 1) from a file, including its newline
+def read_line(path, line):
+    with open(path, "r") as f:
+        for i, text in enumerate(f, 1):
+            if i == line:
+                return text
+    return ""
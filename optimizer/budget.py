@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# optimizer/budget.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token
+from parser import StatementType, Atom
+from .tree import NODE_LIMIT, count_nodes
+from .inline import called_names, order_calls
+
+# Get how many levels of Halo's script stack evaluating a node takes, given how
+# deep its children go (None if one of them never stops)
+#
+# Every function call (including if, cond and begin) takes a level for itself
+# on top of the deepest of its parameters. Calling a static or stub script
+# takes one more level for the call on top of what the script takes. Empty
+# blocks and scripts are written as (+ 0 0), which takes a level too.
+# script_depths maps the lowercase names of scripts to how deep they go (None
+# if they call themselves).
+def node_depth(node, inner, script_depths):
+    if isinstance(node, (Token, Atom)) or node is None:
+        return 0
+    if inner is None:
+        return None
+
+    node_type = node.statement_type
+    if node_type == StatementType.FUNCTION_CALL:
+        name = node.function_name.lower()
+        if name in script_depths:
+            called = script_depths[name]
+            if called is None:
+                return None
+            inner = max(inner, called)
+        return inner + 1
+    elif node_type == StatementType.IF_STATEMENT or node_type == StatementType.COND_STATEMENT:
+        return inner + 1
+    elif node_type == StatementType.SCRIPT_BLOCK and len(node.children) > 1:
+        return inner + 1
+    elif (node_type == StatementType.SCRIPT_BLOCK or node_type == StatementType.SCRIPT_DEFINITION) and len(node.children) == 0:
+        # Written as (+ 0 0)
+        return 1
+    return inner
+
+# Get the deepest a statement tree goes on Halo's script stack, or None if it
+# calls a script that calls itself
+#
+# The tree is walked with an explicit stack, so it can be nested as deeply as
+# needed.
+def nesting_depth(statement, script_depths):
+    order = []
+    stack = [(statement, None)]
+    while len(stack) > 0:
+        entry = stack.pop()
+        order.append(entry)
+        node = entry[0]
+        if isinstance(node, (Token, Atom)) or node is None:
+            continue
+        for child in node.children:
+            stack.append((child, node))
+
+    # Deepest child of each node so far, by the node's id
+    deepest = {}
+    depth = 0
+    for node, parent in reversed(order):
+        depth = node_depth(node, deepest.get(id(node), 0), script_depths)
+        if parent is not None:
+            parent_id = id(parent)
+            current = deepest.get(parent_id, 0)
+            deepest[parent_id] = None if depth is None or current is None else max(current, depth)
+    return depth
+
+# Get how deep each static and stub script goes, by lowercase name
+#
+# Scripts are measured after the scripts they call. A stub and the static
+# script that replaces it share a name, so the deeper of the two is used.
+# Scripts that call themselves (directly or through others) go as deep as they
+# keep calling, so they and anything that calls them are None.
+def static_depths(definitions):
+    scripts = {}
+    for definition in definitions:
+        if definition.statement_type == StatementType.SCRIPT_DEFINITION and definition.script_type in ("static", "stub"):
+            scripts.setdefault(definition.script_name.lower(), []).append(definition)
+
+    calls = {}
+    for name, named in scripts.items():
+        calls[name] = set()
+        for definition in named:
+            calls[name] |= called_names(definition) & scripts.keys()
+
+    script_depths = dict.fromkeys(scripts.keys())
+    for name in order_calls(calls):
+        depths = [nesting_depth(definition, script_depths) for definition in scripts[name]]
+        script_depths[name] = None if None in depths else max(depths)
+    return script_depths
+
+# Measure a statement tree (either a script or a single definition)
+#
+# Returns a (name, nodes, depth) tuple for each global and script, where nodes
+# is how many nodes Halo would make for it (as counted by count_nodes()) and
+# depth is the deepest it goes on Halo's script stack, counting the scripts it
+# calls (None if it calls a script that calls itself). Static scripts can only
+# be followed into if they are in statement.
+def measure_budget(statement):
+    definitions = statement.children if statement.statement_type == StatementType.MAIN_SCRIPT_BLOCK else (statement,)
+    script_depths = static_depths(definitions)
+
+    measurements = []
+    for definition in definitions:
+        if definition.statement_type == StatementType.GLOBAL_DEFINITION:
+            name = "global " + definition.global_name
+        else:
+            name = "script " + definition.script_name
+        measurements.append((name, count_nodes(definition), nesting_depth(definition, script_depths)))
+    return measurements
+
+# Check measurements from measure_budget() against budgets, returning a message
+# for each one that is over
+#
+# max_nodes is the most nodes the whole script can have, max_definition_nodes
+# is the most any one global or script can have, and max_depth is the deepest
+# any of them can go. Any of them can be None to not check them.
+def check_budget(measurements, max_nodes = NODE_LIMIT, max_definition_nodes = None, max_depth = None):
+    problems = []
+    for name, nodes, depth in measurements:
+        if max_definition_nodes is not None and nodes > max_definition_nodes:
+            problems.append("{:s} has {:d} nodes, which is over the budget of {:d}".format(name, nodes, max_definition_nodes))
+        if max_depth is not None:
+            if depth is None:
+                problems.append("{:s} calls a script that calls itself, so its depth has no limit".format(name))
+            elif depth > max_depth:
+                problems.append("{:s} is {:d} levels deep, which is over the budget of {:d}".format(name, depth, max_depth))
+
+    total = sum(nodes for name, nodes, depth in measurements)
+    if max_nodes is not None and total > max_nodes:
+        problems.append("The script has {:d} nodes, which is over the budget of {:d}".format(total, max_nodes))
+    return problems
+
+# Format measurements from measure_budget() as a table, followed by any
+# problems from check_budget()
+def format_budget(measurements, problems = ()):
+    lines = ["{:30s} {:>8s} {:>9s}".format("Definition", "Nodes", "Depth")]
+    total = 0
+    deepest = 0
+    for name, nodes, depth in measurements:
+        total = total + nodes
+        if depth is None or deepest is None:
+            deepest = None
+        else:
+            deepest = max(deepest, depth)
+        lines.append(format_budget_line(name, nodes, depth))
+    lines.append(format_budget_line("total", total, deepest))
+
+    lines.extend(problems)
+    return lines
+
+def format_budget_line(name, nodes, depth):
+    return "{:30s} {:8d} {:>9s}".format(name, nodes, "recursive" if depth is None else str(depth))
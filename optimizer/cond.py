@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# optimizer/cond.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token
+from parser import StatementType, Cond
+from .tree import rewrite, unwrap
+
+# Get the if statement or cond that is the whole of an else block, or None if
+# there isn't one
+def else_chain(branch):
+    node = unwrap(branch)
+    if not isinstance(node, Token) and node.statement_type == StatementType.SCRIPT_BLOCK and len(node.children) == 1:
+        node = unwrap(node.children[0])
+    if isinstance(node, Token) or len(node.children) < 2:
+        return None
+    if node.statement_type == StatementType.IF_STATEMENT or node.statement_type == StatementType.COND_STATEMENT:
+        return node
+    return None
+
+def lower_node(node, state):
+    if isinstance(node, Token) or node.statement_type != StatementType.IF_STATEMENT or len(node.children) != 3:
+        return node
+
+    # The children of an if statement are laid out the same way as those of a
+    # cond, so the chain in the else block can be added on to this one
+    chain = else_chain(node.children[2])
+    if chain is None:
+        return node
+    return Cond([node.children[0], node.children[1]] + list(chain.children))
+
+# Turn chains of if and elseif statements into conds
+#
+# An if statement whose else block is only another if statement compiles to
+# (if a b (if c d ...)), which takes another if and another level of Halo's
+# script stack for each elseif. A cond, (cond (a b) (c d) ...), takes neither.
+# The tree is changed in place, and the statement that replaces it is
+# returned.
+def lower_conditions(statement, global_types = None):
+    return rewrite(statement, lower_node, lambda node, index, state: None)
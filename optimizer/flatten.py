@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# optimizer/flatten.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token
+from tokenizer.symbols import AND, OR, VARIADIC_CODES
+from parser import StatementType
+from .tree import rewrite, unwrap, splice_block, is_condition
+
+# Whether a child has to stay a block: the branches of if statements and conds
+# and the bodies of scripts
+def child_keeps_block(node, index, keeps_block):
+    node_type = node.statement_type
+    if node_type == StatementType.IF_STATEMENT or node_type == StatementType.COND_STATEMENT:
+        return not is_condition(node, index)
+    return node_type == StatementType.SCRIPT_DEFINITION
+
+# Merge calls to the same operator into one call
+#
+# and and or are merged on either side, since (and a (and b c)) and
+# (and (and a b) c) are the same. + and * are only merged on the left, which
+# keeps the order the reals are added or multiplied in, as rounding could
+# otherwise give a different result.
+def flatten_call(call):
+    code = call.function_code
+    children = None
+    for index, child in enumerate(call.children):
+        inner = unwrap(child)
+        if not isinstance(inner, Token) and inner.statement_type == StatementType.FUNCTION_CALL and inner.function_code == code and (index == 0 or code == AND or code == OR):
+            if children is None:
+                children = list(call.children[:index])
+            children.extend(inner.children)
+        elif children is not None:
+            children.append(child)
+    if children is not None:
+        call.children = children
+
+def flatten_node(node, keeps_block):
+    if isinstance(node, Token):
+        return node
+    node_type = node.statement_type
+
+    if node_type == StatementType.FUNCTION_CALL:
+        if node.function_code in VARIADIC_CODES:
+            flatten_call(node)
+
+    # A block in an expression is compiled the same way without it, and its
+    # parent can then take its statements
+    elif node_type == StatementType.EXPRESSION:
+        if len(node.children) == 1 and not isinstance(node.children[0], Token) and node.children[0].statement_type == StatementType.SCRIPT_BLOCK:
+            return node.children[0]
+
+    elif node_type == StatementType.SCRIPT_BLOCK:
+        splice_block(node)
+        if len(node.children) == 1 and not keeps_block:
+            return node.children[0]
+
+    return node
+
+# Flatten nested calls to and, or, + and * into one call to each, and put the
+# statements of blocks inside blocks (begin inside begin) in their place
+#
+# Halo lets these take any number of parameters, so this saves a call and a
+# level of the script stack for each one that is merged. The tree is changed in
+# place, and the statement that replaces it is returned.
+def flatten(statement, global_types = None):
+    return rewrite(statement, flatten_node, child_keeps_block, True)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+#
+# optimizer/fold.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import struct
+
+from tokenizer import Token, TokenType
+from tokenizer.symbols import ADD, SUBTRACT, MULTIPLY, DIVIDE, EQUALS, NOT_EQUALS, GREATER_THAN, LESS_THAN, GREATER_THAN_OR_EQUAL, LESS_THAN_OR_EQUAL, AND, OR, NOT, SET
+from parser import StatementType
+from .tree import IN_BLOCK, IN_ELSE, IN_VALUE, rewrite, unwrap, make_token, splice_block, is_condition
+from .unused import has_side_effects
+
+ARITHMETIC = frozenset((ADD, SUBTRACT, MULTIPLY, DIVIDE))
+COMPARISONS = frozenset((EQUALS, NOT_EQUALS, GREATER_THAN, LESS_THAN, GREATER_THAN_OR_EQUAL, LESS_THAN_OR_EQUAL))
+
+# Ranges of the integer types. Halo's arithmetic and comparison functions take
+# and return reals, which are 32-bit floats.
+SHORT_MIN = -32768
+SHORT_MAX = 32767
+LONG_MIN = -2147483648
+LONG_MAX = 2147483647
+
+# Numeric types a value can be given to
+NUMERIC_TYPES = frozenset(("short", "long", "real"))
+
+# Round a number to a 32-bit float, or return None if it doesn't fit in one
+def to_real(value):
+    try:
+        value = struct.unpack("f", struct.pack("f", value))[0]
+    except OverflowError:
+        return None
+    if math.isinf(value) or math.isnan(value):
+        return None
+    return value
+
+# Get the value of a literal as a real or a bool, or None if it isn't one
+def literal_value(node):
+    token = unwrap(node)
+    if not isinstance(token, Token):
+        return None
+    if token.token_type == TokenType.INTEGER or token.token_type == TokenType.FLOAT:
+        return to_real(float(token.token))
+    if token.token_type == TokenType.OTHER:
+        if token.token == "true":
+            return True
+        elif token.token == "false":
+            return False
+    return None
+
+def is_number(value):
+    return value is not None and not isinstance(value, bool)
+
+# Make a literal for a real that is given to something of the given type
+#
+# Whole numbers can be written as integers, which work for any numeric type as
+# long as they are in its range. Anything else is only written if it is given
+# to a real. Nothing is written for something that doesn't take a number.
+# Returns None if it can't be written.
+def number_token(value, value_type):
+    if value_type is not None and value_type not in NUMERIC_TYPES:
+        return None
+    if value == int(value):
+        value = int(value)
+        if value_type == "long" or value_type == "real":
+            if value < LONG_MIN or value > LONG_MAX:
+                return None
+        elif value < SHORT_MIN or value > SHORT_MAX:
+            return None
+        return make_token(str(value), TokenType.INTEGER)
+
+    if value_type != "real":
+        return None
+
+    # Use the fewest decimal places that give back the same real
+    for places in range(1, 50):
+        text = "{:.{:d}f}".format(value, places)
+        if to_real(float(text)) == value:
+            return make_token(text, TokenType.FLOAT)
+    return None
+
+def boolean_token(value):
+    return make_token("true" if value else "false", TokenType.OTHER)
+
+# Do arithmetic on reals the way Halo does, returning None if it can't be done
+def calculate(code, values):
+    result = values[0]
+    for value in values[1:]:
+        if code == ADD:
+            result = result + value
+        elif code == SUBTRACT:
+            result = result - value
+        elif code == MULTIPLY:
+            result = result * value
+        else:
+            if value == 0:
+                return None
+            result = result / value
+        result = to_real(result)
+        if result is None:
+            return None
+    return result
+
+def compare(code, left, right):
+    if code == EQUALS:
+        return left == right
+    elif code == NOT_EQUALS:
+        return left != right
+    elif code == GREATER_THAN:
+        return left > right
+    elif code == LESS_THAN:
+        return left < right
+    elif code == GREATER_THAN_OR_EQUAL:
+        return left >= right
+    else:
+        return left <= right
+
+# Whether x can be used in place of (+ x 0) and the like
+#
+# The arithmetic functions turn their parameters into reals, so this is only
+# the case if x already is a real or a short (which any real can hold). A long
+# can be too big to fit in a real exactly, and the type of anything else isn't
+# known.
+def is_short_or_real(node, global_types):
+    node = unwrap(node)
+    if isinstance(node, Token):
+        return node.token_type == TokenType.OTHER and global_types.get(node.token) in ("short", "real")
+    return node.statement_type == StatementType.FUNCTION_CALL and node.function_code in ARITHMETIC
+
+# Fold a function call, returning what replaces it
+def fold_call(call, value_type, global_types):
+    code = call.function_code
+    children = call.children
+
+    if code in ARITHMETIC and len(children) >= 2:
+        values = [literal_value(child) for child in children]
+        if all(is_number(value) for value in values):
+            result = calculate(code, values)
+            if result is not None:
+                token = number_token(result, value_type)
+                if token is not None:
+                    return token
+            return call
+
+        # Identities
+        if len(children) == 2:
+            left, right = values
+            if right == 0 and (code == ADD or code == SUBTRACT) and is_number(right) and is_short_or_real(children[0], global_types):
+                return children[0]
+            if left == 0 and code == ADD and is_number(left) and is_short_or_real(children[1], global_types):
+                return children[1]
+            if right == 1 and (code == MULTIPLY or code == DIVIDE) and is_number(right) and is_short_or_real(children[0], global_types):
+                return children[0]
+            if left == 1 and code == MULTIPLY and is_number(left) and is_short_or_real(children[1], global_types):
+                return children[1]
+
+    elif code in COMPARISONS and len(children) == 2:
+        left = literal_value(children[0])
+        right = literal_value(children[1])
+        if is_number(left) and is_number(right):
+            return boolean_token(compare(code, left, right))
+        if isinstance(left, bool) and isinstance(right, bool) and (code == EQUALS or code == NOT_EQUALS):
+            return boolean_token(compare(code, left, right))
+
+    elif code == NOT and len(children) == 1:
+        value = literal_value(children[0])
+        if isinstance(value, bool):
+            return boolean_token(not value)
+
+    elif (code == AND or code == OR) and len(children) >= 1:
+        # and stops at the first false and or stops at the first true, so
+        # anything after one of those is never evaluated, and true in an and or
+        # false in an or doesn't change the result
+        stop = code == OR
+        kept = []
+        for child in children:
+            value = literal_value(child)
+            if value is stop:
+                # If nothing before it has to be evaluated, this is the result
+                if len(kept) == 0:
+                    return boolean_token(stop)
+                kept.append(child)
+                break
+            elif value is not (not stop):
+                kept.append(child)
+
+        if len(kept) == 0:
+            return boolean_token(not stop)
+        # Operators always have two operands, so a call that would be left with
+        # one is either replaced with it or left alone
+        if len(kept) == 1:
+            if literal_value(kept[0]) is None:
+                return kept[0]
+        elif len(kept) != len(children):
+            call.children = kept
+
+    return call
+
+# Get the state for a child: where it is, and what type of value it is given to
+#
+# The last statement of a block is the value of the block, so it is only
+# treated as a statement if the block isn't used for its value (as with the
+# blocks of static and stub scripts, which return it).
+def child_state(node, index, state):
+    position, value_type, global_types = state
+    node_type = node.statement_type
+
+    if node_type == StatementType.SCRIPT_BLOCK:
+        if position == IN_VALUE and index == len(node.children) - 1:
+            return (IN_VALUE, value_type, global_types)
+        return (IN_BLOCK, None, global_types)
+    elif node_type == StatementType.EXPRESSION:
+        return state
+    elif node_type == StatementType.IF_STATEMENT:
+        if index == 0:
+            return (IN_VALUE, None, global_types)
+        elif position == IN_VALUE:
+            return (IN_VALUE, value_type, global_types)
+        return (IN_ELSE if index == 2 else IN_BLOCK, None, global_types)
+    elif node_type == StatementType.COND_STATEMENT:
+        if is_condition(node, index):
+            return (IN_VALUE, None, global_types)
+        elif position == IN_VALUE:
+            return (IN_VALUE, value_type, global_types)
+        return (IN_BLOCK, None, global_types)
+    elif node_type == StatementType.SCRIPT_DEFINITION:
+        if node.script_type == "static" or node.script_type == "stub":
+            return (IN_VALUE, node.script_return_type, global_types)
+        return (IN_BLOCK, None, global_types)
+    elif node_type == StatementType.GLOBAL_DEFINITION:
+        return (IN_VALUE, node.global_type, global_types)
+    elif node_type == StatementType.FUNCTION_CALL:
+        code = node.function_code
+        if code in ARITHMETIC or code in COMPARISONS:
+            return (IN_VALUE, "real", global_types)
+        if code == SET and index == 1 and len(node.children) == 2:
+            variable = unwrap(node.children[0])
+            if isinstance(variable, Token) and variable.token in global_types:
+                return (IN_VALUE, global_types[variable.token], global_types)
+    return (IN_VALUE, None, global_types)
+
+# Whether a node is a block with nothing in it, which Halo needs a filler
+# statement for
+def is_empty_block(node):
+    node = unwrap(node)
+    return not isinstance(node, Token) and node.statement_type == StatementType.SCRIPT_BLOCK and len(node.children) == 0
+
+def fold_node(node, state):
+    if isinstance(node, Token):
+        return node
+    position, value_type, global_types = state
+    node_type = node.statement_type
+
+    if node_type == StatementType.FUNCTION_CALL:
+        # A statement on its own is left as a function call, since a literal
+        # doesn't do anything as a statement
+        folded = fold_call(node, value_type, global_types)
+        if position == IN_BLOCK and isinstance(unwrap(folded), Token):
+            return node
+        return folded
+
+    elif node_type == StatementType.EXPRESSION:
+        if len(node.children) != 1:
+            return node
+        child = node.children[0]
+        if child is None:
+            return None
+        if position != IN_VALUE and not isinstance(child, Token) and child.statement_type == StatementType.SCRIPT_BLOCK:
+            return child
+        return node
+
+    elif node_type == StatementType.SCRIPT_BLOCK:
+        splice_block(node)
+        return node
+
+    elif node_type == StatementType.IF_STATEMENT:
+        # An else that was folded away (or into nothing) isn't needed
+        if len(node.children) == 3 and (node.children[2] is None or is_empty_block(node.children[2])):
+            node.children = node.children[:2]
+        if len(node.children) < 2:
+            return node
+
+        # Neither is an if statement that doesn't run anything, as long as
+        # checking its condition doesn't do anything either
+        if position != IN_VALUE and len(node.children) == 2 and is_empty_block(node.children[1]) and not has_side_effects(node.children[0]):
+            return None
+
+        condition = literal_value(node.children[0])
+        if not isinstance(condition, bool):
+            return node
+        if condition:
+            chosen = node.children[1]
+        else:
+            chosen = node.children[2] if len(node.children) == 3 else None
+
+        if position != IN_VALUE:
+            return chosen
+
+        # Only one thing can take the place of an if statement that gives a value
+        if chosen is None:
+            return node
+        if chosen.statement_type == StatementType.SCRIPT_BLOCK:
+            return chosen.children[0] if len(chosen.children) == 1 else node
+        return chosen
+
+    return node
+
+# Get the types of the globals defined in a statement (either a script or a
+# single definition), adding them to global_types
+def collect_global_types(statement, global_types):
+    definitions = statement.children if statement.statement_type == StatementType.MAIN_SCRIPT_BLOCK else (statement,)
+    for definition in definitions:
+        if definition.statement_type == StatementType.GLOBAL_DEFINITION:
+            global_types[definition.global_name] = definition.global_type
+    return global_types
+
+# Fold constant expressions in a statement tree
+#
+# Arithmetic, comparisons and not, and and or of literals are worked out ahead
+# of time the way Halo would, and additions of 0, multiplications by 1 and the
+# like are removed if that doesn't change the value. If statements whose
+# conditions are true or false are replaced with the block that would be run.
+# global_types maps the names of globals to their types, and is found from the
+# statement if not given. The tree is changed in place, and the statement that
+# replaces it is returned.
+def fold_constants(statement, global_types = None):
+    if global_types is None:
+        global_types = collect_global_types(statement, {})
+    return rewrite(statement, fold_node, child_state, (IN_VALUE, None, global_types))
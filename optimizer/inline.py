@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#
+# optimizer/inline.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token, TokenType
+from parser import StatementType
+from .tree import NODE_LIMIT, rewrite, unwrap, copy_tree, count_nodes
+from .fold import ARITHMETIC, collect_global_types
+
+# Most nodes the body of a static script can have to be inlined
+INLINE_MAX_NODES = 10
+
+# Get the lowercase names of the functions called in a statement tree
+def called_names(statement):
+    names = set()
+    stack = [statement]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, Token):
+            continue
+        if node.statement_type == StatementType.FUNCTION_CALL:
+            names.add(node.function_name.lower())
+        stack.extend(node.children)
+    return names
+
+# Whether an expression could give a real, which returning from a short or long
+# static script would round
+def may_be_real(node, global_types):
+    node = unwrap(node)
+    if isinstance(node, Token):
+        return node.token_type == TokenType.FLOAT or global_types.get(node.token) == "real"
+    return node.statement_type == StatementType.FUNCTION_CALL and node.function_code in ARITHMETIC
+
+# Get the static scripts that could be inlined, by lowercase name, as the one
+# statement each of them runs
+#
+# Scripts defined more than once (such as a static script that replaces a
+# stub) could be replaced by another definition, and scripts that return a
+# short or long could round what they return, so neither are inlined.
+def inline_candidates(statement, global_types):
+    counts = {}
+    for definition in statement.children:
+        if definition.statement_type == StatementType.SCRIPT_DEFINITION:
+            name = definition.script_name.lower()
+            counts[name] = counts.get(name, 0) + 1
+
+    candidates = {}
+    for definition in statement.children:
+        if definition.statement_type != StatementType.SCRIPT_DEFINITION or definition.script_type != "static":
+            continue
+        name = definition.script_name.lower()
+        block = definition.children[0] if len(definition.children) == 1 else None
+        if counts[name] != 1 or block is None or isinstance(block, Token) or len(block.children) != 1:
+            continue
+        body = block.children[0]
+        if definition.script_return_type in ("short", "long") and may_be_real(body, global_types):
+            continue
+        candidates[name] = body
+    return candidates
+
+# Sort the candidates so each one comes after those it calls, leaving out any
+# that call themselves (directly or through others)
+def order_candidates(candidates):
+    return order_calls({name: called_names(body) & candidates.keys() for name, body in candidates.items()})
+
+# Sort scripts so each one comes after those it calls, leaving out any that
+# call themselves (directly or through others)
+#
+# calls maps the name of each script to the names of the scripts it calls,
+# which all have to be in calls too.
+def order_calls(calls):
+    order = []
+    state = {}
+
+    for start in calls:
+        if start in state:
+            continue
+        state[start] = 0
+        stack = [(start, iter(calls[start]))]
+        while len(stack) > 0:
+            name, callees = stack[-1]
+            callee = next(callees, None)
+            if callee is None:
+                stack.pop()
+                if state[name] == 0:
+                    state[name] = 1
+                    order.append(name)
+            elif callee not in state:
+                state[callee] = 0
+                stack.append((callee, iter(calls[callee])))
+            elif state[callee] == 0:
+                # Calls back into a script that hasn't finished, so everything
+                # from there to here is recursive
+                on_stack = [entry_name for entry_name, entry_callees in stack]
+                for entry_name in on_stack[on_stack.index(callee):]:
+                    state[entry_name] = 2
+
+    return [name for name in order if state[name] == 1]
+
+# Whether a child is a statement of a block, where a token can't take the
+# place of a call but an if statement can
+def child_in_block(node, index, in_block):
+    if node.statement_type == StatementType.SCRIPT_BLOCK:
+        return True
+    return in_block and node.statement_type == StatementType.EXPRESSION
+
+# Replaces calls to inlined scripts with copies of what they run, as long as
+# the script stays within node_limit nodes (if it isn't None)
+class Inliner:
+    bodies = None
+    sizes = None
+    nodes = 0
+    node_limit = NODE_LIMIT
+
+    def __init__(self, nodes, node_limit):
+        self.bodies = {}
+        self.sizes = {}
+        self.nodes = nodes
+        self.node_limit = node_limit
+
+    def add(self, name, body):
+        self.bodies[name] = body
+        self.sizes[name] = count_nodes(body)
+
+    def inline_node(self, node, in_block):
+        if isinstance(node, Token) or node.statement_type != StatementType.FUNCTION_CALL or len(node.children) != 0:
+            return node
+        name = node.function_name.lower()
+        body = self.bodies.get(name)
+        if body is None:
+            return node
+
+        # A statement has to be a call or if statement, and serpent can't have
+        # if statements in expressions
+        inner = unwrap(body)
+        if isinstance(inner, Token):
+            if in_block:
+                return node
+        elif inner.statement_type != StatementType.FUNCTION_CALL and not in_block:
+            return node
+
+        # A call is two nodes, and the copy of the body takes their place
+        added = self.sizes[name] - 2
+        if added > 0 and self.node_limit is not None and self.nodes + added > self.node_limit:
+            return node
+        self.nodes = self.nodes + added
+        return copy_tree(body)
+
+    def inline(self, statement, in_block = False):
+        return rewrite(statement, self.inline_node, child_in_block, in_block)
+
+# Replace calls to small static scripts with what they run
+#
+# Static scripts that run one statement of at most max_nodes nodes (counting
+# any scripts inlined into it), that don't call themselves and that aren't
+# defined more than once are inlined wherever they are called. Calls are only
+# inlined while the script stays within node_limit nodes. The scripts are left
+# in place. Only works on a whole script, so a single definition is returned
+# as is. The tree is changed in place, and the statement that replaces it is
+# returned.
+def inline_statics(statement, global_types = None, max_nodes = INLINE_MAX_NODES, node_limit = NODE_LIMIT):
+    if statement.statement_type != StatementType.MAIN_SCRIPT_BLOCK:
+        return statement
+    if global_types is None:
+        global_types = collect_global_types(statement, {})
+
+    candidates = inline_candidates(statement, global_types)
+    if len(candidates) == 0:
+        return statement
+
+    # Inline into a copy of each candidate first, so inlining it inlines those
+    # too. These copies aren't in the script, so they don't count towards the
+    # limit.
+    expander = Inliner(0, None)
+    for name in order_candidates(candidates):
+        body = expander.inline(copy_tree(candidates[name]), True)
+        if count_nodes(body) <= max_nodes:
+            expander.add(name, body)
+    if len(expander.bodies) == 0:
+        return statement
+
+    inliner = Inliner(count_nodes(statement), node_limit)
+    inliner.bodies = expander.bodies
+    inliner.sizes = expander.sizes
+    for definition in statement.children:
+        inliner.inline(definition)
+    return statement
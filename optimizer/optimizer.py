@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# optimizer/optimizer.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from parser import StatementType
+from .fold import fold_constants, collect_global_types
+from .inline import inline_statics
+from .unused import remove_unused
+from .flatten import flatten
+from .cond import lower_conditions
+from .tree import count_nodes
+
+# Passes run by optimize(), in order
+#
+# Each one takes a statement tree and the types of the globals by name, changes
+# the tree in place, and returns the statement that replaces it.
+PASSES = [
+    inline_statics,
+    fold_constants,
+    flatten,
+    lower_conditions
+]
+
+# Get the passes to run, which are PASSES if optimizing and remove_unused if
+# removing unused globals and scripts
+#
+# remove_unused changes which globals and scripts a script has, so it is only
+# run if asked for. It is run after scripts are inlined and constants are
+# folded, so scripts that are no longer called and anything only used by if
+# statements that were folded away are removed too.
+def select_passes(optimize = True, remove_unused_definitions = False):
+    passes = list(PASSES) if optimize else []
+    if remove_unused_definitions:
+        passes.insert(passes.index(fold_constants) + 1 if optimize else 0, remove_unused)
+    return passes
+
+# Get the name of each global and script definition in a statement (either a
+# script or a single definition) and how many nodes it has, by definition
+def definition_nodes(statement):
+    definitions = statement.children if statement.statement_type == StatementType.MAIN_SCRIPT_BLOCK else (statement,)
+    nodes = {}
+    for definition in definitions:
+        if definition.statement_type == StatementType.GLOBAL_DEFINITION:
+            name = "global " + definition.global_name
+        else:
+            name = "script " + definition.script_name
+        nodes[id(definition)] = (name, count_nodes(definition))
+    return nodes
+
+# Optimize a statement tree (either a whole script or a single definition)
+#
+# global_types maps the names of globals to their types. If converting one
+# definition at a time, pass the same dict for every definition so globals
+# defined earlier are known. passes is the list of passes to run (PASSES if
+# not given). If report is a list, a (name, nodes, removed) tuple is added to
+# it for each definition, where nodes is how many nodes it had before and after
+# each pass (0 once it is removed). Returns the optimized statement.
+def optimize(statement, global_types = None, report = None, passes = None):
+    if global_types is None:
+        global_types = {}
+    if passes is None:
+        passes = PASSES
+    collect_global_types(statement, global_types)
+
+    counts = [definition_nodes(statement)] if report is not None else None
+    for optimization_pass in passes:
+        statement = optimization_pass(statement, global_types)
+        if counts is not None:
+            counts.append(definition_nodes(statement))
+
+    if counts is not None:
+        for definition, (name, nodes) in counts[0].items():
+            report.append((name, [nodes] + [pass_counts.get(definition, (name, 0))[1] for pass_counts in counts[1:]], definition not in counts[-1]))
+    return statement
+
+# Get a report of how many nodes each definition had before and after being
+# optimized, and how many each of passes (PASSES if not given) saved, as a list
+# of lines
+def format_report(report, passes = None):
+    if passes is None:
+        passes = PASSES
+    names = [optimization_pass.__name__ for optimization_pass in passes]
+    widths = [max(len(name), 8) for name in names]
+
+    lines = ["{:30s} {:>8s} {:s} {:>8s} {:>8s}".format("Definition", "Before", " ".join("{:>{:d}s}".format(name, width) for name, width in zip(names, widths)), "After", "Saved")]
+    totals = None
+    removed = 0
+
+    for name, nodes, definition_removed in report:
+        totals = list(nodes) if totals is None else [total + count for total, count in zip(totals, nodes)]
+        if definition_removed:
+            name = name + " (removed)"
+            removed = removed + 1
+        lines.append(format_report_line(name, nodes, widths))
+
+    if totals is not None:
+        lines.append(format_report_line("total", totals, widths))
+    if removed > 0:
+        lines.append("{:d} unused definition{:s} removed".format(removed, "" if removed == 1 else "s"))
+    return lines
+def format_report_line(name, nodes, widths):
+    saved = " ".join("{:{:d}d}".format(nodes[i] - nodes[i + 1], width) for i, width in enumerate(widths))
+    return "{:30s} {:8d} {:s} {:8d} {:8d}".format(name, nodes[0], saved, nodes[-1], nodes[0] - nodes[-1])
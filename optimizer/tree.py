@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+#
+# optimizer/tree.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import copy
+
+from tokenizer import Token, NO_CODE
+from parser import StatementType, Atom
+
+# Where a node is, which decides what it can be replaced with
+#
+# A statement in a block can be removed (replaced with None) or replaced with a
+# block, whose statements then take its place. The else of an if statement
+# can be removed or replaced with a block or if statement. Anything else has to
+# be replaced with a single node.
+IN_BLOCK = 0
+IN_ELSE = 1
+IN_VALUE = 2
+
+# Rewrite a statement tree from the bottom up
+#
+# child_state(node, index, state) returns the state passed down to a node's
+# child, starting with state for statement. rewrite_node(node, state) is then
+# called on every node after all of its children, and returns the node that
+# replaces it (or the same node). The tree is walked with an explicit stack
+# rather than by recursion, so it can be nested as deeply as needed. Returns
+# what replaces statement.
+def rewrite(statement, rewrite_node, child_state, state = None):
+    order = []
+    stack = [(statement, None, 0, state)]
+
+    while len(stack) > 0:
+        entry = stack.pop()
+        order.append(entry)
+        node, parent, index, node_state = entry
+        if isinstance(node, (Token, Atom)):
+            continue
+        for child_index, child in enumerate(node.children):
+            stack.append((child, node, child_index, child_state(node, child_index, node_state)))
+
+    for node, parent, index, node_state in reversed(order):
+        replacement = rewrite_node(node, node_state)
+        if parent is None:
+            statement = replacement
+        elif replacement is not node:
+            parent.children[index] = replacement
+
+    return statement
+
+# Get the node an expression evaluates, skipping expressions and atoms that
+# only wrap something else
+def unwrap(node):
+    while not isinstance(node, Token):
+        if isinstance(node, Atom):
+            return node.token
+        if node.statement_type != StatementType.EXPRESSION or len(node.children) != 1:
+            return node
+        node = node.children[0]
+    return node
+
+# Make a token that wasn't in the script
+def make_token(text, token_type):
+    token = Token()
+    token.token = text
+    token.token_type = token_type
+    token.code = NO_CODE
+    return token
+
+# Put the statements of any blocks in a block's place, and drop any removed
+# statements (None)
+def splice_block(block):
+    spliced = False
+    for child in block.children:
+        if child is None or (not isinstance(child, Token) and child.statement_type == StatementType.SCRIPT_BLOCK):
+            spliced = True
+            break
+    if not spliced:
+        return
+
+    children = []
+    for child in block.children:
+        if child is None:
+            continue
+        if not isinstance(child, Token) and child.statement_type == StatementType.SCRIPT_BLOCK:
+            children.extend(child.children)
+        else:
+            children.append(child)
+    block.children = children
+
+# Most script nodes Halo allows in a scenario
+NODE_LIMIT = 19001
+
+# Nodes in the (+ 0 0) written for an empty block or script
+EMPTY_BLOCK_NODES = 4
+
+# Copy a statement tree, sharing its tokens
+def copy_tree(statement):
+    if isinstance(statement, (Token, Atom)):
+        return copy.copy(statement) if isinstance(statement, Atom) else statement
+
+    root = copy.copy(statement)
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        children = []
+        for child in node.children:
+            if isinstance(child, Token) or child is None:
+                children.append(child)
+            else:
+                child = copy.copy(child)
+                children.append(child)
+                if not isinstance(child, Atom):
+                    stack.append(child)
+        if not isinstance(node.children, tuple):
+            node.children = children
+    return root
+
+# Whether a child of an if statement or cond is one of its conditions rather
+# than one of its blocks
+def is_condition(node, index):
+    if node.statement_type == StatementType.IF_STATEMENT:
+        return index == 0
+    return index % 2 == 0 and index < len(node.children) - 1
+
+# Count the nodes Halo would make for a statement tree
+#
+# Halo stores a function call (including if, cond and begin) as a node for
+# itself and one for the function's name, and every parameter (including each
+# clause of a cond, and the true of its last clause if it has an else) as a
+# node of its own. Blocks of one statement are written
+# without a begin, and empty blocks and scripts are written as (+ 0 0).
+# Expressions that only wrap something else and the definitions themselves
+# aren't counted.
+def count_nodes(statement):
+    count = 0
+    stack = [statement]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, Token):
+            count = count + 1
+            continue
+        node_type = node.statement_type
+        if node_type == StatementType.FUNCTION_CALL or node_type == StatementType.IF_STATEMENT:
+            count = count + 2
+        elif node_type == StatementType.COND_STATEMENT:
+            count = count + 2 + (len(node.children) + 1) // 2 + len(node.children) % 2
+        elif node_type == StatementType.SCRIPT_BLOCK and len(node.children) > 1:
+            count = count + 2
+        elif (node_type == StatementType.SCRIPT_BLOCK or node_type == StatementType.SCRIPT_DEFINITION) and len(node.children) == 0:
+            count = count + EMPTY_BLOCK_NODES
+        stack.extend(node.children)
+    return count
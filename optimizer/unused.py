@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# optimizer/unused.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import Token, TokenType
+from tokenizer.symbols import ARITHMETIC_CODES, EQUALS, NOT
+from parser import StatementType
+
+# Scripts that Halo runs on its own (or that are woken by name), which are
+# always kept along with everything they use
+ROOT_SCRIPT_TYPES = frozenset(("startup", "continuous", "dormant"))
+
+# Functions that can't do anything but give a value
+PURE_CODES = ARITHMETIC_CODES | frozenset((EQUALS, NOT))
+
+# Get the lowercase names of every function called and every token used in a
+# definition, which covers calls to scripts, reads and writes of globals, and
+# scripts passed by name (as to wake)
+def referenced_names(definition):
+    names = set()
+    stack = [definition]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, Token):
+            if node.token_type == TokenType.OTHER:
+                names.add(node.token.lower())
+            continue
+        if node.statement_type == StatementType.FUNCTION_CALL:
+            names.add(node.function_name.lower())
+        stack.extend(node.children)
+    return names
+
+# Whether evaluating a node (such as a global's initial value) could do
+# anything other than give a value, such as placing AI, in which case a global
+# is kept even if unused
+def has_side_effects(node):
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, Token):
+            continue
+        if node.statement_type == StatementType.FUNCTION_CALL and node.function_code not in PURE_CODES:
+            return True
+        stack.extend(node.children)
+    return False
+
+def definition_name(definition):
+    if definition.statement_type == StatementType.GLOBAL_DEFINITION:
+        return definition.global_name.lower()
+    return definition.script_name.lower()
+
+# Remove the globals and static and stub scripts that nothing uses
+#
+# Startup, continuous and dormant scripts, and globals whose initial values
+# call functions, are always kept. So is everything they use, and everything
+# that uses, and so on. Names are compared without case, as Halo does. Only
+# works on a whole script, so a single definition is returned as is. The tree
+# is changed in place, and the statement that replaces it is returned.
+def remove_unused(statement, global_types = None):
+    if statement.statement_type != StatementType.MAIN_SCRIPT_BLOCK:
+        return statement
+
+    # Stub scripts share their names with the static scripts that replace them
+    definitions = {}
+    pending = []
+    for definition in statement.children:
+        name = definition_name(definition)
+        definitions.setdefault(name, []).append(definition)
+        if definition.statement_type == StatementType.SCRIPT_DEFINITION:
+            if definition.script_type in ROOT_SCRIPT_TYPES:
+                pending.append(name)
+        elif has_side_effects(definition):
+            pending.append(name)
+
+    used = set(pending)
+    while len(pending) > 0:
+        for definition in definitions[pending.pop()]:
+            for name in referenced_names(definition):
+                if name in definitions and name not in used:
+                    used.add(name)
+                    pending.append(name)
+
+    statement.children = [definition for definition in statement.children if definition_name(definition) in used]
+    return statement
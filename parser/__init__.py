@@ -22,6 +22,31 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .serpent_parser import parse as parse_serpent_script
-from .hsc_parser import parse as parse_hsc_script
-from .types import StatementType, ParserError, SCRIPT_TYPES, VALUE_TYPES, Statement
+import importlib
+
+from .types import StatementType, ParserError, SCRIPT_TYPES, VALUE_TYPES, Statement, Node, GlobalDef, ScriptDef, Block, If, Cond, Call, Expression, Atom, NO_CHILDREN
+
+# Everything else is imported the first time it is used, so converting in one
+# direction doesn't load the parser for the other
+LAZY_EXPORTS = {
+    "parse_serpent_script": (".serpent_parser", "parse"),
+    "parse_serpent_definitions": (".serpent_parser", "parse_definitions"),
+    "parse_hsc_script": (".hsc_parser", "parse"),
+    "parse_hsc_definitions": (".hsc_parser", "parse_definitions"),
+    "Arena": (".arena", "Arena"),
+    "ArenaNode": (".arena", "ArenaNode"),
+    "build_arena": (".arena", "build_arena"),
+    "parse_serpent_arena": (".arena", "parse_serpent_arena"),
+    "parse_hsc_arena": (".arena", "parse_hsc_arena")
+}
+
+def __getattr__(name):
+    if name not in LAZY_EXPORTS:
+        raise AttributeError("module {:s} has no attribute {:s}".format(__name__, name))
+    module, attribute = LAZY_EXPORTS[name]
+    value = getattr(importlib.import_module(module, __name__), attribute)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_EXPORTS))
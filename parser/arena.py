@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+#
+# parser/arena.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from array import array
+from tokenizer import Token, KEYWORD_CODES, NO_CODE
+from tokenizer.types import TOKEN_TYPES
+from .types import Node, StatementType
+from .serpent_parser import parse_definitions as parse_serpent_definitions
+from .hsc_parser import parse_definitions as parse_hsc_definitions
+
+# Statement types by value, for turning a stored kind back into a StatementType
+STATEMENT_TYPES = tuple(StatementType)
+
+# Kind of an arena node that is a token rather than a statement
+TOKEN = len(STATEMENT_TYPES)
+
+# Index of the main script block, and of a child or sibling that isn't there
+ROOT = 0
+NONE = -1
+
+# Statement tree stored as columns of numbers
+#
+# Each node is an index into the same few arrays rather than an object, which
+# costs 17 bytes per node:
+#
+# kinds          StatementType value of the node, or TOKEN
+# first_children index of the node's first child, or NONE
+# next_siblings  index of the node's next sibling, or NONE
+# tokens         for TOKEN nodes, index into the token columns, or NONE
+# names          index into name_table of the node's text
+#
+# The text is the token for TOKEN nodes and the function name for function
+# calls. For global and script definitions, it is a tuple of their fields.
+# Each distinct text is stored once.
+#
+# An arena holds no Python objects other than its name table, so it is quick to
+# pickle and send to another process. Use root() to get the tree as nodes the
+# compilers accept, or children() to walk it by index.
+class Arena:
+    kinds = None
+    first_children = None
+    next_siblings = None
+    tokens = None
+    names = None
+
+    name_table = None
+    name_indices = None
+
+    # Token columns, for TOKEN nodes
+    token_types = None
+    token_lines = None
+    token_characters = None
+
+    # Last top-level definition, for adding the next one after it
+    last_definition = NONE
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.tokens = array("i")
+        self.names = array("i")
+        self.name_table = []
+        self.name_indices = {}
+        self.token_types = array("B")
+        self.token_lines = array("I")
+        self.token_characters = array("I")
+        self.new_node(StatementType.MAIN_SCRIPT_BLOCK.value, NONE, None)
+
+    # Add a node with no children or siblings, returning its index
+    def new_node(self, kind, token, name):
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        self.first_children.append(NONE)
+        self.next_siblings.append(NONE)
+        self.tokens.append(token)
+        self.names.append(self.intern(name))
+        return index
+
+    # Get the index of a name in the name table, adding it if it isn't there
+    def intern(self, name):
+        index = self.name_indices.get(name)
+        if index is None:
+            index = len(self.name_table)
+            self.name_table.append(name)
+            self.name_indices[name] = index
+        return index
+
+    # Add a node (or token) for an object in a statement tree, returning its index
+    def new_node_for(self, statement):
+        if isinstance(statement, Token):
+            token = len(self.token_types)
+            self.token_types.append(statement.token_type.value)
+            self.token_lines.append(statement.line if statement.line is not None else 0)
+            self.token_characters.append(statement.character)
+            return self.new_node(TOKEN, token, statement.token)
+
+        type = statement.statement_type
+        if type == StatementType.GLOBAL_DEFINITION:
+            name = (statement.global_type, statement.global_name)
+        elif type == StatementType.SCRIPT_DEFINITION:
+            name = (statement.script_type, statement.script_return_type, statement.script_name)
+        else:
+            name = statement.function_name
+        return self.new_node(type.value, NONE, name)
+
+    # Add a top-level definition to the end of the main script block
+    #
+    # The definition's tree is copied in with an explicit stack, and the
+    # children of each node are given consecutive indices.
+    def add_definition(self, statement):
+        index = self.new_node_for(statement)
+        if self.last_definition == NONE:
+            self.first_children[ROOT] = index
+        else:
+            self.next_siblings[self.last_definition] = index
+        self.last_definition = index
+
+        stack = [(statement, index)]
+        while len(stack) > 0:
+            statement, index = stack.pop()
+            if isinstance(statement, Token) or len(statement.children) == 0:
+                continue
+
+            previous = NONE
+            for child in statement.children:
+                child_index = self.new_node_for(child)
+                if previous == NONE:
+                    self.first_children[index] = child_index
+                else:
+                    self.next_siblings[previous] = child_index
+                previous = child_index
+                stack.append((child, child_index))
+
+    # Iterate through the indices of a node's children
+    def children(self, index):
+        child = self.first_children[index]
+        while child != NONE:
+            yield child
+            child = self.next_siblings[child]
+
+    # Get a Token for a TOKEN node
+    def token(self, index):
+        token_index = self.tokens[index]
+        token = Token()
+        token.token = self.name_table[self.names[index]]
+        token.token_type = TOKEN_TYPES[self.token_types[token_index]]
+        token.code = KEYWORD_CODES.get(token.token, NO_CODE)
+        token.line = self.token_lines[token_index]
+        token.character = self.token_characters[token_index]
+        return token
+
+    # Get the main script block as a node that can be passed to the compilers
+    def root(self):
+        return ArenaNode(self, ROOT)
+
+    # The name index is only needed for adding nodes, and it can be rebuilt
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("name_indices", None)
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.name_indices = {name: index for index, name in enumerate(self.name_table)}
+
+    def __len__(self):
+        return len(self.kinds)
+    def __repr__(self):
+        return "<arena nodes=" + str(len(self.kinds)) + " names=" + str(len(self.name_table)) + ">"
+
+# Statement in an arena
+#
+# This reads each field from the arena when it is used, so an arena can be
+# compiled or walked like any other statement tree. Its children are made as
+# new ArenaNode and Token objects each time they are read and aren't kept, so
+# they are freed once whatever read them is done with them. Read them once
+# rather than for every use.
+class ArenaNode(Node):
+    __slots__ = ("arena", "index", "kind")
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+        self.kind = arena.kinds[index]
+
+    @property
+    def statement_type(self):
+        return STATEMENT_TYPES[self.kind]
+
+    @property
+    def children(self):
+        arena = self.arena
+        return [arena.token(child) if arena.kinds[child] == TOKEN else ArenaNode(arena, child) for child in arena.children(self.index)]
+
+    def name(self):
+        return self.arena.name_table[self.arena.names[self.index]]
+
+    @property
+    def function_name(self):
+        if self.kind != StatementType.FUNCTION_CALL.value:
+            return None
+        return self.name()
+    @property
+    def function_code(self):
+        return KEYWORD_CODES.get(self.function_name, NO_CODE)
+
+    @property
+    def global_type(self):
+        if self.kind != StatementType.GLOBAL_DEFINITION.value:
+            return None
+        return self.name()[0]
+    @property
+    def global_name(self):
+        if self.kind != StatementType.GLOBAL_DEFINITION.value:
+            return None
+        return self.name()[1]
+
+    @property
+    def script_type(self):
+        if self.kind != StatementType.SCRIPT_DEFINITION.value:
+            return None
+        return self.name()[0]
+    @property
+    def script_return_type(self):
+        if self.kind != StatementType.SCRIPT_DEFINITION.value:
+            return None
+        return self.name()[1]
+    @property
+    def script_name(self):
+        if self.kind != StatementType.SCRIPT_DEFINITION.value:
+            return None
+        return self.name()[2]
+
+    def __repr__(self):
+        return "<arena node index=" + str(self.index) + " type=" + str(self.statement_type) + ">"
+
+# Make an arena from top-level definitions, such as the ones yielded by
+# parse_serpent_definitions() or parse_hsc_definitions()
+def build_arena(definitions):
+    arena = Arena()
+    for definition in definitions:
+        arena.add_definition(definition)
+    return arena
+
+# Parse a script straight into an arena
+#
+# The script is parsed one definition at a time, so only one definition's
+# statements exist as objects at once.
+def parse_serpent_arena(tokens):
+    return build_arena(parse_serpent_definitions(tokens))
+
+def parse_hsc_arena(tokens):
+    return build_arena(parse_hsc_definitions(tokens))
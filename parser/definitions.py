@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+# parser/definitions.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from tokenizer import TokenType
+from tokenizer.symbols import GLOBAL, IF, END, LEFT_PARENTHESIS, RIGHT_PARENTHESIS, SCRIPT_TYPE_CODES
+from .types import ParserError
+
+# Split serpent tokens into groups of whole top-level definitions
+#
+# A new group starts at each global or script header that is not inside of a
+# script. Scripts are tracked by counting if and end tokens, so a group may hold
+# more than one definition if that count is thrown off, which is harmless. If
+# a group is cut too early, parsing it fails and parse_groups() handles it.
+def split_serpent(tokens):
+    group = []
+    depth = 0
+
+    for token in tokens:
+        if token.token_type == TokenType.OTHER:
+            code = token.code
+            if depth == 0 and (code == GLOBAL or code in SCRIPT_TYPE_CODES):
+                if len(group) > 0:
+                    yield group
+                    group = []
+                if code != GLOBAL:
+                    depth = 1
+            elif depth > 0:
+                if code == IF:
+                    depth = depth + 1
+                elif code == END:
+                    depth = depth - 1
+
+        group.append(token)
+
+    if len(group) > 0:
+        yield group
+
+# Split HSC tokens into groups of whole top-level definitions
+#
+# A group ends when the parenthesis that started it is closed.
+def split_hsc(tokens):
+    group = []
+    depth = 0
+
+    for token in tokens:
+        group.append(token)
+        if token.token_type == TokenType.SYMBOL:
+            if token.code == LEFT_PARENTHESIS:
+                depth = depth + 1
+            elif token.code == RIGHT_PARENTHESIS:
+                depth = depth - 1
+                if depth == 0:
+                    yield group
+                    group = []
+
+    if len(group) > 0:
+        yield group
+
+# Parse groups of tokens with parse(), yielding each top-level definition
+#
+# The parsers look at the token after a definition, so each group is parsed
+# with the first token of the next group after it. If that does not parse to
+# exactly the end of the group, it was cut too early, so it is joined with the
+# next group and tried again. The last group is parsed on its own, so this
+# gives the same result (and the same error) as parsing everything at once.
+def parse_groups(groups, parse):
+    groups = iter(groups)
+    group = next(groups, None)
+
+    for next_group in groups:
+        group.append(next_group[0])
+        try:
+            script = parse(group, len(group) - 1)
+        except ParserError:
+            script = None
+        group.pop()
+
+        if script is not None and script.token_count == len(group):
+            yield from script.children
+            group = next_group
+        else:
+            group.extend(next_group)
+
+    if group is not None:
+        yield from parse(group).children
@@ -24,22 +24,31 @@
 
 import sys
 from error import warning, error, show_message_for_character
-from tokenizer import Token, TokenType, ARITHMETIC_SYMBOLS, EQUALITY_OPERATORS, RELATIONAL_OPERATORS, LOGICAL_OPERATORS
-from .types import StatementType, ParserError, SCRIPT_TYPES, VALUE_TYPES, Statement
+from tokenizer import Token, TokenType
+from tokenizer.symbols import GLOBAL, SCRIPT, IF, BEGIN, COND, STATIC, STUB, EQUALS, LEFT_PARENTHESIS, RIGHT_PARENTHESIS
+from tokenizer.symbols import SCRIPT_TYPE_CODES, VALUE_TYPE_CODES, ARITHMETIC_CODES, VARIADIC_CODES
+from .types import StatementType, ParserError, Statement, GlobalDef, ScriptDef, Block, If, Cond, Call, Expression, Atom
+from .definitions import split_hsc, parse_groups
+from profiler.hooks import hooked, PHASE_PARSE
 
 # Parse the HSC script
-def parse(tokens):
+@hooked(PHASE_PARSE)
+def parse(tokens, end = None):
     next_token = 0
 
     main_script = Statement()
     main_script.statement_type = StatementType.MAIN_SCRIPT_BLOCK
     main_script.children = []
 
-    while next_token < len(tokens):
+    # Parse up to end, if only some of the tokens are to be parsed
+    if end is None:
+        end = len(tokens)
+
+    while next_token < end:
         token = tokens[next_token]
 
         # Make sure the next token is the beginning of something
-        if token.token != "(":
+        if token.code != LEFT_PARENTHESIS:
             raise ParserError(token, "Unexpected token", "Token used here")
 
         # Make sure we have enough tokens to do something
@@ -51,11 +60,11 @@ def parse(tokens):
         statement = None
 
         # Parse a global
-        if token_after.token == "global":
+        if token_after.code == GLOBAL:
             statement = parse_global(tokens, next_token)
 
         # Parse a script
-        elif token_after.token == "script":
+        elif token_after.code == SCRIPT:
             statement = parse_script(tokens, next_token)
 
         # Die alone
@@ -65,14 +74,22 @@ def parse(tokens):
         main_script.children.append(statement)
         next_token = next_token + statement.token_count
 
+    main_script.token_count = next_token
     return main_script
 
+# Parse a script one top-level definition at a time
+#
+# tokens can be any iterable of tokens, such as a generator. Each definition is
+# yielded as soon as it is complete, so only one definition's worth of tokens
+# is held at a time.
+def parse_definitions(tokens):
+    return parse_groups(split_hsc(tokens), parse)
+
 def parse_global(tokens, next_token):
     if next_token + 6 > len(tokens):
         raise ParserError(tokens[next_token], "Incomplete global definition", "Global defined here")
 
-    statement = Statement()
-    statement.statement_type = StatementType.GLOBAL_DEFINITION
+    statement = GlobalDef()
 
     # Make sure the name is valid
     global_name = tokens[next_token + 3]
@@ -82,7 +99,7 @@ def parse_global(tokens, next_token):
 
     # Make sure the type is valid
     statement.global_type = tokens[next_token + 2].token
-    if statement.global_type not in VALUE_TYPES:
+    if tokens[next_token + 2].code not in VALUE_TYPE_CODES:
         raise ParserError(tokens[next_token + 1], "Invalid global type {:s}".format(statement.global_type), "Global type defined here")
 
     # Parse the incoming expression
@@ -96,25 +113,24 @@ def parse_script(tokens, next_token):
     if next_token + 6 > len(tokens):
         raise ParserError(tokens[next_token], "Incomplete script definition", "Script defined here")
 
-    statement = Statement()
-    statement.statement_type = StatementType.SCRIPT_DEFINITION
+    statement = ScriptDef()
     first_token = next_token
 
     # Script type
     script_type = tokens[next_token + 2]
-    if script_type.token not in SCRIPT_TYPES:
+    if script_type.code not in SCRIPT_TYPE_CODES:
         raise ParserError(script_type, "Invalid script type {:s}".format(script_type.token), "Script type defined here")
     statement.script_type = script_type.token
 
     # Return type
-    requires_type = script_type.token == "stub" or script_type.token == "static"
+    requires_type = script_type.code == STUB or script_type.code == STATIC
 
     if requires_type:
         if next_token + 7 > len(tokens):
             raise ParserError(tokens[next_token], "Incomplete script definition", "Script defined here")
 
         script_return_type = tokens[next_token + 3]
-        if script_return_type.token not in VALUE_TYPES:
+        if script_return_type.code not in VALUE_TYPE_CODES:
             raise ParserError(script_type, "Invalid script return type {:s}".format(script_return_type.token), "Script return type defined here")
         statement.script_return_type = script_return_type.token
 
@@ -132,17 +148,16 @@ def parse_script(tokens, next_token):
     objects = []
     exited_properly = False
 
-    script_block = Statement()
-    script_block.statement_type = StatementType.SCRIPT_BLOCK
+    script_block = Block()
 
     while next_token < len(tokens):
         token = tokens[next_token]
-        if token.token == ")":
+        if token.code == RIGHT_PARENTHESIS:
             exited_properly = True
             break
         else:
             expression = parse_expression(tokens, next_token)
-            script_block.children.append(expression)
+            script_block.add_child(expression)
             next_token = next_token + expression.token_count
 
     # Make sure everything is all good
@@ -161,22 +176,64 @@ def parse_script(tokens, next_token):
 
 
 def parse_expression(tokens, next_token):
-    statement = Statement()
-    statement.statement_type = StatementType.EXPRESSION
-    if tokens[next_token].token == "(":
+    if tokens[next_token].code == LEFT_PARENTHESIS:
         function_call = parse_function_call(tokens, next_token)
-        statement.token_count = function_call.token_count
-        statement.children = [function_call]
+        return Expression([function_call], function_call.token_count)
     else:
-        statement.children = [tokens[next_token]]
-        statement.token_count = 1
-    return statement
+        return Atom(tokens[next_token])
 
 # Parse function calls e.g. (function arg1 arg2)
+#
+# Function calls inside of function calls are parsed with an explicit stack
+# rather than by recursion, so they can be nested as deeply as needed.
 def parse_function_call(tokens, next_token):
-    statement = Statement()
+    # Each entry is (statement, first token) for a function call whose
+    # parameters are still being parsed
+    stack = []
+
     first_token = next_token
-    statement.statement_type = StatementType.FUNCTION_CALL
+    statement = begin_function_call(tokens, next_token)
+    next_token = next_token + 2
+
+    while True:
+        if next_token >= len(tokens):
+            raise ParserError(tokens[next_token - 1], "Incomplete function call", "Expected `)` after here")
+
+        token = tokens[next_token]
+
+        # Clause of a cond, which is a condition followed by what to do if it
+        # is true rather than a function call
+        if token.code == LEFT_PARENTHESIS and statement.function_code == COND:
+            stack.append((statement, first_token))
+            first_token = next_token
+            statement = Block()
+            next_token = next_token + 1
+
+        # Function call in this function call
+        elif token.code == LEFT_PARENTHESIS:
+            stack.append((statement, first_token))
+            first_token = next_token
+            statement = begin_function_call(tokens, next_token)
+            next_token = next_token + 2
+
+        # Done with this one
+        elif token.code == RIGHT_PARENTHESIS:
+            statement.token_count = next_token - first_token + 1
+            statement = end_function_call(tokens, statement, first_token)
+            next_token = next_token + 1
+
+            if len(stack) == 0:
+                return statement
+
+            function_call = statement
+            statement, first_token = stack.pop()
+            statement.add_child(function_call)
+
+        else:
+            statement.add_child(token)
+            next_token = next_token + 1
+
+def begin_function_call(tokens, next_token):
     if next_token + 3 > len(tokens):
         raise ParserError(tokens[next_token], "Incomplete function call", "Function used here")
 
@@ -184,42 +241,55 @@ def parse_function_call(tokens, next_token):
     function_name = tokens[next_token + 1]
     if function_name.token_type == "(":
         raise ParserError(function_name, "Unexpected token", "Token used here")
-    statement.function_name = function_name.token
-
-    next_token = next_token + 2
-    exited_properly = False
-    while next_token < len(tokens):
-        token = tokens[next_token]
-        if token.token == ")":
-            exited_properly = True
-            break
-        else:
-            expression = parse_expression(tokens, next_token)
-            statement.children.append(expression.children[0])
-            next_token = next_token + expression.token_count
-
-    if not exited_properly:
-        raise ParserError(tokens[next_token - 1], "Incomplete function call", "Expected `)` after here")
 
-    statement.token_count = next_token - first_token + 1
+    return Call(function_name.token, function_name.code)
 
-    if statement.function_name == "begin":
-        statement.statement_type = StatementType.SCRIPT_BLOCK
-    elif statement.function_name == "if":
-        statement.statement_type = StatementType.IF_STATEMENT
+# Finish a function call, returning what it turns out to be
+def end_function_call(tokens, statement, first_token):
+    if statement.function_code == BEGIN:
+        return Block(statement.children, statement.token_count)
+    elif statement.function_code == IF:
         num_children = len(statement.children)
         if num_children < 2 or num_children > 3:
             raise ParserError(tokens[first_token], "Invalid if statement", "If statement defined here")
 
         for i in range(num_children - 1):
             if statement.children[1 + i].statement_type != StatementType.SCRIPT_BLOCK:
-                block = Statement()
-                block.statement_type = StatementType.SCRIPT_BLOCK
-                block.children = [statement.children[1 + i]]
-                statement.children[1 + i] = block
-    elif (statement.function_name in ARITHMETIC_SYMBOLS or statement.function_name == "=") and len(statement.children) != 2:
+                statement.children[1 + i] = Block([statement.children[1 + i]])
+
+        return If(statement.children, statement.token_count)
+    elif statement.function_code == COND:
+        return end_cond(tokens, statement, first_token)
+    elif statement.function_code in VARIADIC_CODES:
+        if len(statement.children) < 2:
+            raise ParserError(tokens[first_token], "Invalid arithmetic function", "Expected at least two parameters here")
+    elif (statement.function_code in ARITHMETIC_CODES or statement.function_code == EQUALS) and len(statement.children) != 2:
         raise ParserError(tokens[first_token], "Invalid arithmetic function", "Expected exactly two parameters here")
 
-
-
     return statement
+
+# Turn a cond into a chain of conditions and blocks
+#
+# Each clause is a condition followed by what to do if it is the first one that
+# is true. A last clause whose condition is true is what to do if none of the
+# others are, the same as an else.
+def end_cond(tokens, statement, first_token):
+    if len(statement.children) == 0:
+        raise ParserError(tokens[first_token], "Invalid cond", "Expected at least one condition here")
+
+    children = []
+    for clause in statement.children:
+        if isinstance(clause, Token) or clause.statement_type != StatementType.SCRIPT_BLOCK or len(clause.children) < 2:
+            raise ParserError(tokens[first_token], "Invalid cond", "Expected a condition and what to do if it is true here")
+
+        block = clause.children[1]
+        if len(clause.children) > 2 or isinstance(block, Token) or block.statement_type != StatementType.SCRIPT_BLOCK:
+            block = Block(clause.children[1:])
+        children.append(clause.children[0])
+        children.append(block)
+
+    last_condition = children[-2]
+    if len(children) > 2 and isinstance(last_condition, Token) and last_condition.token == "true":
+        del children[-2]
+
+    return Cond(children, statement.token_count)
@@ -26,28 +26,33 @@ import sys
 from enum import Enum
 from copy import copy
 from error import warning, error, show_message_for_character
-from tokenizer import Token, TokenType, ARITHMETIC_SYMBOLS, EQUALITY_OPERATORS, RELATIONAL_OPERATORS, LOGICAL_OPERATORS
-from .types import StatementType, ParserError, SCRIPT_TYPES, VALUE_TYPES, Statement
+from tokenizer import Token, TokenType, OPERATORS_BY_PRECEDENCE, keyword_code
+from tokenizer.symbols import GLOBAL, IF, ELSEIF, ELSE, END, SET, NOT, STATIC, STUB, EQUALS, DOUBLE_EQUALS, LEFT_PARENTHESIS, RIGHT_PARENTHESIS, COMMA, EXCLAMATION_POINT, ADD, SUBTRACT, ADD_SUBTRACT, SUBTRACT_SUBTRACT
+from tokenizer.symbols import SCRIPT_TYPE_CODES, VALUE_TYPE_CODES, LOGICAL_OPERATOR_CODES, ARITHMETIC_CODES
+from .types import StatementType, ParserError, Statement, GlobalDef, ScriptDef, Block, If, Call, Expression, Atom, NO_CHILDREN
+from .definitions import split_serpent, parse_groups
+from profiler.hooks import hooked, PHASE_PARSE
 
 # Parse the main script block
-def parse(tokens):
+@hooked(PHASE_PARSE)
+def parse(tokens, end = None):
     script = Statement()
     script.statement_type = StatementType.MAIN_SCRIPT_BLOCK
 
-    # Go through each token
-    token_count = len(tokens)
+    # Go through each token (up to end, if only some of them are to be parsed)
+    token_count = len(tokens) if end is None else end
     next_token = 0
     while next_token < token_count:
         token = tokens[next_token]
 
         # Add a global?
-        if token.token == "global":
+        if token.code == GLOBAL:
             global_to_add = parse_global(tokens, next_token)
             script.children.append(global_to_add)
             next_token = next_token + global_to_add.token_count
 
         # Add a function?
-        elif token.token in SCRIPT_TYPES:
+        elif token.code in SCRIPT_TYPE_CODES:
             script_to_add = parse_script(tokens, next_token)
             script.children.append(script_to_add)
             next_token = next_token + script_to_add.token_count
@@ -56,15 +61,24 @@ def parse(tokens):
             raise ParserError(token, "Unexpected token", "Token used here")
 
         #next_token = next_token + 1
+
+    script.token_count = next_token
     return script
 
+# Parse a script one top-level definition at a time
+#
+# tokens can be any iterable of tokens, such as a generator. Each definition is
+# yielded as soon as it is complete, so only one definition's worth of tokens
+# is held at a time.
+def parse_definitions(tokens):
+    return parse_groups(split_serpent(tokens), parse)
+
 # Add the global thingy!
 def parse_global(tokens, next_token):
-    statement = Statement()
+    statement = GlobalDef()
 
     # Minimum tokens for a global statement (global, type, name)
     statement.token_count = 5
-    statement.statement_type = StatementType.GLOBAL_DEFINITION
 
     # Make sure we have enough for that
     if(len(tokens) - next_token < 5):
@@ -75,7 +89,7 @@ def parse_global(tokens, next_token):
     global_name = tokens[next_token + 2]
 
     # Make sure it's a valid global type
-    if statement.global_type not in VALUE_TYPES:
+    if tokens[next_token + 1].code not in VALUE_TYPE_CODES:
         raise ParserError(tokens[next_token + 1], "Invalid global type {:s}".format(statement.global_type), "Global type defined here")
 
     # Also make sure it's a valid global name
@@ -85,7 +99,7 @@ def parse_global(tokens, next_token):
         statement.global_name = global_name.token
 
     # Lastly, make sure the global is set to something
-    if(tokens[next_token + 3].token == "="):
+    if(tokens[next_token + 3].code == EQUALS):
         statement.token_count = 4
         expression = parse_expression(tokens, next_token + statement.token_count)
         if expression.token_count == 0:
@@ -100,17 +114,17 @@ def parse_global(tokens, next_token):
 
 # Add the script thingy!
 def parse_script(tokens, next_token):
-    statement = Statement()
+    statement = ScriptDef()
 
     statement.token_count = 3
     name_offset = 1
-    statement.statement_type = StatementType.SCRIPT_DEFINITION
 
     # Set the script type to the first token
     statement.script_type = tokens[next_token].token
+    script_type = tokens[next_token].code
 
     # Statics and stubs require an additional return type
-    if statement.script_type == "static" or statement.script_type == "stub":
+    if script_type == STATIC or script_type == STUB:
         statement.token_count = 4
         name_offset = 2
 
@@ -119,9 +133,9 @@ def parse_script(tokens, next_token):
         raise ParserError(tokens[next_token], "Incomplete script definition", "Script defined here")
 
     # Get the return type
-    if statement.script_type == "static" or statement.script_type == "stub":
+    if script_type == STATIC or script_type == STUB:
         statement.script_return_type = tokens[next_token + 1].token
-        if statement.script_return_type not in VALUE_TYPES:
+        if tokens[next_token + 1].code not in VALUE_TYPE_CODES:
             raise ParserError(tokens[next_token + 1], "Invalid return value type", "Type defined here")
 
 
@@ -131,137 +145,196 @@ def parse_script(tokens, next_token):
     # Start getting things
     next_token = next_token + name_offset + 1
     script_block = parse_block(tokens, next_token)
-    statement.children.append(script_block)
+    statement.children = [script_block]
     statement.token_count = statement.token_count + script_block.token_count
 
     return statement
 
-# Add if statement
-def parse_if_statement(tokens, next_token):
-    statement = Statement()
-
-    first_token = next_token
-
-    statement.statement_type = StatementType.IF_STATEMENT
-
-    incomplete_if_statement_error = "Incomplete if statement at {:d}:{:d}".format(tokens[first_token].line,tokens[first_token].character)
+# Begin an if statement (or an elseif), parsing its condition
+#
+# Returns the if statement. Its blocks are parsed by parse_block().
+def begin_if_statement(tokens, next_token):
+    statement = If()
 
     if(next_token + 3 > len(tokens)):
-        raise ParserError(tokens[next_token], incomplete_if_statement_error, "If statement defined here")
+        raise ParserError(tokens[next_token], incomplete_if_statement_error(tokens[next_token]), "If statement defined here")
 
     # Get the condition
     condition = parse_expression(tokens, next_token + 1)
-    statement.children.append(condition)
-    next_token = next_token + 1 + condition.token_count
+    statement.children = [condition]
 
-    # Get the first block (if true)
-    first_block = parse_block(tokens, next_token, True)
-    next_token = next_token + first_block.token_count
-    statement.children.append(first_block)
+    return statement
 
-    if next_token >= len(tokens) or (tokens[next_token].token != "end" and tokens[next_token].token != "else" and tokens[next_token].token != "elseif"):
-        raise ParserError(tokens[next_token - 1], incomplete_if_statement_error, "Expected end or else after here")
+def incomplete_if_statement_error(token):
+    return "Incomplete if statement at {:d}:{:d}".format(token.line, token.character)
 
-    # Add else if we need it
-    if tokens[next_token].token == "else" or tokens[next_token].token == "elseif":
-        next_token = next_token + 1
-        second_block = None
+# Do script blocks
+#
+# If statements (and the blocks inside of them) are parsed with an explicit
+# stack rather than by recursion, so blocks can be nested as deeply as needed
+# and if statements can have any number of elseifs.
+def parse_block(tokens, next_token, can_end_on_else = False):
+    statement = Block()
 
-        # Elseif, consumes the elseif and end
-        if tokens[next_token - 1].token == "elseif":
-            # Go back one token to get the elseif, too
-            next_token = next_token - 1
+    started_on = next_token
 
-            second_block = parse_if_statement(tokens, next_token)
+    # Each entry is (statement, first token, can_end_on_else) for a block, or
+    # (statement, first token, None) for an if statement
+    stack = []
 
-            # Subtract the elseif
-            next_token = next_token + second_block.token_count - 1
+    while True:
+        ended_properly = False
+
+        while next_token < len(tokens):
+            token = tokens[next_token]
+            if token.token_type == TokenType.OTHER:
+                # See if we're ending
+                if token.code == END or ((token.code == ELSE or token.code == ELSEIF) and can_end_on_else):
+                    ended_properly = True
+                    break
 
-        # Regular else
-        else:
-            second_block = parse_block(tokens, next_token, False)
-            next_token = next_token + second_block.token_count
+                # If not, let's see what the next token is
+                if next_token + 1 == len(tokens):
+                    raise ParserError(token, "Unknown token", "Expected more tokens after here")
 
+                token_after = tokens[next_token + 1]
 
-        statement.children.append(second_block)
+                # If statement! Parse its block before continuing this one.
+                if token.code == IF:
+                    if_statement = begin_if_statement(tokens, next_token)
+                    stack.append((statement, started_on, can_end_on_else))
+                    stack.append((if_statement, next_token, None))
 
-        if next_token >= len(tokens):
-            raise ParserError(tokens[next_token - 1], incomplete_if_statement_error, "Expected end after here")
-        elif tokens[next_token].token != "end":
-            raise ParserError(tokens[next_token], incomplete_if_statement_error, "Expected end here")
+                    next_token = next_token + 1 + if_statement.children[0].token_count
+                    statement = Block()
+                    started_on = next_token
+                    can_end_on_else = True
+                    continue
 
-    statement.token_count = next_token - first_token + 1
+                # Function call
+                elif token_after.code == LEFT_PARENTHESIS:
+                    function_call = parse_function_call(tokens, next_token)
+                    next_token = next_token + function_call.token_count
+                    statement.add_child(function_call)
+                    continue
 
-    return statement
+                # Setting a globaL
+                elif token_after.code == EQUALS:
+                    expression = parse_expression(tokens, next_token + 2)
+                    if len(expression.children) == 0:
+                        raise ParserError(token_after, "Expected non-empty expression", "Empty expression after here")
 
-# Do script blocks
-def parse_block(tokens, next_token, can_end_on_else = False):
-    statement = Statement()
-    statement.statement_type = StatementType.SCRIPT_BLOCK
+                    set_function = Call("set", SET, [token, expression])
 
-    started_on = next_token
-    ended_properly = False
+                    next_token = next_token + 2 + expression.token_count
+                    statement.add_child(set_function)
+                    continue
 
-    while next_token < len(tokens):
-        token = tokens[next_token]
-        if token.token_type == TokenType.OTHER:
-            # See if we're ending
-            if token.token == "end" or ((token.token == "else" or token.token == "elseif") and can_end_on_else):
-                ended_properly = True
+                # Who knows?
+                else:
+                    raise ParserError(token_after, "Unexpected token", "Token used here")
+            else:
+                raise ParserError(token, "Unexpected token", "Token used here")
+
+        # Make sure we ended properly
+        if not ended_properly:
+            message = "Expected end after here"
+            if can_end_on_else:
+                message = "Expected end or else after here"
+            raise ParserError(tokens[next_token - 1], "Incomplete script block", message)
+
+        statement.token_count = next_token - started_on
+
+        # Go back up to whatever this block was in, finishing any if statements
+        # that end here
+        while len(stack) > 0:
+            parent, first_token, parent_can_end_on_else = stack.pop()
+
+            # Back in a block, so add the if statement to it and keep going
+            if parent.statement_type == StatementType.SCRIPT_BLOCK:
+                parent.add_child(statement)
+                statement = parent
+                started_on = first_token
+                can_end_on_else = parent_can_end_on_else
+                next_token = next_token + 1
                 break
 
-            # If not, let's see what the next token is
-            if next_token + 1 == len(tokens):
-                raise ParserError(token, "Unknown token", "Expected more tokens after here")
-
-            token_after = tokens[next_token + 1]
+            # Back in an if statement
+            parent.children.append(statement)
 
-            # If statement!
-            if token.token == "if":
-                if_to_add = parse_if_statement(tokens, next_token)
+            # An elseif or else block ends on the same end as the if statement
+            if len(parent.children) == 3:
+                if next_token >= len(tokens):
+                    raise ParserError(tokens[next_token - 1], incomplete_if_statement_error(tokens[first_token]), "Expected end after here")
+                elif tokens[next_token].code != END:
+                    raise ParserError(tokens[next_token], incomplete_if_statement_error(tokens[first_token]), "Expected end here")
 
-                statement.children.append(if_to_add)
-                next_token = next_token + if_to_add.token_count
+                parent.token_count = next_token - first_token + 1
+                statement = parent
                 continue
 
-            # Function call
-            elif token_after.token == "(":
-                function_call = parse_function_call(tokens, next_token)
-                next_token = next_token + function_call.token_count
-                statement.children.append(function_call)
-                continue
+            if next_token >= len(tokens) or (tokens[next_token].code != END and tokens[next_token].code != ELSE and tokens[next_token].code != ELSEIF):
+                raise ParserError(tokens[next_token - 1], incomplete_if_statement_error(tokens[first_token]), "Expected end or else after here")
 
-            # Setting a globaL
-            elif token_after.token == "=":
-                expression = parse_expression(tokens, next_token + 2)
-                if len(expression.children) == 0:
-                    raise ParserError(token_after, "Expected non-empty expression", "Empty expression after here")
+            # No else
+            if tokens[next_token].code == END:
+                parent.token_count = next_token - first_token + 1
+                statement = parent
+                continue
 
-                set_function = Statement()
-                set_function.statement_type = StatementType.FUNCTION_CALL
-                set_function.function_name = "set"
-                set_function.children = [token, expression]
+            stack.append((parent, first_token, None))
 
-                next_token = next_token + 2 + expression.token_count
-                statement.children.append(set_function)
-                continue
+            # Elseif, which is another if statement that consumes the end
+            if tokens[next_token].code == ELSEIF:
+                if_statement = begin_if_statement(tokens, next_token)
+                stack.append((if_statement, next_token, None))
+                next_token = next_token + 1 + if_statement.children[0].token_count
+                can_end_on_else = True
 
-            # Who knows?
+            # Regular else
             else:
-                raise ParserError(token_after, "Unexpected token", "Token used here")
-        else:
-            raise ParserError(token, "Unexpected token", "Token used here")
+                next_token = next_token + 1
+                can_end_on_else = False
 
-    # Make sure we ended properly
-    if not ended_properly:
-        message = "Expected end after here"
-        if can_end_on_else:
-            message = "Expected end or else after here"
-        raise ParserError(tokens[next_token - 1], "Incomplete script block", message)
+            statement = Block()
+            started_on = next_token
+            break
 
-    statement.token_count = next_token - started_on
+        # Back at the block we started with
+        else:
+            return statement
+
+# Precedence of each operator, where operators with a higher precedence are
+# evaluated first
+OPERATOR_PRECEDENCE = {}
+for precedence, operators in enumerate(reversed(OPERATORS_BY_PRECEDENCE)):
+    for operator in operators:
+        OPERATOR_PRECEDENCE[keyword_code(operator)] = precedence
+
+# Operands and operators found in an expression
+class LastType(Enum):
+    ARITHMETIC_OPERATOR = 1
+    NON_SYMBOL = 2
+
+# Things being parsed on the expression stack (see parse_nested_expression())
+class ExpressionFrame:
+    # EXPRESSION or FUNCTION_CALL statement being parsed
+    statement = None
+    first_token = None
+
+    # If this is the FUNCTION_CALL for `!` waiting for its parameter
+    negation = False
+
+    # If an expression
+    parenthesis = False
+    in_function = False
+    operands = None
+    operators = None
+    last_type = None
 
-    return statement
+    def __init__(self, statement, first_token):
+        self.statement = statement
+        self.first_token = first_token
 
 # Add expression
 # @param tokens      tokens array
@@ -270,233 +343,283 @@ def parse_block(tokens, next_token, can_end_on_else = False):
 # @param in_function end on comma or parenthesis, but does not consume the parenthesis or comma
 # @return            whatever resulting statement comes out of this
 def parse_expression(tokens, next_token, parenthesis = False, in_function = False):
-    statement = Statement()
-    statement.statement_type = StatementType.EXPRESSION
-    last_token = next_token
-
-    # If we're starting on parenthesis then add 1 to last_token, making sure there actually is a `(` there
-    # If not, it's a programming error that should be fixed
-    if parenthesis:
-        assert last_token < len(tokens) and tokens[last_token].token == "("
-        last_token = last_token + 1
-
-    # Get everything in this expression
-    parts = []
+    return parse_nested_expression(tokens, begin_expression(tokens, next_token, parenthesis, in_function))
 
-    class LastType(Enum):
-        ARITHMETIC_OPERATOR = 1
-        NON_SYMBOL = 2
-
-    last_type = None
-    while True:
-        if last_token == len(tokens):
-            if parenthesis:
-                raise ParserError(tokens[last_token - 1], "Expected `)` in expression", "Expected after this")
-            else:
-                break
+# Add a function
+def parse_function_call(tokens, next_token):
+    return parse_nested_expression(tokens, begin_function_call(tokens, next_token))
 
-        token = copy(tokens[last_token])
+def begin_expression(tokens, next_token, parenthesis = False, in_function = False):
+    frame = ExpressionFrame(Expression(), next_token)
+    frame.parenthesis = parenthesis
+    frame.in_function = in_function
+    frame.operands = []
+    frame.operators = []
 
-        # If it's a symbol, maybe we can handle it?
-        if (token.token_type == TokenType.SYMBOL or token.token in LOGICAL_OPERATORS) and (token.token != "!"):
-            # Add expressions in expressions, or a function
-            if token.token == "(":
-                if last_type == None or last_type == LastType.ARITHMETIC_OPERATOR:
-                    part = parse_expression(tokens, last_token, True)
-                    parts.append(part)
+    # If we're starting on parenthesis, make sure there actually is a `(` there
+    # If not, it's a programming error that should be fixed
+    if parenthesis:
+        assert next_token < len(tokens) and tokens[next_token].code == LEFT_PARENTHESIS
 
-                    # Add last_token
-                    last_token = last_token + part.token_count
-                    last_type = LastType.NON_SYMBOL
-                else:
-                    function_call = parse_function_call(tokens, last_token - 1)
-                    last_token = last_token + function_call.token_count - 1
-                    del parts[-1]
-                    parts.append(function_call)
-
-            # Maybe we're terminating this?
-            elif token.token == ")":
-                if parenthesis:
-                    last_token = last_token + 1
-                    break
-                elif in_function:
-                    break
-                else:
-                    raise ParserError(token, "Unexpected right parenthesis", "Symbol used here")
+    return frame
 
-            # Maybe we're terminating this (for a function)
-            elif token.token == ",":
-                if in_function:
-                    break
-                else:
-                    raise ParserError(token, "Unexpected comma", "Symbol used here")
-
-            # Arithmetic?
-            elif token.token in ARITHMETIC_SYMBOLS or token.token == "+-" or token.token == "--":
-                # We can't use an arithmetic operator unless there was something else that was not arithmetic before it
-                if last_type != LastType.NON_SYMBOL:
-                    raise ParserError(token, "Unexpected arithmetic operator", "Operator used here")
-
-                # Simplify -- and +- to + and - respectively
-                if(token.token == "--"):
-                    token.token = "+"
-                if(token.token == "+-"):
-                    token.token = "-"
-
-                # Add this token
-                last_type = LastType.ARITHMETIC_OPERATOR
-                parts.append(token)
-                last_token = last_token + 1
+def begin_function_call(tokens, next_token):
+    if next_token + 3 >= len(tokens):
+        raise ParserError(tokens[next_token], "Invalid function call", "Expected function call here")
 
-            # Fail
-            else:
-                raise ParserError(token, "Unexpected whatever the hell that is", "Whatever the hell that is used here")
+    statement = Call(tokens[next_token].token, tokens[next_token].code)
+    if tokens[next_token + 1].code != LEFT_PARENTHESIS:
+        raise ParserError(tokens[next_token + 1], "Incomplete function call", "Expected left parenthesis here")
 
-            continue
+    return ExpressionFrame(statement, next_token)
 
-        # Maybe it's something else
-        else:
-            # If it's not a symbol, but the last one was a symbol, then the loop might be done?
-            if last_type == LastType.NON_SYMBOL:
-                # Unless it's a negative or positive number, which then it becomes subtraction/addition
-                if token.token[0] == "-" or token.token[0] == "+":
-                    token_sign = copy(token)
-                    token_sign.token = token.token[0]
-                    token_sign.token_type = TokenType.SYMBOL
-
-                    token_copy = copy(token)
-                    token_copy.token = token.token[1:]
-                    token_copy.character = token_copy.character + 1
-
-                    parts.append(token_sign)
-                    parts.append(token_copy)
-                    last_token = last_token + 1
-                    last_type = LastType.NON_SYMBOL
-                    continue
+# Parse an expression or function call along with everything nested inside of it
+#
+# Parenthesized expressions, function calls and their parameters are parsed
+# with an explicit stack of frames rather than by recursion, so they can be
+# nested as deeply as needed.
+def parse_nested_expression(tokens, frame):
+    stack = []
 
-                # If we should be ending on a parenthesis, then it's a syntax error
-                elif parenthesis or in_function:
-                    raise ParserError(token, "Unexpected token in expression", "Token used here")
-                else:
-                    break
+    # Skip the start of whatever we begin with
+    last_token = frame.first_token + (1 if frame.parenthesis else 0)
+    if frame.statement.statement_type == StatementType.FUNCTION_CALL:
+        last_token = last_token + 2
 
-            # Not function?
-            elif token.token == "!":
-                new_statement = Statement()
-                new_statement.statement_type = StatementType.FUNCTION_CALL
-                new_statement.function_name = "not"
+    while True:
+        statement = frame.statement
 
-                if last_token + 1 == len(tokens):
-                    raise ParserError(token, "Expected expression", "Expression expected after here")
+        # Function call
+        if statement.statement_type == StatementType.FUNCTION_CALL:
+            # Loop through each possible token
+            if last_token == len(tokens):
+                raise ParserError(tokens[last_token - 1], "Incomplete function call", "Expected right parenthesis after here")
 
-                if tokens[last_token + 1].token == "(":
-                    parameter = parse_expression(tokens, last_token + 1, True)
-                    new_statement.children = [parameter]
-                    new_statement.token_count = parameter.token_count + 1
-                else:
-                    new_statement.children = [tokens[last_token + 1]]
-                    new_statement.token_count = 2
+            token = tokens[last_token]
 
-                last_token = last_token + new_statement.token_count
-                parts.append(new_statement)
-                last_type = LastType.NON_SYMBOL
+            # Add the thing
+            if token.code == RIGHT_PARENTHESIS:
+                last_token = last_token + 1
+                statement.token_count = last_token - frame.first_token
 
-                continue
+            # Skip this if it's a comma
+            elif token.code == COMMA:
+                raise ParserError(tokens[last_token], "Unexpected comma", "Expected expression or right parenthesis here")
 
-            # Maybe the expression is being cut too short by an end?
-            elif token.token == "end" or token.token == "else" or token.token == "elseif":
-                raise ParserError(token, "Unexpected end of block", "Token used here")
+            # Add it if it's an expression
             else:
-                parts.append(token)
-                last_token = last_token + 1
-                last_type = LastType.NON_SYMBOL
+                stack.append(frame)
+                frame = begin_expression(tokens, last_token, False, True)
                 continue
 
-        last_token = last_token + 1
-
-    # Check if we ended on an arithmetic operator
-    if last_type == LastType.ARITHMETIC_OPERATOR:
-        raise ParserError(parts[-1], "Expected operand for operator", "Operator used here")
+        # Expression
+        else:
+            parenthesis = frame.parenthesis
+            in_function = frame.in_function
+            operands = frame.operands
+            operators = frame.operators
+            last_type = frame.last_type
+            nested_frame = None
+
+            # Get everything in this expression
+            while True:
+                if last_token == len(tokens):
+                    if parenthesis:
+                        raise ParserError(tokens[last_token - 1], "Expected `)` in expression", "Expected after this")
+                    else:
+                        break
+
+                token = tokens[last_token]
+
+                # If it's a symbol, maybe we can handle it?
+                if (token.token_type == TokenType.SYMBOL or token.code in LOGICAL_OPERATOR_CODES) and (token.code != EXCLAMATION_POINT):
+                    # Add expressions in expressions, or a function
+                    if token.code == LEFT_PARENTHESIS:
+                        if last_type == None or last_type == LastType.ARITHMETIC_OPERATOR:
+                            nested_frame = begin_expression(tokens, last_token, True)
+                            last_token = last_token + 1
+                        else:
+                            nested_frame = begin_function_call(tokens, last_token - 1)
+                            last_token = last_token + 1
+                        break
+
+                    # Maybe we're terminating this?
+                    elif token.code == RIGHT_PARENTHESIS:
+                        if parenthesis:
+                            last_token = last_token + 1
+                            break
+                        elif in_function:
+                            break
+                        else:
+                            raise ParserError(token, "Unexpected right parenthesis", "Symbol used here")
+
+                    # Maybe we're terminating this (for a function)
+                    elif token.code == COMMA:
+                        if in_function:
+                            break
+                        else:
+                            raise ParserError(token, "Unexpected comma", "Symbol used here")
+
+                    # Arithmetic?
+                    elif token.code in ARITHMETIC_CODES or token.code == ADD_SUBTRACT or token.code == SUBTRACT_SUBTRACT:
+                        # We can't use an arithmetic operator unless there was something else that was not arithmetic before it
+                        if last_type != LastType.NON_SYMBOL:
+                            raise ParserError(token, "Unexpected arithmetic operator", "Operator used here")
+
+                        # Simplify -- and +- to + and - respectively
+                        if(token.code == SUBTRACT_SUBTRACT):
+                            token = copy(token)
+                            token.token = "+"
+                            token.code = ADD
+                        if(token.code == ADD_SUBTRACT):
+                            token = copy(token)
+                            token.token = "-"
+                            token.code = SUBTRACT
+
+                        # Add this token
+                        last_type = LastType.ARITHMETIC_OPERATOR
+                        add_operator(operands, operators, token)
+                        last_token = last_token + 1
+
+                    # Fail
+                    else:
+                        raise ParserError(token, "Unexpected whatever the hell that is", "Whatever the hell that is used here")
 
-    statement.token_count = last_token - next_token
+                    continue
 
-    def parse_operator_functions(operators, parts):
-        part_count = 0
-        while part_count + 2 < len(parts):
-            part = parts[part_count]
-            next_part = parts[part_count + 1]
-            next_part_after_that = parts[part_count + 2]
+                # Maybe it's something else
+                else:
+                    # If it's not a symbol, but the last one was a symbol, then the loop might be done?
+                    if last_type == LastType.NON_SYMBOL:
+                        # Unless it's a negative or positive number, which then it becomes subtraction/addition
+                        if token.token[0] == "-" or token.token[0] == "+":
+                            token_sign = copy(token)
+                            token_sign.token = token.token[0]
+                            token_sign.code = keyword_code(token_sign.token)
+                            token_sign.token_type = TokenType.SYMBOL
+
+                            token_copy = copy(token)
+                            token_copy.token = token.token[1:]
+                            token_copy.character = token_copy.character + 1
+
+                            add_operator(operands, operators, token_sign)
+                            operands.append(token_copy)
+                            last_token = last_token + 1
+                            last_type = LastType.NON_SYMBOL
+                            continue
+
+                        # If we should be ending on a parenthesis, then it's a syntax error
+                        elif parenthesis or in_function:
+                            raise ParserError(token, "Unexpected token in expression", "Token used here")
+                        else:
+                            break
+
+                    # Not function?
+                    elif token.code == EXCLAMATION_POINT:
+                        new_statement = Call("not", NOT)
+
+                        if last_token + 1 == len(tokens):
+                            raise ParserError(token, "Expected expression", "Expression expected after here")
+
+                        if tokens[last_token + 1].code == LEFT_PARENTHESIS:
+                            frame.last_type = last_type
+                            stack.append(frame)
+                            frame = ExpressionFrame(new_statement, last_token)
+                            frame.negation = True
+                            nested_frame = begin_expression(tokens, last_token + 1, True)
+                            last_token = last_token + 2
+                            break
+                        else:
+                            new_statement.children = [tokens[last_token + 1]]
+                            new_statement.token_count = 2
+
+                        last_token = last_token + new_statement.token_count
+                        operands.append(new_statement)
+                        last_type = LastType.NON_SYMBOL
+
+                        continue
+
+                    # Maybe the expression is being cut too short by an end?
+                    elif token.code == END or token.code == ELSE or token.code == ELSEIF:
+                        raise ParserError(token, "Unexpected end of block", "Token used here")
+                    else:
+                        operands.append(token)
+                        last_token = last_token + 1
+                        last_type = LastType.NON_SYMBOL
+                        continue
+
+            # Parse whatever is nested in here first
+            if nested_frame is not None:
+                frame.last_type = last_type
+                stack.append(frame)
+                frame = nested_frame
+                continue
 
-            if next_part.token in operators:
-                new_statement = Statement()
-                new_statement.statement_type = StatementType.FUNCTION_CALL
-                new_statement.function_name = next_part.token
+            # Check if we ended on an arithmetic operator
+            if last_type == LastType.ARITHMETIC_OPERATOR:
+                raise ParserError(operators[-1], "Expected operand for operator", "Operator used here")
 
-                if new_statement.function_name == "==":
-                    new_statement.function_name = "="
+            while len(operators) > 0:
+                apply_operator(operands, operators)
 
-                new_statement.children = [part, next_part_after_that]
-                parts[part_count] = new_statement
-                del parts[part_count + 1]
-                del parts[part_count + 1]
+            # Expressions of just one token don't need a list
+            if len(operands) == 1 and isinstance(operands[0], Token):
+                statement = Atom(operands[0], last_token - frame.first_token)
             else:
-                part_count = part_count + 2
-
-    # Do each operator
-    #
-    # > Multiplication and division
-    # > Addition and subtraction
-    # > Relational (<, <=, >, >=)
-    # > Equality (!=, ==)
-    # > and
-    # > or
-    parse_operator_functions(["*", "/"], parts)
-    parse_operator_functions(["+", "-"], parts)
-    parse_operator_functions(RELATIONAL_OPERATORS, parts)
-    parse_operator_functions(EQUALITY_OPERATORS, parts)
-    parse_operator_functions(["and"], parts)
-    parse_operator_functions(["or"], parts)
-
-    statement.children = parts
-    return statement
-
-# Add a function
-def parse_function_call(tokens, next_token):
-    statement = Statement()
-    statement.statement_type = StatementType.FUNCTION_CALL
-    last_token = next_token + 2
-
-    if next_token + 3 >= len(tokens):
-        raise ParserError(tokens[next_token], "Invalid function call", "Expected function call here")
-
-    statement.function_name = tokens[next_token].token
-    if tokens[next_token + 1].token != "(":
-        raise ParserError(tokens[next_token + 1], "Incomplete function call", "Expected left parenthesis here")
+                statement.token_count = last_token - frame.first_token
+                if len(operands) > 0:
+                    statement.children = operands
+
+        # Done with this, so add it to whatever it is in
+        while True:
+            if len(stack) == 0:
+                return statement
+
+            frame = stack.pop()
+            parent = frame.statement
+
+            # Parameter of `!`, which then goes in the expression it is in
+            if frame.negation:
+                parent.children = [statement]
+                parent.token_count = statement.token_count + 1
+                statement = parent
+                frame = stack.pop()
+                frame.operands.append(statement)
+                frame.last_type = LastType.NON_SYMBOL
+
+            # Parameter of a function call
+            elif parent.statement_type == StatementType.FUNCTION_CALL:
+                parent.add_child(statement)
+                if last_token < len(tokens) and tokens[last_token].code == COMMA:
+                    last_token = last_token + 1
 
-    # Loop through each possible token
-    while True:
-        if last_token == len(tokens):
-            raise ParserError(tokens[last_token - 1], "Incomplete function call", "Expected right parenthesis after here")
+            # Expression in parenthesis
+            elif statement.statement_type == StatementType.EXPRESSION:
+                frame.operands.append(statement)
+                frame.last_type = LastType.NON_SYMBOL
 
-        token = tokens[last_token]
+            # Function call, which replaces the name before it
+            else:
+                frame.operands[-1] = statement
 
-        # Add the thing
-        if token.token == ")":
-            last_token = last_token + 1
             break
 
-        # Skip this if it's a comma
-        elif token.token == ",":
-            raise ParserError(tokens[last_token], "Unexpected comma", "Expected expression or right parenthesis here")
-
-        # Add it if it's an expression
-        else:
-            expression = parse_expression(tokens, last_token, False, True)
-            last_token = last_token + expression.token_count
-            statement.children.append(expression)
-            if last_token < len(tokens) and tokens[last_token].token == ",":
-                last_token = last_token + 1
-
-    statement.token_count = last_token - next_token
-
-    return statement
+# Add an operator to an expression
+#
+# Any operators before it that are evaluated first are turned into function
+# calls, so operators in the same group are evaluated left to right.
+def add_operator(operands, operators, token):
+    precedence = OPERATOR_PRECEDENCE[token.code]
+    while len(operators) > 0 and OPERATOR_PRECEDENCE[operators[-1].code] >= precedence:
+        apply_operator(operands, operators)
+    operators.append(token)
+
+# Turn the last operator and its two operands into a function call
+def apply_operator(operands, operators):
+    operator = operators.pop()
+
+    right = operands.pop()
+    if operator.code == DOUBLE_EQUALS:
+        operands[-1] = Call("=", EQUALS, [operands[-1], right])
+    else:
+        operands[-1] = Call(operator.token, operator.code, [operands[-1], right])
@@ -24,6 +24,7 @@
 # Statement types
 
 from enum import Enum
+from tokenizer import SCRIPT_TYPES, VALUE_TYPES, NO_CODE
 
 class StatementType(Enum):
     MAIN_SCRIPT_BLOCK  = 0
@@ -33,6 +34,7 @@ class StatementType(Enum):
     IF_STATEMENT       = 4
     EXPRESSION         = 5
     FUNCTION_CALL      = 6
+    COND_STATEMENT     = 7
 
 # Parser error
 class ParserError(Exception):
@@ -46,65 +48,19 @@ class ParserError(Exception):
     def __str__(self):
         return "ParserError: {:s}".format(self.message)
 
-SCRIPT_TYPES = [
-    "static",
-    "dormant",
-    "continuous",
-    "stub",
-    "startup"
-]
-
-VALUE_TYPES = [
-    "void",
-    "short",
-    "long",
-    "real",
-    "boolean",
-    "string",
-    "trigger_volume",
-    "cutscene_flag",
-    "cutscene_camera_point",
-    "cutscene_title",
-    "cutscene_recording",
-    "device_group",
-    "ai",
-    "ai_command_list",
-    "starting_profile",
-    "conversation",
-    "navpoint",
-    "hud_message",
-    "object_list",
-    "sound",
-    "effect",
-    "damage",
-    "looping_sound",
-    "animation_graph",
-    "actor_variant",
-    "damage_effect",
-    "object_definition",
-    "game_difficulty",
-    "team",
-    "ai_default_state",
-    "actor_type",
-    "hud_corner",
-    "object",
-    "unit",
-    "vehicle",
-    "weapon",
-    "device",
-    "scenery",
-    "object_name",
-    "unit_name",
-    "vehicle_name",
-    "weapon_name",
-    "device_name",
-    "scenery_name"
-]
+# Shared by nodes that have no children, so they don't need a list of their own
+NO_CHILDREN = ()
+
+# Base class for statement tree nodes
+#
+# Every node has all of these fields, so code that walks the tree can look at
+# any of them on any node. Fields a node does not have are left as these
+# defaults. Nodes made by the parsers are the typed, slotted classes below.
+class Node:
+    __slots__ = ()
 
-# Statement
-class Statement:
     statement_type = None
-    children = None
+    children = NO_CHILDREN
 
     # Number of tokens that was consumed for this
     token_count = None
@@ -115,11 +71,104 @@ class Statement:
 
     # If function call
     function_name = None
+    function_code = NO_CODE
 
     # If script
     script_name = None
     script_type = None
     script_return_type = None
 
+    # Add a child, making a list for the children if there are none yet
+    def add_child(self, child):
+        if len(self.children) == 0:
+            self.children = [child]
+        else:
+            self.children.append(child)
+
+# Statement
+#
+# Any type of statement, with any fields set. The parsers only use this for the
+# main script block, but trees made of these (or mixing them with the classes
+# below) can still be passed to the compilers.
+class Statement(Node):
     def __init__(self):
         self.children = []
+
+# Global definition, whose child is the initial expression
+class GlobalDef(Node):
+    __slots__ = ("global_type", "global_name", "children", "token_count")
+    statement_type = StatementType.GLOBAL_DEFINITION
+    def __init__(self, global_type = None, global_name = None, children = NO_CHILDREN, token_count = None):
+        self.global_type = global_type
+        self.global_name = global_name
+        self.children = children
+        self.token_count = token_count
+
+# Script definition, whose child is the script block
+class ScriptDef(Node):
+    __slots__ = ("script_type", "script_return_type", "script_name", "children", "token_count")
+    statement_type = StatementType.SCRIPT_DEFINITION
+    def __init__(self, script_type = None, script_return_type = None, script_name = None, children = NO_CHILDREN, token_count = None):
+        self.script_type = script_type
+        self.script_return_type = script_return_type
+        self.script_name = script_name
+        self.children = children
+        self.token_count = token_count
+
+# Script block
+class Block(Node):
+    __slots__ = ("children", "token_count")
+    statement_type = StatementType.SCRIPT_BLOCK
+    def __init__(self, children = NO_CHILDREN, token_count = None):
+        self.children = children
+        self.token_count = token_count
+
+# If statement, whose children are the condition, the block if it is true, and
+# optionally the block (or if statement) if it is not
+class If(Node):
+    __slots__ = ("children", "token_count")
+    statement_type = StatementType.IF_STATEMENT
+    def __init__(self, children = NO_CHILDREN, token_count = None):
+        self.children = children
+        self.token_count = token_count
+
+# Chain of if and elseif statements, whose children are each condition followed
+# by the block run if it is the first one that is true, and optionally the
+# block run if none of them are
+class Cond(Node):
+    __slots__ = ("children", "token_count")
+    statement_type = StatementType.COND_STATEMENT
+    def __init__(self, children = NO_CHILDREN, token_count = None):
+        self.children = children
+        self.token_count = token_count
+
+# Function call, whose children are the parameters
+class Call(Node):
+    __slots__ = ("function_name", "function_code", "children", "token_count")
+    statement_type = StatementType.FUNCTION_CALL
+    def __init__(self, function_name = None, function_code = NO_CODE, children = NO_CHILDREN, token_count = None):
+        self.function_name = function_name
+        self.function_code = function_code
+        self.children = children
+        self.token_count = token_count
+
+# Expression, whose child is whatever it evaluates
+class Expression(Node):
+    __slots__ = ("children", "token_count")
+    statement_type = StatementType.EXPRESSION
+    def __init__(self, children = NO_CHILDREN, token_count = None):
+        self.children = children
+        self.token_count = token_count
+
+# Expression that is just one token, such as a number or a global
+#
+# This holds the token itself instead of a list with the token in it.
+class Atom(Node):
+    __slots__ = ("token", "token_count")
+    statement_type = StatementType.EXPRESSION
+    def __init__(self, token = None, token_count = 1):
+        self.token = token
+        self.token_count = token_count
+    @property
+    def children(self):
+        return (self.token,)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+#
+# profiler/__init__.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import importlib
+
+from .hooks import Hook, HOOKS, add_hook, remove_hook, hooked, PHASE_TOKENIZE, PHASE_PARSE, PHASE_COMPILE
+
+# The hooks are imported by the tokenizer, parser and compilers, so the
+# profiler itself is only imported when it is used
+LAZY_EXPORTS = {
+    "PhaseProfiler": (".profiler", "PhaseProfiler"),
+    "PhaseStats": (".profiler", "PhaseStats"),
+    "count_tree_objects": (".profiler", "count_tree_objects"),
+    "format_report": (".profiler", "format_report")
+}
+
+def __getattr__(name):
+    if name not in LAZY_EXPORTS:
+        raise AttributeError("module {:s} has no attribute {:s}".format(__name__, name))
+    module, attribute = LAZY_EXPORTS[name]
+    value = getattr(importlib.import_module(module, __name__), attribute)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_EXPORTS))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# profiler/hooks.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import functools
+
+# Phases of converting a script
+PHASE_TOKENIZE = "tokenize"
+PHASE_PARSE = "parse"
+PHASE_COMPILE = "compile"
+
+# Hooks that are called for every phase, in the order they were added
+HOOKS = []
+
+# Something that is told when each phase starts and finishes
+#
+# args is what the entry point was called with (such as the source text for
+# tokenize_stream() or the tokens for a parser). result is what it returned,
+# or None if it raised error. Hooks are called from whatever thread the entry
+# point is called from.
+class Hook:
+    def start(self, phase, args):
+        pass
+    def finish(self, phase, args, result, error):
+        pass
+
+def add_hook(hook):
+    HOOKS.append(hook)
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+# Call the hooks whenever the function is called
+#
+# If no hooks are added, the function is called right away, so this costs
+# nearly nothing. Only entry points that do a whole phase at once (and not
+# anything called for each token or statement) should be hooked.
+def hooked(phase):
+    def hook_function(function):
+        @functools.wraps(function)
+        def call(*args, **kwargs):
+            if len(HOOKS) == 0:
+                return function(*args, **kwargs)
+            return call_hooks(phase, function, args, kwargs)
+        return call
+    return hook_function
+
+def call_hooks(phase, function, args, kwargs):
+    hooks = tuple(HOOKS)
+    for hook in hooks:
+        hook.start(phase, args)
+
+    result = None
+    error = None
+    try:
+        result = function(*args, **kwargs)
+        return result
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for hook in reversed(hooks):
+            hook.finish(phase, args, result, error)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+#
+# profiler/profiler.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import time
+import tracemalloc
+
+# Peak resident memory comes from getrusage(), which Windows doesn't have
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from tokenizer import Token
+from .hooks import Hook, PHASE_TOKENIZE, PHASE_PARSE, PHASE_COMPILE
+
+# What each phase makes, which its throughput is measured in
+PHASE_UNITS = {
+    PHASE_TOKENIZE: "tokens",
+    PHASE_PARSE: "objects",
+    PHASE_COMPILE: "bytes"
+}
+
+# Totals for one phase
+class PhaseStats:
+    # Number of times the phase was run
+    calls = 0
+
+    # Wall time spent in the phase, in seconds
+    seconds = 0.0
+
+    # Peak memory in bytes, or None if it can't be measured: either the most
+    # memory allocated during any one run of the phase (if memory is traced)
+    # or the peak resident memory of the whole process by the end of the phase
+    peak_bytes = None
+
+    # Number of tokens, tree objects or bytes of output the phase made, or None if
+    # it couldn't be counted
+    count = 0
+
+    def __init__(self, unit):
+        self.unit = unit
+
+    # Amount made per second, or None if unknown
+    def throughput(self):
+        if self.count is None or self.seconds <= 0:
+            return None
+        return self.count / self.seconds
+
+# Get the peak resident memory of this process in bytes, or None if unknown
+def peak_resident_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Count the objects (statements and tokens) in a statement tree
+#
+# This measures the parser's output, so it isn't the number of nodes Halo
+# makes, which optimizer.count_nodes() counts.
+def count_tree_objects(statement):
+    count = 0
+    stack = [statement]
+    while len(stack) > 0:
+        node = stack.pop()
+        count = count + 1
+        if not isinstance(node, Token):
+            stack.extend(node.children)
+    return count
+
+# Hook that keeps the time, peak memory and output of each phase
+#
+# Add it with add_hook(), convert some scripts, and then remove it with
+# remove_hook() and read phases (a dict of PhaseStats by phase name, in the
+# order the phases were first run). If trace_memory is True, the memory each
+# phase allocates is traced with tracemalloc, which is exact but makes every
+# phase many times slower. Otherwise, the peak resident memory of the process
+# is used, which costs nothing.
+class PhaseProfiler(Hook):
+    trace_memory = False
+
+    def __init__(self, trace_memory = False):
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.running = []
+
+    def start(self, phase, args):
+        if phase not in self.phases:
+            self.phases[phase] = PhaseStats(PHASE_UNITS.get(phase))
+
+        # Output written to a file is counted by how far it moved
+        position = None
+        if phase == PHASE_COMPILE and len(args) > 1 and hasattr(args[1], "tell"):
+            position = args[1].tell()
+
+        traced = 0
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+
+        self.running.append((position, traced, time.perf_counter()))
+
+    def finish(self, phase, args, result, error):
+        end = time.perf_counter()
+        position, traced, start = self.running.pop()
+        stats = self.phases[phase]
+        stats.calls = stats.calls + 1
+        stats.seconds = stats.seconds + end - start
+
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - traced
+        else:
+            peak = peak_resident_memory()
+        if peak is not None:
+            stats.peak_bytes = peak if stats.peak_bytes is None else max(stats.peak_bytes, peak)
+
+        if error is not None or stats.count is None:
+            return
+        if phase == PHASE_TOKENIZE:
+            stats.count = stats.count + len(result)
+        elif phase == PHASE_PARSE:
+            stats.count = stats.count + count_tree_objects(result)
+        elif phase == PHASE_COMPILE:
+            if isinstance(result, str):
+                stats.count = stats.count + len(result.encode("utf-8"))
+            elif position is not None:
+                stats.count = stats.count + args[1].tell() - position
+            else:
+                stats.count = None
+        else:
+            stats.count = None
+
+    # Stop tracing memory, if it was started by this
+    def stop(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+# Format an amount of bytes
+def format_bytes(count):
+    if count < 1024:
+        return "{:d} B".format(count)
+    elif count < 1024 * 1024:
+        return "{:.1f} KiB".format(count / 1024)
+    else:
+        return "{:.1f} MiB".format(count / 1024 / 1024)
+
+# Get a report of each phase as a list of lines
+#
+# total is the wall time of the whole conversion in seconds, if known, which
+# is shown along with how much of it wasn't spent in any phase.
+def format_report(profiler, total = None):
+    memory = "Peak traced" if profiler.trace_memory else "Peak RSS"
+    lines = ["{:10s} {:>6s} {:>11s} {:>12s} {:>16s} {:>22s}".format("Phase", "Calls", "Time", memory, "Made", "Throughput")]
+    phase_seconds = 0.0
+
+    for phase, stats in profiler.phases.items():
+        phase_seconds = phase_seconds + stats.seconds
+        throughput = stats.throughput()
+        lines.append("{:10s} {:6d} {:>11s} {:>12s} {:>16s} {:>22s}".format(
+            phase,
+            stats.calls,
+            "{:.1f} ms".format(stats.seconds * 1000),
+            format_bytes(stats.peak_bytes) if stats.peak_bytes is not None else "-",
+            "{:d} {:s}".format(stats.count, stats.unit) if stats.count is not None else "-",
+            "{:.0f} {:s}/s".format(throughput, stats.unit) if throughput is not None else "-"
+        ))
+
+    if total is not None:
+        lines.append("{:10s} {:6s} {:>11s}".format("other", "", "{:.1f} ms".format(max(0.0, total - phase_seconds) * 1000)))
+        lines.append("{:10s} {:6s} {:>11s}".format("total", "", "{:.1f} ms".format(total * 1000)))
+
+    return lines
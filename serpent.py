@@ -28,74 +28,567 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 import sys
+import time
 import argparse
 
 # Import serpent stuff
-from tokenizer import tokenize, TokenError
-from compiler import compile_hsc_script, compile_serpent_script, CompileError
-from error import show_message_for_character, error
-from parser import parse_serpent_script, parse_hsc_script, ParserError
+#
+# Only what every conversion needs is imported here. The parser and compiler
+# for the direction being converted, and anything only used by some options,
+# are imported when they are needed so that serpent starts quickly.
+from tokenizer import TOKENIZERS, TokenError, tokenize_lines, tokenize_stream
+from compiler import CompileError
+from error import show_message_for_character, warning, error, get_line, read_line
+from cache import BuildCache, replace_if_changed, write_if_changed, default_cache_directory, DEFAULT_MAX_SIZE
+from parser import ParserError, Statement, StatementType
 
-# Entry point
-def serpent():
-    parser = argparse.ArgumentParser(description="Serpent version 2.1.0")
-    parser.add_argument("--pretty", const=True, default=False, dest="pretty", action="store_const", help="Don't strip unnecessary characters (converting TO hsc)")
-    parser.add_argument("--reverse", const=True, default=False, dest="reverse", action="store_const", help="Convert a Halo script to serpent")
-    parser.add_argument("--strip", const=True, default=False, dest="strip", action="store_const", help="Strip unnecessary characters (converting FROM hsc)")
-    parser.add_argument("input", help="Path to input script")
-    parser.add_argument("output", help="Path to output script")
-    args = parser.parse_args()
+# Convert a script one top-level definition at a time
+#
+# Tokens are read from the input as they are needed, and each definition is
+# written out as soon as it is compiled, so only one definition is held at a
+# time. The output is written to a temporary file first so that it is left
+# alone if an error occurs or if it is unchanged. If optimize is given, each
+# definition is optimized with it first, adding to report if it isn't None.
+# Returns True if it was converted.
+def convert_stream(input, output, parse_definitions, emit, strip, scan, optimize = None, report = None):
+    temp_output = output + ".tmp"
+    success = False
+    global_types = {}
 
-    parser = parse_hsc_script if args.reverse else parse_serpent_script
-    compiler = compile_serpent_script if args.reverse else compile_hsc_script
+    try:
+        with open(input, "r") as f, open(temp_output, "w") as o:
+            for definition in parse_definitions(tokenize_lines(f, scan)):
+                if optimize is not None:
+                    definition = optimize(definition, global_types, report)
 
+                # Compile it as a script of its own so it is separated the same way
+                script = Statement()
+                script.statement_type = StatementType.MAIN_SCRIPT_BLOCK
+                script.children = [definition]
+                emit(script, o, strip)
+        success = True
+    except FileNotFoundError as e:
+        error("An error occurred while opening: {:s}".format(str(e)))
+    except TokenError as e:
+        error("An error occurred when tokenizing: {:s}".format(e.message))
+        show_message_for_character(e.line, e.character, read_line(input, e.line), e.message_under)
+    except ParserError as e:
+        error("An error occurred when parsing: {:s}".format(e.message))
+        show_message_for_character(e.token.line, e.token.character, read_line(input, e.token.line), e.message_under)
+    except CompileError as e:
+        error("An error occurred when compiling: {:s}".format(e.message))
+    finally:
+        if success:
+            replace_if_changed(temp_output, output)
+        elif os.path.exists(temp_output):
+            os.remove(temp_output)
+
+    return success
+
+# Version of serpent, which is part of the key for cached outputs
+VERSION = "2.1.0"
+
+# Get the cache to use, or None if the cache isn't used
+def open_cache(args):
+    if not args.cache:
+        return None
+    return BuildCache(args.cache_dir or default_cache_directory(), VERSION, args.cache_size)
+
+# Get the options that change the output, for the key for cached outputs
+def cache_options(args):
     strip = args.strip if args.reverse else not args.pretty
+    options = "reverse={:d} strip={:d}".format(args.reverse, strip)
+    if args.optimize:
+        options = options + " optimize=1"
+        # Optimizing one definition at a time gives a different output
+        if args.stream:
+            options = options + " stream=1"
+    if args.remove_unused:
+        options = options + " remove_unused=1"
+    return options
 
-    # Get the tokens
-    tokens = []
-    lines = []
+# Convert one script, returning True if it was converted
+#
+# If the cache is used and this script was already converted with the same
+# options, the cached output is used instead. Errors are shown as they occur.
+def convert(input, output, args):
+    cache = open_cache(args)
+    if cache is None or args.optimize_report:
+        return convert_script(input, output, args)
+
+    # Find the output in the cache
+    key = None
+    try:
+        with open(input, "rb") as f:
+            key = cache.key(f.read(), cache_options(args))
+        data = cache.get(key)
+        if data is not None:
+            write_if_changed(output, data)
+            return True
+    except FileNotFoundError:
+        # Let convert_script() show the error
+        pass
+    except OSError as e:
+        warning("The cache could not be read: {:s}".format(str(e)))
+
+    if not convert_script(input, output, args):
+        return False
+
+    # Store it for next time
+    if key is not None:
+        try:
+            with open(output, "rb") as f:
+                cache.put(key, f.read())
+        except OSError as e:
+            warning("The cache could not be written: {:s}".format(str(e)))
+
+    return True
 
+# Get the scan functions for the tokenizer to use
+def select_tokenizer(args):
+    # Long single-line HSC scripts are scanned much faster with NumPy
+    tokenizer = args.tokenizer
+    if tokenizer is None:
+        tokenizer = "numpy" if args.reverse and "numpy" in TOKENIZERS else "table"
+    return TOKENIZERS[tokenizer]
+
+# Read, tokenize and parse a whole script, returning None if it can't be
+# parsed. Errors are shown as they occur.
+def read_script(input, parse, definitions, scan, bulk_scan, arena = False):
     # Open the thing
     try:
-        with open(args.input, "r") as f:
-            line = 0
-            text = f.readline()
-            while text != "":
-                line = line + 1
-                try:
-                    tokens.extend(tokenize(text, line))
-                except TokenError as e:
-                    error("An error occurred when tokenizing: {:s}".format(e.message))
-                    show_message_for_character(line, e.character, text, e.message_under)
-                    return
-
-                lines.append(text)
-                text = f.readline()
+        with open(input, "r") as f:
+            source = f.read()
     except FileNotFoundError as e:
         error("An error occurred while opening: {:s}".format(str(e)))
-        return
+        return None
+
+    # Get the tokens
+    tokens = None
+    try:
+        tokens = tokenize_stream(source, scan, bulk_scan)
+    except TokenError as e:
+        error("An error occurred when tokenizing: {:s}".format(e.message))
+        show_message_for_character(e.line, e.character, get_line(source, e.line), e.message_under)
+        return None
 
     # Parse it
     parsed = None
     try:
-        parsed = parser(tokens)
+        if arena:
+            from parser import build_arena
+            parsed = build_arena(definitions(tokens)).root()
+        else:
+            parsed = parse(tokens)
     except ParserError as e:
         error("An error occurred when parsing: {:s}".format(e.message))
-        show_message_for_character(e.token.line, e.token.character, lines[e.token.line - 1], e.message_under)
+        show_message_for_character(e.token.line, e.token.character, get_line(source, e.token.line), e.message_under)
+        return None
+
+    return parsed
+
+# Convert one script without the cache, returning True if it was converted
+def convert_script(input, output, args):
+    if args.reverse:
+        from parser import parse_hsc_script as parse, parse_hsc_definitions as definitions
+        from compiler import emit_serpent_script as emit
+    else:
+        from parser import parse_serpent_script as parse, parse_serpent_definitions as definitions
+        from compiler import emit_hsc_script as emit
+
+    strip = args.strip if args.reverse else not args.pretty
+
+    scan, bulk_scan = select_tokenizer(args)
+
+    optimize = None
+    passes = None
+    report = None
+    if args.optimize or args.remove_unused:
+        from optimizer import optimize, select_passes, format_report
+        passes = select_passes(args.optimize, args.remove_unused)
+        if args.optimize_report:
+            report = []
+
+    if args.stream:
+        converted = convert_stream(input, output, definitions, emit, strip, scan, optimize, report)
+        if converted and report is not None:
+            print("\n".join(format_report(report)))
+        return converted
+
+    parsed = read_script(input, parse, definitions, scan, bulk_scan, args.arena)
+    if parsed is None:
+        return False
+
+    if optimize is not None:
+        parsed = optimize(parsed, None, report, passes)
+
+    # Make it into a hsc thing, writing it out as it is compiled. It is written
+    # to a temporary file first so that the output is left alone if it fails or
+    # if it is unchanged.
+    temp_output = output + ".tmp"
+    success = False
+    try:
+        with open(temp_output, "w") as f:
+            emit(parsed, f, strip)
+        success = True
+    except CompileError as e:
+        error("An error occurred when compiling: {:s}".format(e.message))
+    finally:
+        if success:
+            replace_if_changed(temp_output, output)
+        elif os.path.exists(temp_output):
+            os.remove(temp_output)
+
+    if success and report is not None:
+        print("\n".join(format_report(report, passes)))
+
+    return success
+
+
+# Show how many nodes each global and script of a script has and how deep it
+# goes on Halo's script stack, returning True if it is within the budgets
+#
+# The script is optimized first if --optimize or --remove-unused is given, so
+# this measures what would be written. Nothing is written.
+def check_script_budget(input, args):
+    if args.reverse:
+        from parser import parse_hsc_script as parse, parse_hsc_definitions as definitions
+    else:
+        from parser import parse_serpent_script as parse, parse_serpent_definitions as definitions
+    from optimizer import measure_budget, check_budget, format_budget, NODE_LIMIT
+
+    scan, bulk_scan = select_tokenizer(args)
+    parsed = read_script(input, parse, definitions, scan, bulk_scan)
+    if parsed is None:
+        return False
+
+    if args.optimize or args.remove_unused:
+        from optimizer import optimize, select_passes
+        parsed = optimize(parsed, None, None, select_passes(args.optimize, args.remove_unused))
+
+    measurements = measure_budget(parsed)
+    max_nodes = args.max_nodes if args.max_nodes is not None else NODE_LIMIT
+    problems = check_budget(measurements, max_nodes, args.max_script_nodes, args.max_depth)
+    print("\n".join(format_budget(measurements, problems)))
+    return len(problems) == 0
+
+# Extensions of serpent and HSC scripts, for finding scripts in batch mode
+SERPENT_EXTENSION = ".serpent"
+HSC_EXTENSION = ".hsc"
+
+# Get the directory a glob pattern starts from, which is everything up to its
+# first wildcard
+def glob_base(pattern):
+    import glob
+    parts = []
+    for part in pattern.replace("\\", "/").split("/"):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return "/".join(parts) if len(parts) > 0 else "."
+
+# Find the scripts to convert in batch mode
+#
+# input is a directory, which is searched for scripts, a glob pattern, or a
+# manifest file with a directory or glob pattern on each line (relative to the
+# manifest). Each script's output has the same path relative to output as the
+# script has relative to its directory or to where its pattern starts.
+#
+# Returns a list of (input, output) pairs.
+def find_scripts(input, output, reverse):
+    import glob
+    extension = HSC_EXTENSION if reverse else SERPENT_EXTENSION
+    output_extension = SERPENT_EXTENSION if reverse else HSC_EXTENSION
+
+    # Get the patterns to find
+    if os.path.isdir(input):
+        patterns = [os.path.join(glob.escape(input), "**", "*" + extension)]
+    elif os.path.isfile(input):
+        patterns = []
+        with open(input, "r") as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0 or line.startswith("#"):
+                    continue
+                line = os.path.join(os.path.dirname(input), line)
+                if os.path.isdir(line):
+                    line = os.path.join(glob.escape(line), "**", "*" + extension)
+                patterns.append(line)
+    else:
+        patterns = [input]
+
+    scripts = {}
+    for pattern in patterns:
+        base = glob_base(pattern)
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path not in scripts:
+                relative = os.path.splitext(os.path.relpath(path, base))[0]
+                scripts[path] = os.path.join(output, relative + output_extension)
+
+    return list(scripts.items())
+
+# Convert one script in batch mode, returning whether it was converted and any
+# errors that were shown
+def convert_batch_script(input, output, args):
+    import io
+    import contextlib
+    messages = io.StringIO()
+    with contextlib.redirect_stderr(messages):
+        try:
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            success = convert(input, output, args)
+        except Exception as e:
+            error("An unexpected error occurred: {:s}".format(repr(e)))
+            success = False
+    return success, messages.getvalue()
+
+# Convert every script found by find_scripts() with a pool of processes
+#
+# The biggest scripts are started first so that one big script is not left
+# running on its own at the end. Returns True if every script was converted.
+def convert_batch(args):
+    import concurrent.futures
+    scripts = find_scripts(args.input, args.output, args.reverse)
+    if len(scripts) == 0:
+        error("No scripts were found in {:s}".format(args.input))
+        return False
+
+    sizes = {input: os.path.getsize(input) for input, output in scripts}
+    scripts.sort(key = lambda script: sizes[script[0]], reverse = True)
+
+    start = time.perf_counter()
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers = args.jobs) as executor:
+        futures = {executor.submit(convert_batch_script, input, output, args): input for input, output in scripts}
+        for future in concurrent.futures.as_completed(futures):
+            success, messages = future.result()
+            if not success:
+                failed.append((futures[future], messages))
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    # Show the errors for each script that failed
+    for input, messages in sorted(failed):
+        error("{:s} could not be converted".format(input))
+        sys.stderr.write(messages)
+
+    converted = len(scripts) - len(failed)
+    megabytes = sum(sizes.values()) / 1000000
+    print("Converted {:d} of {:d} scripts ({:.2f} MB) in {:.2f} s: {:.1f} scripts/s, {:.2f} MB/s".format(converted, len(scripts), megabytes, elapsed, len(scripts) / elapsed, megabytes / elapsed))
+
+    return len(failed) == 0
+
+# Get the scripts to watch as a list of (input, output) pairs
+def find_watched_scripts(args):
+    if args.batch:
+        return find_scripts(args.input, args.output, args.reverse)
+    return [(args.input, args.output)]
+
+# Get the modification time and size of a file, or None if it isn't there
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Convert one script that is being watched, showing how long it took
+#
+# converter is the script's IncrementalConverter, so only the definitions that
+# changed since the last time are converted again.
+def convert_watched_script(input, output, converter):
+    start = time.perf_counter()
+
+    try:
+        with open(input, "r") as f:
+            source = f.read()
+    except OSError as e:
+        error("An error occurred while opening: {:s}".format(str(e)))
         return
 
-    # Make it into a hsc thing
-    compiled = None
     try:
-        compiled = compiler(parsed, strip)
+        compiled = converter.convert(source)
+    except TokenError as e:
+        error("An error occurred when tokenizing: {:s}".format(e.message))
+        show_message_for_character(e.line, e.character, get_line(source, e.line), e.message_under)
+        return
+    except ParserError as e:
+        error("An error occurred when parsing: {:s}".format(e.message))
+        show_message_for_character(e.token.line, e.token.character, get_line(source, e.token.line), e.message_under)
+        return
     except CompileError as e:
         error("An error occurred when compiling: {:s}".format(e.message))
         return
 
-    # Save
-    with open(args.output,"w+") as f:
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    temp_output = output + ".tmp"
+    with open(temp_output, "w") as f:
         f.write(compiled)
+    changed = replace_if_changed(temp_output, output)
+
+    print("{:s} {:s} in {:.1f} ms ({:d} of {:d} definitions converted)".format(input, "converted" if changed else "unchanged", (time.perf_counter() - start) * 1000, converter.converted, converter.converted + converter.reused), flush=True)
+
+# Keep converting scripts as they are changed, until interrupted
+#
+# The scripts are polled every args.poll seconds. Once a script changes, it is
+# converted after nothing has changed for args.debounce seconds, so that a
+# burst of saves is only converted once. With --batch, the directory, glob
+# pattern or manifest is searched again each time, so new scripts are picked
+# up.
+def watch(args):
+    from cache import IncrementalConverter
+    strip = args.strip if args.reverse else not args.pretty
+    scan, bulk_scan = select_tokenizer(args)
+
+    converters = {}
+    states = {}
+    pending = {}
+    last_change = None
+
+    print("Watching {:s} (press Ctrl+C to stop)".format(args.input), flush=True)
+
+    try:
+        while True:
+            for input, output in find_watched_scripts(args):
+                state = file_state(input)
+                if state is None or state == states.get(input):
+                    continue
+                states[input] = state
+                pending[input] = output
+                last_change = time.monotonic()
+
+            # Wait for the saves to settle down
+            if len(pending) > 0 and time.monotonic() - last_change >= args.debounce:
+                for input in sorted(pending):
+                    if input not in converters:
+                        converters[input] = IncrementalConverter(args.reverse, strip, scan, bulk_scan)
+                    convert_watched_script(input, pending[input], converters[input])
+                pending = {}
+
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+
+# Convert one script, showing how long each phase took and how much memory it
+# used, and saving cProfile stats if asked to
+#
+# The cache isn't used, so every phase is run.
+def convert_profiled(input, output, args):
+    from profiler import PhaseProfiler, add_hook, remove_hook, format_report
+
+    profiler = PhaseProfiler() if args.profile else None
+    stats = None
+    if args.profile_stats is not None:
+        import cProfile
+        stats = cProfile.Profile()
+
+    if profiler is not None:
+        add_hook(profiler)
+    start = time.perf_counter()
+    try:
+        if stats is not None:
+            stats.enable()
+        converted = convert_script(input, output, args)
+    finally:
+        if stats is not None:
+            stats.disable()
+        total = time.perf_counter() - start
+        if profiler is not None:
+            remove_hook(profiler)
+            profiler.stop()
+
+    if stats is not None:
+        stats.dump_stats(args.profile_stats)
+    if profiler is not None:
+        print("\n".join(format_report(profiler, total)))
+
+    return converted
+
+# Entry point
+def serpent():
+    parser = argparse.ArgumentParser(description="Serpent version {:s}".format(VERSION))
+    parser.add_argument("--pretty", const=True, default=False, dest="pretty", action="store_const", help="Don't strip unnecessary characters (converting TO hsc)")
+    parser.add_argument("--reverse", const=True, default=False, dest="reverse", action="store_const", help="Convert a Halo script to serpent")
+    parser.add_argument("--strip", const=True, default=False, dest="strip", action="store_const", help="Strip unnecessary characters (converting FROM hsc)")
+    parser.add_argument("--stream", const=True, default=False, dest="stream", action="store_const", help="Convert one definition at a time to save memory on large scripts")
+    parser.add_argument("--arena", const=True, default=False, dest="arena", action="store_const", help="Keep the parsed script in a compact arena to save memory on large scripts")
+    parser.add_argument("--optimize", const=True, default=False, dest="optimize", action="store_const", help="Fold constant expressions and if statements and flatten nested operators and blocks before compiling")
+    parser.add_argument("--optimize-report", const=True, default=False, dest="optimize_report", action="store_const", help="Show how many nodes --optimize saved in each definition (implies --optimize)")
+    parser.add_argument("--remove-unused", const=True, default=False, dest="remove_unused", action="store_const", help="Remove globals and static and stub scripts that aren't used by any startup, continuous or dormant script")
+    parser.add_argument("--budget", const=True, default=False, dest="budget", action="store_const", help="Show how many nodes each definition has and how deep it goes on the script stack instead of converting, and fail if a budget is exceeded")
+    parser.add_argument("--max-nodes", type=int, default=None, dest="max_nodes", help="Most nodes the whole script can have with --budget (default is Halo's limit of 19001)")
+    parser.add_argument("--max-script-nodes", type=int, default=None, dest="max_script_nodes", help="Most nodes any one global or script can have with --budget (default is no limit)")
+    parser.add_argument("--max-depth", type=int, default=None, dest="max_depth", help="Deepest any global or script can go on the script stack with --budget (default is no limit)")
+    parser.add_argument("--tokenizer", default=None, choices=TOKENIZERS.keys(), help="Tokenizer to use (legacy is the original, slower tokenizer; numpy is the default for --reverse if NumPy is installed)")
+    parser.add_argument("--batch", const=True, default=False, dest="batch", action="store_const", help="Convert every script in a directory, glob pattern or manifest file into an output directory")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of processes to use with --batch, or threads with --server (default is based on the number of CPUs)")
+    parser.add_argument("--watch", const=True, default=False, dest="watch", action="store_const", help="Keep converting the input (or every script found with --batch) whenever it changes")
+    parser.add_argument("--poll", type=float, default=0.25, help="Seconds between checking for changes with --watch (default is 0.25)")
+    parser.add_argument("--debounce", type=float, default=0.2, help="Seconds to wait for changes to stop before converting with --watch (default is 0.2)")
+    parser.add_argument("--server", const=True, default=False, dest="server", action="store_const", help="Handle JSON-RPC requests on stdin and stdout (or --socket) instead of converting a script")
+    parser.add_argument("--socket", default=None, help="Path of a Unix domain socket to listen on with --server")
+    parser.add_argument("--cache", const=True, default=False, dest="cache", action="store_const", help="Reuse the output of scripts that were already converted with the same options")
+    parser.add_argument("--cache-dir", default=None, dest="cache_dir", help="Directory for the cache (default is {:s})".format(default_cache_directory()))
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE, dest="cache_size", help="Maximum size of the cache in bytes (default is {:d})".format(DEFAULT_MAX_SIZE))
+    parser.add_argument("--cache-info", const=True, default=False, dest="cache_info", action="store_const", help="Show what is in the cache and exit")
+    parser.add_argument("--profile", const=True, default=False, dest="profile", action="store_const", help="Show the time, peak memory and throughput of tokenizing, parsing and compiling")
+    parser.add_argument("--profile-stats", default=None, dest="profile_stats", help="Save cProfile stats for the conversion to this file")
+    parser.add_argument("input", nargs="?", help="Path to input script (or directory, glob pattern or manifest with --batch)")
+    parser.add_argument("output", nargs="?", help="Path to output script (or directory with --batch)")
+    args = parser.parse_args()
+
+    if args.cache_info:
+        print(BuildCache(args.cache_dir or default_cache_directory(), VERSION, args.cache_size).describe())
+        return
+
+    if args.server:
+        from server import serve_stdio, serve_unix_socket
+        if args.socket is not None:
+            try:
+                serve_unix_socket(args.socket, workers = args.jobs)
+            except FileExistsError as e:
+                error(str(e))
+                sys.exit(1)
+        else:
+            serve_stdio(workers = args.jobs)
+        return
+
+    if args.budget:
+        if args.input is None:
+            parser.error("the following arguments are required: input")
+        if args.stream or args.arena or args.watch or args.batch:
+            parser.error("--budget can't be used with --stream, --arena, --watch or --batch")
+        if not check_script_budget(args.input, args):
+            sys.exit(1)
+        return
+
+    if args.input is None or args.output is None:
+        parser.error("the following arguments are required: input, output")
+
+    if args.optimize_report:
+        if args.watch or args.batch:
+            parser.error("--optimize-report can only be used when converting one script")
+        args.optimize = True
+
+    if args.optimize and (args.arena or args.watch):
+        parser.error("--optimize can't be used with --arena or --watch")
+
+    if args.remove_unused and (args.stream or args.arena or args.watch):
+        parser.error("--remove-unused can't be used with --stream, --arena or --watch")
+
+    if (args.profile or args.profile_stats is not None) and (args.watch or args.batch):
+        parser.error("--profile and --profile-stats can only be used when converting one script")
+
+    if args.watch:
+        watch(args)
+    elif args.batch:
+        if not convert_batch(args):
+            sys.exit(1)
+    elif args.profile or args.profile_stats is not None:
+        convert_profiled(args.input, args.output, args)
+    else:
+        convert(args.input, args.output, args)
 
 # Entry point
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+#
+# server/rpc.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import sys
+import stat
+import json
+import hashlib
+import threading
+import socketserver
+import collections
+import concurrent.futures
+
+from tokenizer import Token, TokenError, tokenize_stream
+from parser import ParserError, parse_serpent_script, parse_hsc_script
+from compiler import CompileError, compile_hsc_script, compile_serpent_script
+from cache import IncrementalConverter
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Number of results to keep for reuse
+MAX_RESULTS = 256
+
+# Error in a request, which is sent back as a JSON-RPC error
+class RequestError(Exception):
+    code = INTERNAL_ERROR
+    message = "An error occurred"
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+    def __str__(self):
+        return "RequestError: {:s}".format(self.message)
+
+# Get a diagnostic for an error, for sending back instead of showing it
+def diagnostic(e):
+    if isinstance(e, TokenError):
+        return {"stage": "tokenize", "line": e.line, "character": e.character, "message": e.message, "message_under": e.message_under}
+    elif isinstance(e, ParserError):
+        return {"stage": "parse", "line": e.token.line, "character": e.token.character, "message": e.message, "message_under": e.message_under}
+    else:
+        return {"stage": "compile", "line": None, "character": None, "message": e.message, "message_under": None}
+
+def token_to_json(token):
+    return {"token": token.token, "type": token.token_type.name, "line": token.line, "character": token.character}
+
+# Turn a statement tree into JSON objects
+#
+# The tree is walked with an explicit stack rather than by recursion, so it can
+# be nested as deeply as needed.
+def statement_to_json(statement):
+    root = {}
+    stack = [(statement, root)]
+
+    while len(stack) > 0:
+        statement, node = stack.pop()
+        if isinstance(statement, Token):
+            node.update(token_to_json(statement))
+            continue
+
+        node["type"] = statement.statement_type.name
+        for field in ("global_type", "global_name", "function_name", "script_type", "script_return_type", "script_name"):
+            value = getattr(statement, field)
+            if value is not None:
+                node[field] = value
+
+        children = []
+        for child in statement.children:
+            child_node = {}
+            children.append(child_node)
+            stack.append((child, child_node))
+        node["children"] = children
+
+    return root
+
+# JSON-RPC server for converting and checking scripts
+#
+# Requests are handled by handle_request(), which takes and returns JSON-RPC
+# messages as dictionaries, so the same server can be used over any transport.
+# Each method takes the text of a script as "text", and compile and reverse
+# also take an optional "uri" naming the document. Results are kept by a hash
+# of the method and its parameters, so asking again about a document that has
+# not changed returns the same result without doing the work again, and each
+# document has an IncrementalConverter, so only the definitions that changed in
+# it are converted again.
+#
+# Methods:
+#
+# tokenize {text}           {tokens, diagnostics}
+# parse    {text, reverse}  {tree, diagnostics}
+# check    {text, reverse}  {diagnostics}
+# compile  {text, pretty}   {output, diagnostics} (serpent to HSC)
+# reverse  {text, strip}    {output, diagnostics} (HSC to serpent)
+class Server:
+    results = None
+    converters = None
+    methods = None
+    lock = None
+
+    def __init__(self):
+        self.results = collections.OrderedDict()
+        self.converters = {}
+        self.lock = threading.Lock()
+        self.methods = {
+            "tokenize": self.tokenize,
+            "parse": self.parse,
+            "check": self.check,
+            "compile": self.compile,
+            "reverse": self.reverse
+        }
+
+    # Handle a request, returning the response, or None if it is a notification
+    def handle_request(self, request):
+        id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+                raise RequestError(INVALID_REQUEST, "Invalid request")
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RequestError(METHOD_NOT_FOUND, "Unknown method {:s}".format(request["method"]))
+            params = request.get("params", {})
+            if not isinstance(params, dict) or not isinstance(params.get("text"), str):
+                raise RequestError(INVALID_PARAMS, "Expected an object with text as params")
+            result = self.get_result(request["method"], method, params)
+        except RequestError as e:
+            response = {"jsonrpc": "2.0", "id": id, "error": {"code": e.code, "message": e.message}}
+        except Exception as e:
+            response = {"jsonrpc": "2.0", "id": id, "error": {"code": INTERNAL_ERROR, "message": repr(e)}}
+        else:
+            response = {"jsonrpc": "2.0", "id": id, "result": result}
+
+        if isinstance(request, dict) and "id" not in request:
+            return None
+        return response
+
+    # Handle a line of JSON (as a string, or as UTF-8 bytes), returning the
+    # response as a line of JSON, or None
+    def handle_line(self, line):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+        except UnicodeDecodeError:
+            response = {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": "Invalid UTF-8"}}
+            return json.dumps(response) + "\n"
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": "Invalid JSON"}}
+        else:
+            response = self.handle_request(request)
+        if response is None:
+            return None
+        return json.dumps(response) + "\n"
+
+    # Get the result of a method, reusing it if it was already worked out
+    def get_result(self, name, method, params):
+        key = hashlib.blake2b(json.dumps([name, params], sort_keys = True).encode("utf-8"), digest_size = 16).digest()
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                return result
+
+        result = method(params)
+
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > MAX_RESULTS:
+                self.results.popitem(last = False)
+        return result
+
+    def parse_tokens(self, tokens, reverse):
+        return parse_hsc_script(tokens) if reverse else parse_serpent_script(tokens)
+
+    def tokenize(self, params):
+        try:
+            tokens = tokenize_stream(params["text"])
+        except TokenError as e:
+            return {"tokens": None, "diagnostics": [diagnostic(e)]}
+        return {"tokens": [token_to_json(token) for token in tokens], "diagnostics": []}
+
+    def parse(self, params):
+        try:
+            tree = self.parse_tokens(tokenize_stream(params["text"]), params.get("reverse", False))
+        except (TokenError, ParserError) as e:
+            return {"tree": None, "diagnostics": [diagnostic(e)]}
+        return {"tree": statement_to_json(tree), "diagnostics": []}
+
+    def check(self, params):
+        reverse = params.get("reverse", False)
+        compile = compile_serpent_script if reverse else compile_hsc_script
+        try:
+            compile(self.parse_tokens(tokenize_stream(params["text"]), reverse), not reverse)
+        except (TokenError, ParserError, CompileError) as e:
+            return {"diagnostics": [diagnostic(e)]}
+        return {"diagnostics": []}
+
+    def compile(self, params):
+        return self.convert(params, False, not params.get("pretty", False))
+
+    def reverse(self, params):
+        return self.convert(params, True, params.get("strip", False))
+
+    # Convert a document with its IncrementalConverter
+    def convert(self, params, reverse, strip):
+        uri = params.get("uri")
+        key = (uri, reverse, strip)
+
+        with self.lock:
+            converter = self.converters.get(key)
+            if converter is None:
+                converter = (IncrementalConverter(reverse, strip), threading.Lock())
+                if uri is not None:
+                    self.converters[key] = converter
+
+        converter, lock = converter
+        with lock:
+            try:
+                output = converter.convert(params["text"])
+            except (TokenError, ParserError, CompileError) as e:
+                return {"output": None, "diagnostics": [diagnostic(e)]}
+        return {"output": output, "diagnostics": []}
+
+# Read requests from input and write responses to output, one per line
+#
+# Each request is handled on a thread pool, so a slow request doesn't hold up
+# the others, and responses are written as they are finished.
+def serve_lines(server, lines, write, executor):
+    write_lock = threading.Lock()
+
+    def respond(line):
+        response = server.handle_line(line)
+        if response is not None:
+            with write_lock:
+                write(response)
+
+    futures = []
+    for line in lines:
+        if len(line.strip()) > 0:
+            futures.append(executor.submit(respond, line))
+    concurrent.futures.wait(futures)
+
+# Serve requests on stdin and stdout until stdin is closed
+def serve_stdio(server = None, workers = None):
+    server = server or Server()
+
+    def write(response):
+        sys.stdout.write(response)
+        sys.stdout.flush()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor:
+        serve_lines(server, sys.stdin.buffer, write, executor)
+
+# Remove a socket left at a path, raising FileExistsError if something other
+# than a socket is there
+def remove_socket(path):
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError("{:s} already exists and is not a socket".format(path))
+    os.remove(path)
+
+# Serve requests on a Unix domain socket until interrupted
+#
+# Any number of clients can connect at once, and they share the same results
+# and documents. A socket already at path (such as one left by a server that
+# was killed) is replaced, but anything else there raises FileExistsError.
+def serve_unix_socket(path, server = None, workers = None):
+    server = server or Server()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers = workers)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_lines(server, self.rfile, lambda response: self.wfile.write(response.encode("utf-8")), executor)
+
+    remove_socket(path)
+
+    try:
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as socket_server:
+            socket_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+        remove_socket(path)
@@ -22,6 +22,23 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .tokenizer import tokenize
-from .types import TokenError, TokenType, Token
-from .symbols import EQUALITY_OPERATORS, RELATIONAL_OPERATORS, LOGICAL_OPERATORS, ARITHMETIC_SYMBOLS
+from .tokenizer import tokenize, tokenize_lines, tokenize_stream, scan, scan_legacy
+from .legacy_tokenizer import tokenize as tokenize_legacy
+from .types import TokenError, TokenType, Token, TokenStream
+from .numpy_tokenizer import scan_numpy
+from .symbols import EQUALITY_OPERATORS, RELATIONAL_OPERATORS, LOGICAL_OPERATORS, ARITHMETIC_SYMBOLS, VARIADIC_SYMBOLS, OPERATORS_BY_PRECEDENCE, SCRIPT_TYPES, VALUE_TYPES, KEYWORD_CODES, NO_CODE, keyword_code
+
+from .numpy_tokenizer import AVAILABLE as NUMPY_AVAILABLE
+
+# Tokenizer engines that can be selected with serpent.py --tokenizer
+#
+# Each one is a scan function for tokenize_lines() and tokenize_stream(), and a
+# bulk scan function for tokenize_stream() (or None). The numpy engine is only
+# available if NumPy is installed.
+TOKENIZERS = {
+    "table": (scan, None),
+    "legacy": (scan_legacy, None)
+}
+
+if NUMPY_AVAILABLE:
+    TOKENIZERS["numpy"] = (scan, scan_numpy)
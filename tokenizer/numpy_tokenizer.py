@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+#
+# tokenizer/numpy_tokenizer.py
+#
+# Copyright (c) 2019 Kavawuvi
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# NOTE: This requires NumPy. If NumPy is not installed, scan_numpy() does
+# nothing, and tokenize_stream() scans every line with its scan function.
+#
+# NumPy takes longer to import than the rest of serpent put together, so it is
+# only imported (and the tables below are only built) the first time a line is
+# long enough to be scanned with it.
+
+import importlib.util
+
+# Whether NumPy is installed, without importing it
+AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+numpy = None
+
+from .types import TokenType
+from .tokenizer import CHARACTER_CLASSES, SPACE, QUOTE, DIGIT, LETTER, COMBINABLE, DELIMITER, DECIMAL_POINT, COMMENT, NON_ASCII
+
+# Lines shorter than this are not worth setting up NumPy for
+MINIMUM_LENGTH = 4096
+
+# Long lines are scanned a chunk of about this many characters at a time so
+# memory use does not grow with the line
+CHUNK_LENGTH = 1 << 20
+
+# Runs of characters that make up a token
+RUN_SPACE = 0
+RUN_ATOM = 1
+RUN_SYMBOL = 2
+RUN_DELIMITER = 3
+RUN_STRING = 4
+RUN_OTHER = 5
+
+CLASS_TABLE = None
+RUN_TABLE = None
+TYPE_DTYPE = None
+OFFSET_DTYPE = None
+
+# Import NumPy and build the tables, returning False if NumPy isn't installed
+def load_numpy():
+    global numpy, CLASS_TABLE, RUN_TABLE, TYPE_DTYPE, OFFSET_DTYPE
+
+    if numpy is not None:
+        return True
+    if not AVAILABLE:
+        return False
+
+    try:
+        import numpy as numpy_module
+    except ImportError:
+        return False
+
+    CLASS_TABLE = numpy_module.array(CHARACTER_CLASSES + (NON_ASCII,) * 128, dtype=numpy_module.uint8)
+
+    RUN_TABLE = numpy_module.full(NON_ASCII + 1, RUN_OTHER, dtype=numpy_module.uint8)
+    RUN_TABLE[SPACE] = RUN_SPACE
+    RUN_TABLE[DIGIT] = RUN_ATOM
+    RUN_TABLE[LETTER] = RUN_ATOM
+    RUN_TABLE[DECIMAL_POINT] = RUN_ATOM
+    RUN_TABLE[COMBINABLE] = RUN_SYMBOL
+    RUN_TABLE[DELIMITER] = RUN_DELIMITER
+
+    TYPE_DTYPE = numpy_module.uint8
+    OFFSET_DTYPE = numpy_module.uint32
+
+    numpy = numpy_module
+    return True
+
+# Scan a long line with NumPy, adding its tokens to a TokenStream
+#
+# Characters are classified and token boundaries are found for the whole line
+# at once, so only the tokens themselves are ever looked at one at a time (and
+# only when a parser asks for them). This only handles lines that the table
+# tokenizer would tokenize without any trouble. For anything else (short
+# lines, errors, non-ASCII characters, unterminated strings, etc.) it adds
+# nothing and returns False so the line can be scanned normally.
+def scan_numpy(text, start, end, line, stream):
+    if end - start < MINIMUM_LENGTH or not load_numpy():
+        return False
+
+    line_text = text[start:end]
+    if not line_text.isascii():
+        return False
+
+    data = numpy.frombuffer(line_text.encode("ascii"), dtype=numpy.uint8)
+    length = len(data)
+    stream_length = len(stream)
+    position = 0
+
+    while position < length:
+        cut = find_cut(data, position)
+        columns = scan_chunk(data[position:cut], cut == length)
+        if columns is None:
+            stream.truncate(stream_length)
+            return False
+
+        types, starts, ends, comment = columns
+        starts = starts + position
+        ends = ends + position
+        stream.extend(
+            types.astype(TYPE_DTYPE).tobytes(),
+            (starts + start).astype(OFFSET_DTYPE).tobytes(),
+            (ends + start).astype(OFFSET_DTYPE).tobytes(),
+            numpy.full(len(types), line, dtype=OFFSET_DTYPE).tobytes(),
+            (starts + 1).astype(OFFSET_DTYPE).tobytes()
+        )
+
+        if comment:
+            break
+        position = cut
+
+    return True
+
+# Find where to end a chunk starting at position
+#
+# Chunks end right before a left parenthesis that is not in a string, since
+# nothing carries over one of those.
+def find_cut(data, position):
+    window = CHUNK_LENGTH
+    while position + window < len(data):
+        chunk = data[position:position + window]
+        quote = chunk == 34
+        outside = ((numpy.cumsum(quote, dtype=numpy.int32) - quote) & 1) == 0
+        cuts = numpy.flatnonzero((chunk == 40) & outside)
+        if len(cuts) > 0 and cuts[-1] > 0:
+            return position + int(cuts[-1])
+        window = window * 2
+    return len(data)
+
+# Scan a chunk, returning (types, starts, ends, comment) or None
+#
+# at_end is whether the chunk ends the line. Otherwise it ends right before a
+# left parenthesis, which finishes any token before it.
+def scan_chunk(chunk, at_end):
+    quote = chunk == 34
+    quotes = numpy.cumsum(quote, dtype=numpy.int32)
+
+    # In a string (including the closing quote)
+    inside = ((quotes - quote) & 1) == 1
+
+    classes = CLASS_TABLE[chunk]
+
+    # Anything after a comment is ignored
+    comment = False
+    comments = numpy.flatnonzero((classes == COMMENT) & ~inside)
+    if len(comments) > 0:
+        comment = True
+        length = int(comments[0])
+        chunk = chunk[:length]
+        quote = quote[:length]
+        quotes = quotes[:length]
+        inside = inside[:length]
+        classes = classes[:length]
+    else:
+        length = len(chunk)
+
+    if length == 0:
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        return (empty, empty, empty, comment)
+
+    # Unterminated strings and strings with line breaks in them are errors
+    if quotes[-1] & 1 or numpy.any(inside & ((chunk == 10) | (chunk == 13))):
+        return None
+
+    string = inside | quote
+    runs = RUN_TABLE[classes]
+    runs[string] = RUN_STRING
+    if numpy.any(runs == RUN_OTHER):
+        return None
+
+    # A token starts wherever the kind of run changes, at every delimiter, and
+    # at every opening quote
+    previous = numpy.empty(length, dtype=numpy.uint8)
+    previous[0] = RUN_SPACE
+    previous[1:] = runs[:-1]
+    starts_mask = (runs != RUN_SPACE) & ((runs != previous) | (runs == RUN_DELIMITER) | (quote & ~inside))
+
+    # A minus sign on its own right before a number is part of it
+    minus = numpy.flatnonzero(starts_mask[:-1] & (chunk[:-1] == 45) & (classes[1:] == DIGIT) & (runs[1:] == RUN_ATOM))
+    starts_mask[minus + 1] = False
+
+    starts = numpy.flatnonzero(starts_mask)
+    breaks = numpy.flatnonzero(starts_mask | (runs == RUN_SPACE))
+    breaks = numpy.append(breaks, length)
+    ends = breaks[numpy.searchsorted(breaks, starts, side="right")]
+
+    first = chunk[starts]
+    first_class = classes[starts]
+    second_class = classes[numpy.minimum(starts + 1, length - 1)]
+    token_length = ends - starts
+
+    # Letters and decimal points outside of strings in each token
+    atom = ~string
+    letters = numpy.zeros(length + 1, dtype=numpy.int32)
+    numpy.cumsum((classes == LETTER) & atom, out=letters[1:])
+    letters = letters[ends] - letters[starts]
+    points = numpy.zeros(length + 1, dtype=numpy.int32)
+    numpy.cumsum(classes == DECIMAL_POINT, out=points[1:])
+    points = points[ends] - points[starts]
+
+    is_minus = first == 45
+    is_number = (first_class == DIGIT) | (is_minus & (token_length > 1))
+    is_symbol = (first_class == COMBINABLE) & ~is_number
+    is_name = first_class == LETTER
+    is_string = first == 34
+
+    # Things the table tokenizer would complain about
+    if numpy.any(first_class == DECIMAL_POINT):
+        return None
+    if numpy.any(is_minus & (token_length > 1) & (second_class != DIGIT)):
+        return None
+    if numpy.any(is_number & ((letters > 0) | (points > 1) | (chunk[ends - 1] == 46))):
+        return None
+    if numpy.any(is_name & (points > 0)):
+        return None
+
+    # ...and about the character after a symbol
+    following = numpy.minimum(ends, length - 1)
+    followed = ends < length
+    following_class = classes[following]
+    if numpy.any(is_symbol & followed & (following_class == QUOTE)):
+        return None
+    if numpy.any(is_minus & (token_length == 1) & followed & (following_class == LETTER)):
+        return None
+
+    types = numpy.full(len(starts), TokenType.OTHER.value, dtype=numpy.uint8)
+    types[is_string] = TokenType.STRING.value
+    types[is_symbol | (first_class == DELIMITER)] = TokenType.SYMBOL.value
+    types[is_number] = TokenType.INTEGER.value
+    types[is_number & (points == 1)] = TokenType.FLOAT.value
+
+    # A token that runs into the end of the line is dropped
+    if at_end and not comment and len(starts) > 0 and ends[-1] == length and not (is_string[-1] or first_class[-1] == DELIMITER):
+        types = types[:-1]
+        starts = starts[:-1]
+        ends = ends[:-1]
+
+    return (types, starts, ends, comment)
@@ -29,3 +29,172 @@ ARITHMETIC_SYMBOLS = ["+", "-", "*", "/"]
 ARITHMETIC_SYMBOLS.extend(EQUALITY_OPERATORS)
 ARITHMETIC_SYMBOLS.extend(RELATIONAL_OPERATORS)
 ARITHMETIC_SYMBOLS.extend(LOGICAL_OPERATORS)
+
+# Operators that Halo lets take any number of parameters. The rest take exactly
+# two.
+VARIADIC_SYMBOLS = ["+", "*", "and", "or"]
+
+# Operators from the highest precedence to the lowest. Operators in the same
+# group are evaluated in whichever order they appear in the script.
+OPERATORS_BY_PRECEDENCE = [
+    ["*", "/"],
+    ["+", "-"],
+    RELATIONAL_OPERATORS,
+    EQUALITY_OPERATORS,
+    ["and"],
+    ["or"]
+]
+
+SCRIPT_TYPES = [
+    "static",
+    "dormant",
+    "continuous",
+    "stub",
+    "startup"
+]
+
+VALUE_TYPES = [
+    "void",
+    "short",
+    "long",
+    "real",
+    "boolean",
+    "string",
+    "trigger_volume",
+    "cutscene_flag",
+    "cutscene_camera_point",
+    "cutscene_title",
+    "cutscene_recording",
+    "device_group",
+    "ai",
+    "ai_command_list",
+    "starting_profile",
+    "conversation",
+    "navpoint",
+    "hud_message",
+    "object_list",
+    "sound",
+    "effect",
+    "damage",
+    "looping_sound",
+    "animation_graph",
+    "actor_variant",
+    "damage_effect",
+    "object_definition",
+    "game_difficulty",
+    "team",
+    "ai_default_state",
+    "actor_type",
+    "hud_corner",
+    "object",
+    "unit",
+    "vehicle",
+    "weapon",
+    "device",
+    "scenery",
+    "object_name",
+    "unit_name",
+    "vehicle_name",
+    "weapon_name",
+    "device_name",
+    "scenery_name"
+]
+
+# Codes for keywords and symbols
+#
+# Each token is given the code for its text when it is tokenized (see
+# Token.code), or NO_CODE if it is not a keyword or symbol, so parsers and
+# compilers can compare integers instead of strings.
+NO_CODE = 0
+
+LEFT_PARENTHESIS = 1
+RIGHT_PARENTHESIS = 2
+COMMA = 3
+EXCLAMATION_POINT = 4
+EQUALS = 5
+
+MULTIPLY = 6
+DIVIDE = 7
+ADD = 8
+SUBTRACT = 9
+DOUBLE_EQUALS = 10
+NOT_EQUALS = 11
+GREATER_THAN_OR_EQUAL = 12
+LESS_THAN_OR_EQUAL = 13
+GREATER_THAN = 14
+LESS_THAN = 15
+AND = 16
+OR = 17
+ADD_SUBTRACT = 18
+SUBTRACT_SUBTRACT = 19
+
+GLOBAL = 20
+SCRIPT = 21
+IF = 22
+ELSEIF = 23
+ELSE = 24
+END = 25
+BEGIN = 26
+SET = 27
+NOT = 28
+COND = 29
+
+STATIC = 30
+DORMANT = 31
+CONTINUOUS = 32
+STUB = 33
+STARTUP = 34
+
+# Value types are given codes after everything else, in the order they are in VALUE_TYPES
+FIRST_VALUE_TYPE = 35
+
+KEYWORD_CODES = {
+    "(": LEFT_PARENTHESIS,
+    ")": RIGHT_PARENTHESIS,
+    ",": COMMA,
+    "!": EXCLAMATION_POINT,
+    "=": EQUALS,
+    "*": MULTIPLY,
+    "/": DIVIDE,
+    "+": ADD,
+    "-": SUBTRACT,
+    "==": DOUBLE_EQUALS,
+    "!=": NOT_EQUALS,
+    ">=": GREATER_THAN_OR_EQUAL,
+    "<=": LESS_THAN_OR_EQUAL,
+    ">": GREATER_THAN,
+    "<": LESS_THAN,
+    "and": AND,
+    "or": OR,
+    "+-": ADD_SUBTRACT,
+    "--": SUBTRACT_SUBTRACT,
+    "global": GLOBAL,
+    "script": SCRIPT,
+    "if": IF,
+    "elseif": ELSEIF,
+    "else": ELSE,
+    "end": END,
+    "begin": BEGIN,
+    "set": SET,
+    "not": NOT,
+    "cond": COND,
+    "static": STATIC,
+    "dormant": DORMANT,
+    "continuous": CONTINUOUS,
+    "stub": STUB,
+    "startup": STARTUP
+}
+
+for code, value_type in enumerate(VALUE_TYPES, FIRST_VALUE_TYPE):
+    KEYWORD_CODES[value_type] = code
+
+# Get the code for a token's text
+def keyword_code(text):
+    return KEYWORD_CODES.get(text, NO_CODE)
+
+# Sets of codes for checking what a token is
+SCRIPT_TYPE_CODES = frozenset(keyword_code(t) for t in SCRIPT_TYPES)
+VALUE_TYPE_CODES = frozenset(keyword_code(t) for t in VALUE_TYPES)
+LOGICAL_OPERATOR_CODES = frozenset(keyword_code(o) for o in LOGICAL_OPERATORS)
+ARITHMETIC_CODES = frozenset(keyword_code(o) for o in ARITHMETIC_SYMBOLS)
+VARIADIC_CODES = frozenset(keyword_code(o) for o in VARIADIC_SYMBOLS)
@@ -22,171 +22,250 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import sys
-from error import warning, error, show_message_for_character
-from .types import TokenError, TokenType, Token
-from .symbols import EQUALITY_OPERATORS, RELATIONAL_OPERATORS, LOGICAL_OPERATORS, ARITHMETIC_SYMBOLS
-
-# Function for when things mess up
-def invalid_token_message(c, character, message):
-    if c == "\n":
-        c = "\\n"
-    elif c == "\r":
-        c = "\\r"
-    elif c == "\t":
-        c = "\\t"
-    raise TokenError(character, "Unexpected character {:s}".format(c), message)
+import re
+from .types import TokenError, TokenType, Token, TokenStream
+from .symbols import keyword_code
+from .legacy_tokenizer import tokenize as tokenize_legacy, invalid_token_message
+from profiler.hooks import hooked, PHASE_TOKENIZE
+
+# Character classes
+#
+# These mirror the order in which the legacy state machine checks a character,
+# so a character that is both numeric and a letter is still a DIGIT, etc.
+SPACE = 0
+QUOTE = 1
+DIGIT = 2
+LETTER = 3
+COMBINABLE = 4
+DELIMITER = 5
+DECIMAL_POINT = 6
+COMMENT = 7
+UNKNOWN = 8
+NON_ASCII = 9
+
+def classify_character(c):
+    if c == "\"":
+        return QUOTE
+    elif c.isspace():
+        return SPACE
+    elif c.isnumeric():
+        return DIGIT
+    elif c.isalpha() or c == "_":
+        return LETTER
+    elif c in "=><&|+-*/!":
+        return COMBINABLE
+    elif c in "(),":
+        return DELIMITER
+    elif c == ".":
+        return DECIMAL_POINT
+    elif c in "#;":
+        return COMMENT
+    else:
+        return UNKNOWN
+
+# Lookup table for every ASCII character. Anything above that is NON_ASCII.
+CHARACTER_CLASSES = tuple(classify_character(chr(c)) for c in range(128))
+
+# Kinds of matches made by the master pattern (the group number that matched)
+#
+# Anything up to MATCH_DELIMITER is finished as soon as it is matched. Anything
+# up to MATCH_MINUS is only finished by the character after it. The rest are
+# either errors or end the line.
+MATCH_STRING = 1
+MATCH_DELIMITER = 2
+MATCH_NAME = 3
+MATCH_FLOAT = 4
+MATCH_INTEGER = 5
+MATCH_SYMBOL = 6
+MATCH_MINUS = 7
+MATCH_FLOAT_DECIMAL = 8
+MATCH_UNTERMINATED_STRING = 9
+MATCH_COMMENT = 10
+MATCH_CHARACTER = 11
+
+# Master pattern. Leading whitespace is skipped as part of every match, and
+# every alternative is restricted to ASCII outside of strings so that the
+# character classes above stay exact.
+TOKEN_PATTERN = re.compile(
+    r"[ \t\n\r\x0b\x0c\x1c-\x1f]*(?:"
+    r"(\"[^\"\n\r]*\")"
+    r"|([(),])"
+    r"|([A-Za-z_][A-Za-z0-9_]*)"
+    r"|(-?[0-9]+\.[0-9]+)"
+    r"|(-?[0-9]+)(?![0-9.])"
+    r"|([=><&|+*/!][=><&|+*/!-]*)"
+    r"|(-)(?![0-9])"
+    r"|(-?[0-9]+\.)"
+    r"|(\"[^\"\n\r]*)"
+    r"|([#;])"
+    r"|(.)"
+    r"|\Z)",
+    re.DOTALL
+)
+
+# Token type for each kind of match that produces a token
+MATCH_TOKEN_TYPES = (
+    None,
+    TokenType.STRING,
+    TokenType.SYMBOL,
+    TokenType.OTHER,
+    TokenType.FLOAT,
+    TokenType.INTEGER,
+    TokenType.SYMBOL,
+    TokenType.SYMBOL
+)
+
+# What the legacy tokenizer says about the character after a token if it does
+# not accept it, by kind of match and then by character class
+EXPECTED_NUMBER = "Expected number here"
+UNEXPECTED_SYMBOL = "Unexpected symbol here"
+UNKNOWN_TOKEN = "Unknown token here"
+
+def boundary_errors(errors):
+    return tuple(errors.get(character_class) for character_class in range(NON_ASCII))
+
+BOUNDARY_ERRORS = (
+    None,
+    None,
+    None,
+    None,
+    boundary_errors({ LETTER: EXPECTED_NUMBER, DECIMAL_POINT: UNEXPECTED_SYMBOL }),
+    boundary_errors({ LETTER: EXPECTED_NUMBER }),
+    boundary_errors({ QUOTE: UNEXPECTED_SYMBOL }),
+    boundary_errors({ QUOTE: UNEXPECTED_SYMBOL, LETTER: "This is bad", COMBINABLE: UNEXPECTED_SYMBOL }),
+    boundary_errors({ DECIMAL_POINT: UNEXPECTED_SYMBOL, UNKNOWN: UNKNOWN_TOKEN })
+)
+
+# Scan a line, yielding (token_type, start, end) for each token
+#
+# The line is text[start:end], so a line can be scanned in place inside of a
+# whole file. Offsets are into text, but error characters are into the line.
+#
+# Tokens are matched whole with TOKEN_PATTERN, and BOUNDARY_ERRORS decides if
+# the character after a token is one the legacy tokenizer would reject. Like
+# the legacy tokenizer, a token that runs into the end of the text is dropped.
+# Non-ASCII characters outside of strings are rare, so once one is found, the
+# rest of the line is handed to the legacy tokenizer.
+def scan(text, start = 0, end = None):
+    if end is None:
+        end = len(text)
+    first = start - 1
+    count = 0
+
+    for m in TOKEN_PATTERN.finditer(text, start, end):
+        kind = m.lastindex
+
+        # Nothing but whitespace left
+        if kind is None:
+            return
+
+        token_start = m.start(kind)
+        token_end = m.end()
+
+        # Tokens that need the next character
+        if kind > MATCH_DELIMITER:
+            if kind > MATCH_FLOAT_DECIMAL:
+                if kind == MATCH_COMMENT:
+                    return
+                elif kind == MATCH_UNTERMINATED_STRING:
+                    if token_end == end:
+                        return
+                    invalid_token_message(text[token_end], token_end - first, "Unterminated string here")
+
+                # Nothing starts with this character
+                c = text[token_start]
+                if ord(c) >= 128:
+                    yield from scan_legacy(text, start, end, count)
+                    return
+                invalid_token_message(c, token_start - first, UNEXPECTED_SYMBOL if c == "." else UNKNOWN_TOKEN)
+
+            if token_end == end:
+                return
+            c = text[token_end]
+            o = ord(c)
+            if o >= 128:
+                yield from scan_legacy(text, start, end, count)
+                return
+
+            errors = BOUNDARY_ERRORS[kind]
+            if errors is not None:
+                message = errors[CHARACTER_CLASSES[o]]
+                if kind == MATCH_FLOAT_DECIMAL:
+                    invalid_token_message(c, token_end - first, message or EXPECTED_NUMBER)
+                elif message is not None:
+                    invalid_token_message(c, token_end - first, message)
+
+        yield (MATCH_TOKEN_TYPES[kind], token_start, token_end)
+        count = count + 1
+
+# Scan a line with the legacy tokenizer, skipping the first few tokens
+def scan_legacy(text, start = 0, end = None, skip = 0):
+    for token in tokenize_legacy(text[start:end], 0)[skip:]:
+        token_start = start + token.character - 1
+        yield (token.token_type, token_start, token_start + len(token.token))
 
 # Tokenize function
 def tokenize(text, line):
     tokens = []
-    token = Token()
-    character = 0
-
-    # Make the token
-    for c in text:
-        character = character + 1
-
-        # Set character value for token
-        if token.token == "":
-            token.character = character
-
-        # Strings
-        if c == "\"":
-            if token.token_type == TokenType.STRING:
-                token.token += c
-                tokens.append(token)
-                token = Token()
-            elif token.token_type == TokenType.OTHER or token.token_type == TokenType.INTEGER or token.token_type == TokenType.FLOAT:
-                if token.token != "":
-                    tokens.append(token)
-                    token = Token()
-                    token.character = character
-                token.token_type = TokenType.STRING
-                token.token += c
-            elif token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            else:
-                invalid_token_message(c, character, "Unexpected symbol here")
-            continue
-
-        # Whitespace
-        if c.isspace():
-            if token.token_type == TokenType.STRING:
-                if c == "\n" or c == "\r":
-                    invalid_token_message(c, character, "Unterminated string here")
-                token.token += c
-            elif token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            elif token.token != "":
-                tokens.append(token)
-                token = Token()
-            continue
-
-        # Anything here beyond here, if a string, should be in that string
-        if token.token_type == TokenType.STRING:
-            token.token += c
-            continue
-
-        # Numbers
-        if c.isnumeric():
-            if token.token_type == TokenType.INTEGER or token.token_type == TokenType.FLOAT:
-                token.token += c
-                continue
-            elif (token.token_type == TokenType.OTHER and token.token == "") or token.token_type == TokenType.SYMBOL_OR_NUMBER:
-                token.token_type = TokenType.INTEGER
-                token.token += c
-                continue
-            elif token.token_type == TokenType.FLOAT_DECIMAL:
-                token.token += c
-                token.token_type = TokenType.FLOAT
-                continue
-            elif token.token_type == TokenType.OTHER:
-                token.token += c
-                continue
-            elif token.token_type == TokenType.SYMBOL:
-                tokens.append(token)
-                token = Token()
-                token.character = character
-                token.token = c
-                token.token_type = TokenType.INTEGER
-                continue
-
-        # Letters and underscores
-        if c.isalpha() or c == "_":
-            if token.token_type == TokenType.INTEGER or token.token_type == TokenType.FLOAT or token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            elif token.token_type == TokenType.SYMBOL:
-                tokens.append(token)
-                token = Token()
-                token.character = character
-                token.token = c
-                token.token_type = TokenType.OTHER
-            elif token.token_type == TokenType.OTHER:
-                token.token += c
-            else:
-                invalid_token_message(c, character, "This is bad")
-            continue
-
-        # Symbols that can be combined
-        if c == "=" or c == ">" or c == "<" or c == "&" or c == "|" or c in ARITHMETIC_SYMBOLS or c == "!":
-            if token.token_type == TokenType.SYMBOL:
-                token.token += c
-            elif token.token_type == TokenType.INTEGER or token.token_type == TokenType.FLOAT or token.token_type == TokenType.OTHER:
-                if token.token != "":
-                    tokens.append(token)
-                    token = Token()
-                    token.character = character
-                token.token = c
-                # Could be a negative number
-                if c == "-":
-                    token.token_type = TokenType.SYMBOL_OR_NUMBER
-                else:
-                    token.token_type = TokenType.SYMBOL
-            elif token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            else:
-                invalid_token_message(c, character, "Unexpected symbol here")
-            continue
-
-        # Symbols that cannot be combined
-        if c == "(" or c == ")" or c == ",":
-            if token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            else:
-                if token.token != "":
-                    tokens.append(token)
-                    token = Token()
-                    token.character = character
-                token.token = c
-                token.token_type = TokenType.SYMBOL
-                tokens.append(token)
-                token = Token()
-                continue
-
-        # Decimals
-        if c == ".":
-            if token.token_type == TokenType.INTEGER:
-                token.token_type = TokenType.FLOAT_DECIMAL
-                token.token += c
-                continue
-            else:
-                invalid_token_message(c, character, "Unexpected symbol here")
-
-        # Comments
-        if c == "#" or c == ";":
-            if token.token_type == TokenType.FLOAT_DECIMAL:
-                invalid_token_message(c, character, "Expected number here")
-            elif token.token != "":
-                tokens.append(token)
-            break
-
-        invalid_token_message(c, character, "Unknown token here")
-
-    # Set line for tokens. Also, if SYMBOL_OR_NUMBER, then it's a SYMBOL
-    for token in tokens:
+    for token_type, start, end in scan(text):
+        token = Token()
+        token.token = text[start:end]
+        token.token_type = token_type
+        token.code = keyword_code(token.token)
         token.line = line
-        if token.token_type == TokenType.SYMBOL_OR_NUMBER:
-            token.token_type = TokenType.SYMBOL
-
+        token.character = start + 1
+        tokens.append(token)
     return tokens
+
+# Tokenize lines one at a time, yielding each token
+#
+# lines can be any iterable of lines, such as an open file, so the whole file
+# never has to be read at once. If a TokenError occurs, its line is set to the
+# line it occurred on.
+def tokenize_lines(lines, scan = scan):
+    line = 0
+    for text in lines:
+        line = line + 1
+        try:
+            for token_type, start, end in scan(text):
+                token = Token()
+                token.token = text[start:end]
+                token.token_type = token_type
+                token.code = keyword_code(token.token)
+                token.line = line
+                token.character = start + 1
+                yield token
+        except TokenError as e:
+            e.line = line
+            raise
+
+# Tokenize a whole file into a TokenStream
+#
+# Each line is scanned in place, so none of the token text is copied. If
+# bulk_scan is given, it is tried on each line first (see scan_numpy()). If a
+# TokenError occurs, its line is set to the line it occurred on.
+@hooked(PHASE_TOKENIZE)
+def tokenize_stream(source, scan = scan, bulk_scan = None):
+    stream = TokenStream(source)
+    append = stream.append
+    length = len(source)
+    line = 0
+    line_start = 0
+
+    while line_start < length:
+        line = line + 1
+        line_end = source.find("\n", line_start) + 1
+        if line_end == 0:
+            line_end = length
+
+        try:
+            if bulk_scan is None or not bulk_scan(source, line_start, line_end, line, stream):
+                for token_type, start, end in scan(source, line_start, line_end):
+                    append(token_type, start, end, line, start - line_start + 1)
+        except TokenError as e:
+            e.line = line
+            raise
+
+        line_start = line_end
+
+    return stream
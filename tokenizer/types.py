@@ -22,13 +22,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from array import array
 from enum import Enum
+from .symbols import NO_CODE, KEYWORD_CODES
 
 # Errors that may occur
 class TokenError(Exception):
     message = "An error occurred"
     message_under = "This is where it occurred"
     character = 1
+    line = None
     def __init__(self, character, message, message_under):
         self.character = character
         self.message = message
@@ -52,5 +55,80 @@ class Token:
     token_type = TokenType.OTHER
     line = None
     character = 1
+
+    # Code for the token's text (see symbols.py)
+    code = NO_CODE
     def __repr__(self):
         return "<token=`" + self.token + "` type=" + str(self.token_type) + " at=" + str(self.line) + ":" + str(self.character) + ">"
+
+# Token types by value, for turning a stored value back into a TokenType
+TOKEN_TYPES = tuple(TokenType)
+
+# Compact list of tokens
+#
+# Tokens are stored as columns of numbers over one shared source string rather
+# than as Token objects, which costs 17 bytes per token. Indexing it returns a
+# new Token, so parsers can use it like a list of tokens, and the text of a
+# token is only copied out of the source when that happens.
+class TokenStream:
+    source = None
+    types = None
+    starts = None
+    ends = None
+    lines = None
+    characters = None
+
+    # Parsers tend to look at the same token a few times in a row
+    last_index = None
+    last_token = None
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.lines = array("I")
+        self.characters = array("I")
+    def append(self, token_type, start, end, line, character):
+        self.types.append(token_type.value)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+        self.characters.append(character)
+    def extend(self, types, starts, ends, lines, characters):
+        self.types.frombytes(types)
+        self.starts.frombytes(starts)
+        self.ends.frombytes(ends)
+        self.lines.frombytes(lines)
+        self.characters.frombytes(characters)
+    def truncate(self, length):
+        del self.types[length:]
+        del self.starts[length:]
+        del self.ends[length:]
+        del self.lines[length:]
+        del self.characters[length:]
+        self.last_index = None
+        self.last_token = None
+    def text(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
+    def token_type(self, index):
+        return TOKEN_TYPES[self.types[index]]
+    def __len__(self):
+        return len(self.types)
+    def __getitem__(self, index):
+        if index == self.last_index:
+            return self.last_token
+        token = Token()
+        token.token = self.source[self.starts[index]:self.ends[index]]
+        token.token_type = TOKEN_TYPES[self.types[index]]
+        token.code = KEYWORD_CODES.get(token.token, NO_CODE)
+        token.line = self.lines[index]
+        token.character = self.characters[index]
+        self.last_index = index
+        self.last_token = token
+        return token
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+    def __repr__(self):
+        return "<token stream tokens=" + str(len(self.types)) + ">"